@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Benchmark and regression suite for the Python execution runtime.
+
+Runs a fixed corpus of representative submissions (stdin loops, heavy printing, a
+50k-segment turtle spiral, deep recursion, nested loops) plus the reference solutions
+of ``packages/kids-coding-levels`` through ``python_runner`` and records:
+
+- ``cold_start``: one-shot ``python_runner.py`` process for a trivial request
+- ``latency.*`` / ``rss.*``: per-case wall time and peak RSS, server-mode style
+  (compiled in this process, executed in a forked child)
+- ``throughput.*``: runs per second of a small program at N concurrent children
+- ``checker.*``: ``python_static_checker`` throughput over the whole corpus
+- ``render.*``: turtle SVG render time, from the runner's ``render`` phase
+
+Results are JSON (``{"format", "meta", "metrics"}``). ``compare`` (or ``run --compare``)
+flags every metric that got worse than a baseline by more than ``--threshold``.
+
+    python bench/runtime_bench.py run --output bench/baselines/local.json
+    python bench/runtime_bench.py run --compare bench/baselines/local.json
+    python bench/runtime_bench.py compare bench/baselines/local.json new.json
+"""
+
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+RUNTIME_DIR = BENCH_DIR.parent / "src" / "runtime"
+REPO_ROOT = BENCH_DIR.parents[2]
+LEVEL_DIRS = [REPO_ROOT / "packages" / "kids-coding-levels" / "python"]
+sys.path.insert(0, str(RUNTIME_DIR))
+
+import python_runner  # noqa: E402
+import python_static_checker  # noqa: E402
+
+RESULT_FORMAT = 1
+DEFAULT_THRESHOLD = 0.15  # relative change that counts as a regression
+DEFAULT_CONCURRENCY = "1,4,8"
+THROUGHPUT_RUNS_PER_WORKER = 16
+CHECKER_MIN_SECONDS = 0.5
+
+# Generous limits: the suite measures speed, it should never hit a sandbox limit
+BENCH_REQUEST = {
+    "timeoutMs": 30_000,
+    "cpuSeconds": 30,
+    "outputStopBytes": 16 * 1024 * 1024,
+    "allowedModules": ["math", "random", "statistics", "turtle"],
+}
+
+CORPUS = {
+    "io_loop": (
+        "n = int(input())\ntotal = 0\nfor _ in range(n):\n    total += int(input())\nprint(total)\n",
+        "20000\n" + "".join(f"{i}\n" for i in range(20000)),
+    ),
+    "heavy_print": ("for i in range(100000):\n    print(i, i * i)\n", ""),
+    "turtle_spiral": (
+        "import turtle\nturtle.speed(0)\nfor i in range(50000):\n"
+        "    turtle.forward(1 + i % 200)\n    turtle.left(91)\n",
+        "",
+    ),
+    "deep_recursion": (
+        "def depth(n):\n    return 0 if n == 0 else 1 + depth(n - 1)\n"
+        "print(sum(depth(900) for _ in range(300)))\n",
+        "",
+    ),
+    "nested_loops": (
+        "total = 0\nfor i in range(600):\n    for j in range(600):\n        total += i ^ j\nprint(total)\n",
+        "",
+    ),
+}
+
+THROUGHPUT_SOURCE = "print(sum(range(10000)))\n"
+
+
+# Appended to solutions whose ``solve`` takes an argument but the level has no input:
+# the game API (maze moves etc.) is replaced by a stub that only records the calls.
+API_STUB = """
+class _BenchApi:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+"""
+
+
+def _solution_harness(source, level_input):
+    """Make ``source`` runnable on its own: call ``solve`` the way the level's judge would."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source
+    solve = next(
+        (node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "solve"), None
+    )
+    if solve is None:
+        return source
+    if not solve.args.args:
+        return source + "\nsolve()\n"
+    parameters = [argument.arg for argument in solve.args.args]
+    if isinstance(level_input, dict) and len(parameters) > 1 and set(parameters) <= set(level_input):
+        # Multi-argument levels give their input by parameter name
+        return source + f"\nprint(solve(**{level_input!r}))\n"
+    if level_input is not None:
+        return source + f"\nprint(solve({level_input!r}))\n"
+    return source + API_STUB + "\nsolve(_BenchApi())\n"
+
+
+def reference_solutions():
+    """``(label, source)`` of every level reference solution, wrapped to run standalone."""
+    found = []
+    for directory in LEVEL_DIRS:
+        for path in sorted(directory.rglob("*.json")):
+            with open(path, "r", encoding="utf-8-sig") as handle:
+                data = json.load(handle)
+            levels = data.get("levels", [data]) if isinstance(data, dict) else []
+            for index, level in enumerate(levels):
+                source = level.get("reference_solution") or level.get("solution")
+                if not isinstance(source, str) or not source.strip():
+                    continue
+                level_input = (level.get("expected_io") or {}).get("input")
+                found.append((f"{path.name}#{level.get('level', index + 1)}", _solution_harness(source, level_input)))
+    return found
+
+
+def metric(value, unit, better="lower"):
+    return {"value": round(value, 6), "unit": unit, "better": better}
+
+
+def request(source, stdin=""):
+    return {"source": source, "stdin": stdin, **BENCH_REQUEST}
+
+
+def run_forked(data):
+    """One server-mode run: compile here (code cache included), execute in a forked child."""
+    started = time.perf_counter()
+    response = python_runner.handle_request(data, fork=True)
+    return time.perf_counter() - started, response
+
+
+def bench_cold_start(repeat):
+    payload = json.dumps(request("pass"))
+    walls = []
+    startups = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, str(RUNTIME_DIR / "python_runner.py")],
+            input=payload, capture_output=True, text=True, check=True,
+        )
+        walls.append(time.perf_counter() - started)
+        startup = json.loads(process.stdout).get("phases", {}).get("startup", {})
+        startups.append(startup.get("cpu_seconds") or 0.0)
+    return {
+        "cold_start.wall_ms": metric(statistics.median(walls) * 1000, "ms"),
+        "cold_start.startup_cpu_ms": metric(statistics.median(startups) * 1000, "ms"),
+    }
+
+
+def bench_corpus(repeat):
+    metrics = {}
+    for name, (source, stdin) in CORPUS.items():
+        walls, rss, renders = [], [], []
+        for _ in range(repeat):
+            wall, response = run_forked(request(source, stdin))
+            if "usage" not in response or response.get("timeout"):
+                raise RuntimeError(f"{name} failed: {response.get('stderr', '')[:200]}")
+            walls.append(wall)
+            rss.append(response["usage"]["max_rss"])
+            renders.append(response.get("phases", {}).get("render", {}).get("wall_seconds", 0.0))
+        metrics[f"latency.{name}_ms"] = metric(statistics.median(walls) * 1000, "ms")
+        metrics[f"rss.{name}_kb"] = metric(max(rss), "KiB")
+        if name.startswith("turtle"):
+            metrics[f"render.{name}_ms"] = metric(statistics.median(renders) * 1000, "ms")
+
+    references = reference_solutions()
+    if references:
+        totals, rss = [], []
+        for _ in range(repeat):
+            total = 0.0
+            for _, source in references:
+                wall, response = run_forked(request(source))
+                total += wall
+                rss.append(response.get("usage", {}).get("max_rss", 0))
+            totals.append(total)
+        metrics["latency.reference_solution_mean_ms"] = metric(
+            statistics.median(totals) / len(references) * 1000, "ms"
+        )
+        metrics["rss.reference_solutions_kb"] = metric(max(rss), "KiB")
+    return metrics
+
+
+def bench_throughput(concurrency):
+    data = request(THROUGHPUT_SOURCE)
+    prepared, error = python_runner._prepare_request(data)
+    if error is not None:
+        raise RuntimeError(error["stderr"])
+    metrics = {}
+    for workers in concurrency:
+        jobs = [(prepared, {}, data)] * (workers * THROUGHPUT_RUNS_PER_WORKER)
+        started = time.perf_counter()
+        python_runner.run_cases(jobs, workers)
+        elapsed = time.perf_counter() - started
+        metrics[f"throughput.c{workers}_runs_per_s"] = metric(len(jobs) / elapsed, "runs/s", "higher")
+    return metrics
+
+
+def bench_checker():
+    sources = [source for source, _ in CORPUS.values()] + [source for _, source in reference_solutions()]
+    lines = sum(source.count("\n") + 1 for source in sources)
+    allowed = set(BENCH_REQUEST["allowedModules"])
+    rounds = 0
+    started = time.perf_counter()
+    while True:
+        for source in sources:
+            python_static_checker.check_source(source, allowed)
+        rounds += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= CHECKER_MIN_SECONDS:
+            break
+    return {
+        "checker.sources_per_s": metric(rounds * len(sources) / elapsed, "sources/s", "higher"),
+        "checker.lines_per_s": metric(rounds * lines / elapsed, "lines/s", "higher"),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(repeat, concurrency):
+    python_runner.preload_modules(set(BENCH_REQUEST["allowedModules"]))
+    metrics = {}
+    metrics.update(bench_cold_start(repeat))
+    metrics.update(bench_corpus(repeat))
+    metrics.update(bench_throughput(concurrency))
+    metrics.update(bench_checker())
+    return {
+        "format": RESULT_FORMAT,
+        "meta": {
+            "createdAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Rows ``(name, baseline, current, change, regressed)`` for metrics present in both."""
+    rows = []
+    for name, base in baseline["metrics"].items():
+        now = current["metrics"].get(name)
+        if now is None or not base["value"]:
+            continue
+        change = now["value"] / base["value"] - 1.0
+        worse = change if base.get("better", "lower") == "lower" else -change
+        rows.append((name, base, now, change, worse > threshold))
+    return rows
+
+
+def print_metrics(result):
+    for name, entry in result["metrics"].items():
+        print(f"{name:<42} {entry['value']:>14.3f} {entry['unit']}")
+
+
+def print_comparison(rows, threshold):
+    print(f"{'metric':<42} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, base, now, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<42} {base['value']:>12.3f} {now['value']:>12.3f} {change:>+8.1%}{flag}")
+    regressions = sum(1 for row in rows if row[4])
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as handle:
+        result = json.load(handle)
+    if result.get("format") != RESULT_FORMAT:
+        raise SystemExit(f"{path}: unsupported result format {result.get('format')!r}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite")
+    run.add_argument("--repeat", type=int, default=5, help="runs per measurement (median is kept)")
+    run.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="comma-separated worker counts")
+    run.add_argument("--output", help="write the JSON result here (e.g. a new baseline)")
+    run.add_argument("--compare", metavar="BASELINE", help="compare against this baseline afterwards")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        rows = compare(load(args.baseline), load(args.current), args.threshold)
+        sys.exit(1 if print_comparison(rows, args.threshold) else 0)
+
+    concurrency = [int(value) for value in args.concurrency.split(",") if value.strip()]
+    result = run_suite(max(1, args.repeat), concurrency)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2)
+            handle.write("\n")
+    if args.compare:
+        rows = compare(load(args.compare), result, args.threshold)
+        sys.exit(1 if print_comparison(rows, args.threshold) else 0)
+    print_metrics(result)
+
+
+if __name__ == "__main__":
+    main()
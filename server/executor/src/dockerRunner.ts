@@ -1,10 +1,19 @@
 import Docker from 'dockerode';
 import { PassThrough } from 'node:stream';
 import tar from 'tar-stream';
-import type { BatchTestInput, BatchTestResult } from './pythonExecutor';
-import { runPythonTest } from './pythonExecutor';
+import type { BatchTestInput, BatchTestResult, RunnerProcessOutput } from './pythonExecutor';
+import { buildBatchRequest, parseBatchOutput, runPythonBatch } from './pythonExecutor';
 import { createChildLogger, logger } from './logger';
 
+const RUNTIME_FILES = [
+  'python_runner.py',
+  'python_static_checker.py',
+  'turtle.py',
+  'turtle_judge.py',
+  'output_judge.py',
+  'level_grader.py',
+];
+
 export interface DockerRunnerOptions {
   socketPath: string;
   image: string;
@@ -16,20 +25,8 @@ export interface DockerRunnerOptions {
   enableLocalFallback: boolean;
 }
 
-export interface DockerExecutionRequest {
-  source: string;
-  stdin?: string;
-  timeoutMs?: number;
-}
-
-export interface DockerExecutionResult {
-  stdout: string;
-  stderr: string;
-  exitCode: number | null;
-  timedOut: boolean;
-  signal: string | null;
+export interface DockerExecutionResult extends RunnerProcessOutput {
   containerId?: string;
-  durationMs: number;
 }
 
 export class DockerExecutor {
@@ -63,15 +60,13 @@ export class DockerExecutor {
       jobId: context?.jobId,
     });
 
-    const results: BatchTestResult[] = [];
-
     const canUseDocker = await this.ping();
     if (!canUseDocker) {
       if (!this.options.enableLocalFallback) {
         throw new Error('Docker daemon unavailable and local fallback disabled');
       }
       execLogger.warn('[docker] falling back to local executor');
-      return runPythonTestSequential(source, tests, {
+      return runPythonBatch(source, tests, {
         timeoutMs: this.options.executionTimeoutMs,
         allowedModules: this.options.allowedModules,
         cpuSeconds: Math.max(1, Math.ceil(this.options.executionTimeoutMs / 1_000)),
@@ -79,62 +74,37 @@ export class DockerExecutor {
       });
     }
 
-    const taskList = tests.length ? tests : [{}];
-
-    for (const [index, test] of taskList.entries()) {
-      const start = Date.now();
-      const result = await this.runInContainer(
-        {
-          source,
-          stdin: test.stdin,
-          timeoutMs: test.timeoutMs ?? this.options.executionTimeoutMs,
-        },
-        execLogger,
-        index,
-      );
-      const durationMs = Date.now() - start;
-      const passed =
-        typeof test.expectedStdout === 'string'
-          ? result.stdout.trim() === test.expectedStdout.trim()
-          : undefined;
-
-      execLogger.info({
-        msg: 'container_execution_finished',
-        containerId: result.containerId,
-        exitCode: result.exitCode,
-        durationMs,
-        timedOut: result.timedOut,
-        testIndex: index,
-      });
+    const items = tests.length ? tests : [{}];
+    // The runner would default to the host's CPU count, which the container does not get.
+    const { payload, defaultTimeoutMs, totalTimeoutMs } = buildBatchRequest(source, items, {
+      timeoutMs: this.options.executionTimeoutMs,
+      parallelism: Math.max(1, Math.floor(this.options.nanoCpus / 1_000_000_000)),
+    });
 
-      results.push({
-        stdout: result.stdout,
-        stderr: result.stderr,
-        exitCode: result.exitCode,
-        timedOut: result.timedOut,
-        signal: result.signal,
-        durationMs: result.durationMs,
-        raw: undefined,
-        expectedStdout: test.expectedStdout,
-        passed,
-        containerId: result.containerId,
-        svg: result.svg,
-        segments: result.segments,
-      });
-    }
+    // One container and one runner per batch: the source is compiled once and every
+    // case runs in a forked child, judged or graded inside the container.
+    const output = await this.runInContainer(payload, defaultTimeoutMs, totalTimeoutMs, execLogger);
+
+    execLogger.info({
+      msg: 'container_execution_finished',
+      containerId: output.containerId,
+      exitCode: output.code,
+      durationMs: output.durationMs,
+      timedOut: output.timedOut,
+      cases: items.length,
+    });
 
-    return results;
+    return parseBatchOutput(items, output).map((result) => ({ ...result, containerId: output.containerId }));
   }
 
   private async runInContainer(
-    { source, stdin, timeoutMs }: DockerExecutionRequest,
+    payload: Record<string, unknown>,
+    caseTimeoutMs: number,
+    totalTimeoutMs: number,
     log = logger,
-    testIndex = 0,
-  ): Promise<
-    DockerExecutionResult & { svg?: string; segments?: Array<{ len: number; deg: number }> }
-  > {
+  ): Promise<DockerExecutionResult> {
     const startedAt = Date.now();
-    const timeout = Math.max(500, timeoutMs ?? this.options.executionTimeoutMs);
+    const timeout = Math.max(500, totalTimeoutMs);
 
     const container = await this.docker.createContainer({
       Image: this.options.image,
@@ -157,7 +127,7 @@ export class DockerExecutor {
         ReadonlyRootfs: false,
       },
       Env: [
-        `EXECUTOR_TIMEOUT=${timeout / 1000}`,
+        `EXECUTOR_TIMEOUT=${caseTimeoutMs / 1000}`,
         `EXECUTOR_ALLOWED_MODULES=${this.options.allowedModulesJson}`,
         `PYTHONUNBUFFERED=1`,
       ],
@@ -166,38 +136,27 @@ export class DockerExecutor {
     const pack = tar.pack();
 
     // Add files directly to /opt
-    pack.entry({ name: 'main.py', mode: 0o644 }, source);
-
-    // Copy turtle.py module to container for turtle_artist games
-    try {
-      const fs = await import('fs/promises');
-      const path = await import('path');
-      const turtlePath = path.resolve(__dirname, './runtime/turtle.py');
-      const turtleContent = await fs.readFile(turtlePath, 'utf8');
-      pack.entry({ name: 'turtle.py', mode: 0o644 }, turtleContent);
-    } catch (error) {
-      log.warn(
-        'Failed to copy turtle.py to container: %s',
-        error instanceof Error ? error.message : String(error),
-      );
-    }
+    pack.entry({ name: 'main.py', mode: 0o644 }, String(payload.source ?? ''));
 
-    // Copy python_runner.py to container
-    try {
-      const fs = await import('fs/promises');
-      const path = await import('path');
-      const runnerPath = path.resolve(__dirname, './runtime/python_runner.py');
-      const runnerContent = await fs.readFile(runnerPath, 'utf8');
-      pack.entry({ name: 'python_runner.py', mode: 0o644 }, runnerContent);
-    } catch (error) {
-      log.warn(
-        'Failed to copy python_runner.py to container: %s',
-        error instanceof Error ? error.message : String(error),
-      );
+    // Copy the runner and its helper modules (turtle.py for turtle_artist games,
+    // python_static_checker.py for in-process static checks) to the container
+    const fs = await import('fs/promises');
+    const path = await import('path');
+    for (const fileName of RUNTIME_FILES) {
+      try {
+        const content = await fs.readFile(path.resolve(__dirname, './runtime', fileName), 'utf8');
+        pack.entry({ name: fileName, mode: 0o644 }, content);
+      } catch (error) {
+        log.warn(
+          'Failed to copy %s to container: %s',
+          fileName,
+          error instanceof Error ? error.message : String(error),
+        );
+      }
     }
 
     // Prepare JSON input file to avoid stdin streaming
-    const input = JSON.stringify({ source, stdin: stdin || '' });
+    const input = JSON.stringify(payload);
     pack.entry({ name: 'input.json', mode: 0o644 }, input);
     pack.finalize();
 
@@ -221,11 +180,11 @@ export class DockerExecutor {
     this.docker.modem.demuxStream(stream, stdoutStream, stderrStream);
 
     stdoutStream.on('data', (chunk) => {
-      log.info({ msg: 'stdout_chunk_received', chunkLength: chunk.length, testIndex });
+      log.info({ msg: 'stdout_chunk_received', chunkLength: chunk.length });
       stdoutChunks.push(chunk as Buffer);
     });
     stderrStream.on('data', (chunk) => {
-      log.info({ msg: 'stderr_chunk_received', chunkLength: chunk.length, testIndex });
+      log.info({ msg: 'stderr_chunk_received', chunkLength: chunk.length });
       stderrChunks.push(chunk as Buffer);
     });
 
@@ -234,7 +193,6 @@ export class DockerExecutor {
       msg: 'prepared_input_file',
       containerId: container.id,
       inputLength: input.length,
-      testIndex,
     });
 
     // Start container first
@@ -244,7 +202,6 @@ export class DockerExecutor {
       msg: 'container_execution_started',
       containerId: container.id,
       timeoutMs: timeout,
-      testIndex,
     });
 
     // No stdin writing; input is read from file by shell redirection
@@ -261,86 +218,20 @@ export class DockerExecutor {
         msg: 'container_execution_timeout',
         containerId: container.id,
         timeoutMs: timeout,
-        testIndex,
       });
     }, timeout + 250);
 
     const outcome = await container.wait().finally(() => clearTimeout(timer));
 
-    const stdout = Buffer.concat(stdoutChunks).toString();
-    const stderr = Buffer.concat(stderrChunks).toString();
-
-    // Parse turtle output from stdout
-    let svg: string | undefined;
-    let segments: Array<{ len: number; deg: number }> | undefined;
-
-    try {
-      // Look for JSON output in stdout
-      const lines = stdout.split('\n');
-      for (const line of lines) {
-        if (line.trim().startsWith('{') && line.trim().endsWith('}')) {
-          try {
-            const parsed = JSON.parse(line.trim());
-            if (parsed.svg) {
-              svg = parsed.svg;
-            }
-            if (parsed.segments) {
-              segments = parsed.segments;
-            }
-            break;
-          } catch (e) {
-            // Continue to next line
-          }
-        }
-      }
-    } catch (error) {
-      // Ignore parsing errors
-    }
-
+    // The runner prints one JSON response with a result per case; parseBatchOutput reads it
     return {
-      stdout,
-      stderr,
-      exitCode: outcome.StatusCode,
-      timedOut,
+      stdout: Buffer.concat(stdoutChunks).toString(),
+      stderr: Buffer.concat(stderrChunks).toString(),
+      code: outcome.StatusCode,
       signal: null,
+      timedOut,
       containerId: container.id,
       durationMs: Date.now() - startedAt,
-      svg,
-      segments,
     };
   }
 }
-
-async function runPythonTestSequential(
-  source: string,
-  tests: BatchTestInput[],
-  options: {
-    timeoutMs: number;
-    allowedModules: string[];
-    cpuSeconds: number;
-    memoryLimitBytes: number;
-  },
-): Promise<BatchTestResult[]> {
-  const tasks = tests.length ? tests : [{}];
-  const results: BatchTestResult[] = [];
-  for (const test of tasks) {
-    const res = await runPythonTest({
-      source,
-      stdin: test.stdin,
-      timeoutMs: test.timeoutMs ?? options.timeoutMs,
-      allowedModules: options.allowedModules,
-      cpuSeconds: options.cpuSeconds,
-      memoryLimitBytes: options.memoryLimitBytes,
-    });
-    const passed =
-      typeof test.expectedStdout === 'string'
-        ? res.stdout.trim() === test.expectedStdout.trim()
-        : undefined;
-    results.push({
-      ...res,
-      expectedStdout: test.expectedStdout,
-      passed,
-    });
-  }
-  return results;
-}
@@ -32,12 +32,23 @@ const executeSchema = z.object({
         stdin: z.string().default(''),
         timeoutMs: z.number().int().min(200).max(10_000).optional(),
         expectedStdout: z.string().optional(),
+        compareMode: z.enum(['trim', 'lines', 'whitespace', 'numeric', 'unordered']).optional(),
+        numericTolerance: z.number().min(0).max(1).optional(),
+        includeStdout: z.boolean().optional(),
+        grader: z.record(z.unknown()).optional(),
+        assets: z.record(z.unknown()).optional(),
+        includeEvents: z.boolean().optional(),
       }),
     )
     .max(10)
     .default([]),
 });
 
+const lintSchema = z.object({
+  source: z.string().max(100_000),
+  sessionId: z.string().min(1).max(128).optional(),
+});
+
 export async function bootstrap(): Promise<Express> {
   const config = loadConfig();
   const queue = new TaskQueue({ redisUrl: config.redisUrl, queueKey: config.queueKey });
@@ -106,13 +117,13 @@ export async function bootstrap(): Promise<Express> {
   });
 
   // Add blacklist detection middleware (before rate limiting)
-  app.use('/execute', blacklistDetectionMiddleware);
+  app.use(['/execute', '/lint'], blacklistDetectionMiddleware);
 
   // Add rate limiting middleware
-  app.use('/execute', rateLimitMiddleware);
+  app.use(['/execute', '/lint'], rateLimitMiddleware);
 
   // Add timeout detection middleware
-  app.use('/execute', timeoutDetectionMiddleware);
+  app.use(['/execute', '/lint'], timeoutDetectionMiddleware);
 
   app.post('/execute', async (req: RequestWithContext, res: Response, next: NextFunction) => {
     try {
@@ -184,6 +195,35 @@ export async function bootstrap(): Promise<Express> {
     }
   });
 
+  // Live editor linting: static checks only, nothing is executed. Editors send the whole
+  // buffer with a stable sessionId and only changed top-level statements are re-analyzed.
+  app.post('/lint', async (req: RequestWithContext, res: Response, next: NextFunction) => {
+    try {
+      const parsed = lintSchema.parse(req.body ?? {});
+      // Session ids come from the client, so scope them to the caller: otherwise one user
+      // could read or poison another user's cached findings by reusing their sessionId.
+      const owner = req.userId ?? `ip:${req.ip ?? 'unknown'}`;
+      const sessionKey = parsed.sessionId ? `${owner}:${parsed.sessionId}` : undefined;
+      const analysis = await validatePythonSource(
+        parsed.source,
+        config.allowedModules,
+        undefined,
+        sessionKey,
+      );
+      res.json(analysis);
+    } catch (error) {
+      if (error instanceof z.ZodError) {
+        res.status(400).json({ ok: false, error: error.flatten() });
+        return;
+      }
+      if (error instanceof Error && error.message.includes('Static analysis timed out')) {
+        res.status(504).json({ ok: false, error: 'Static analysis timed out.' });
+        return;
+      }
+      next(error);
+    }
+  });
+
   app.get('/metrics', async (_req: Request, res: Response) => {
     res.set('Content-Type', metricsContentType);
     res.send(await collectMetrics());
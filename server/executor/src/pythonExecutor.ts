@@ -8,6 +8,15 @@ export interface PythonExecutionInput {
   allowedModules?: string[];
   cpuSeconds?: number;
   memoryLimitBytes?: number;
+  /** Run the static checker inside the runner on the tree it compiles. */
+  staticCheck?: boolean;
+  /** Seed `random` and allow memoizing identical (source, stdin) runs. */
+  deterministic?: boolean;
+  seed?: number;
+  /** Stop after this many executed lines of user code (reported as `budgetExceeded`). */
+  stepBudget?: number;
+  /** Trace allocations and per-line hits of the user code (slower; adds `profile`). */
+  profile?: boolean;
 }
 
 export interface PythonExecutionUsage {
@@ -15,6 +24,29 @@ export interface PythonExecutionUsage {
   memoryBytes?: number;
 }
 
+export interface RunnerPhaseTiming {
+  wall_seconds: number | null;
+  cpu_seconds: number;
+}
+
+/** Wall/CPU time per runner phase: `startup`, `compile`, `execute`, `render`, `serialize`. */
+export type RunnerPhases = Partial<
+  Record<'startup' | 'compile' | 'execute' | 'render' | 'serialize', RunnerPhaseTiming>
+>;
+
+export interface RunnerProfile {
+  peak_bytes: number;
+  live_blocks: number;
+  steps: number;
+  hot_lines: Array<{ line: number; hits: number; share: number }>;
+  allocation_lines: Array<{ line: number; bytes: number; blocks: number }>;
+}
+
+export interface StaticCheckFinding {
+  line: number;
+  message: string;
+}
+
 export interface PythonExecutionResult {
   stdout: string;
   stderr: string;
@@ -26,64 +58,62 @@ export interface PythonExecutionResult {
   raw?: unknown;
   svg?: string;
   segments?: Array<{ len: number; deg: number }>;
+  issues?: string[];
+  /** Static-check findings that did not block the run (e.g. a loop likely to time out). */
+  warnings?: StaticCheckFinding[];
+  cached?: boolean;
+  /** Output beyond the runner's capture limit was dropped (head and tail are kept). */
+  truncated?: boolean;
+  bytesDropped?: number;
+  /** The run used up its `stepBudget`; unlike a timeout this is deterministic. */
+  budgetExceeded?: boolean;
+  phases?: RunnerPhases;
+  profile?: RunnerProfile;
 }
 
 const DEFAULT_TIMEOUT_MS = 3_000;
+// The runner enforces limits with sub-second timers, so short budgets are honoured as given.
+const MIN_TIMEOUT_MS = 50;
 const DEFAULT_CPU_LIMIT_SECONDS = 2.0;
 const DEFAULT_MEMORY_LIMIT_BYTES = 256 * 1024 * 1024;
 const DEFAULT_ALLOWED_MODULES = ['math', 'random', 'statistics', 'turtle'];
 
 const runnerPath = path.resolve(__dirname, '../src/runtime/python_runner.py');
 
-function parseOutput(rawOutput: string): {
-  jsonOutput: string;
-  svg?: string;
-  segments?: Array<{ len: number; deg: number }>;
-} {
-  let jsonOutput = rawOutput;
-  let svg: string | undefined;
-  let segments: Array<{ len: number; deg: number }> | undefined;
-
-  // Extract SVG output
-  const svgStartMatch = rawOutput.match(/SVG_OUTPUT_START\n([\s\S]*?)\nSVG_OUTPUT_END/);
-  if (svgStartMatch) {
-    svg = svgStartMatch[1];
-    jsonOutput = jsonOutput.replace(/SVG_OUTPUT_START\n[\s\S]*?\nSVG_OUTPUT_END\n?/, '');
-  }
-
-  // Extract segments output
-  const segmentsStartMatch = rawOutput.match(
-    /SEGMENTS_OUTPUT_START\n([\s\S]*?)\nSEGMENTS_OUTPUT_END/,
-  );
-  if (segmentsStartMatch) {
-    try {
-      const segmentsData = JSON.parse(segmentsStartMatch[1]);
-      segments = segmentsData.segments;
-    } catch (error) {
-      // Ignore parsing errors for segments
-    }
-    jsonOutput = jsonOutput.replace(/SEGMENTS_OUTPUT_START\n[\s\S]*?\nSEGMENTS_OUTPUT_END\n?/, '');
-  }
+export interface RunnerProcessOutput {
+  stdout: string;
+  stderr: string;
+  code: number | null;
+  signal: string | null;
+  timedOut: boolean;
+  durationMs: number;
+}
 
-  return { jsonOutput: jsonOutput.trim(), svg, segments };
+function buildRunnerEnv(
+  input: Pick<PythonExecutionInput, 'allowedModules' | 'cpuSeconds' | 'memoryLimitBytes'>,
+  timeoutMs: number,
+): NodeJS.ProcessEnv {
+  return {
+    ...process.env,
+    EXECUTOR_TIMEOUT: String(timeoutMs / 1_000),
+    EXECUTOR_CPU_LIMIT: String(input.cpuSeconds ?? DEFAULT_CPU_LIMIT_SECONDS),
+    EXECUTOR_MEM_LIMIT: String(input.memoryLimitBytes ?? DEFAULT_MEMORY_LIMIT_BYTES),
+    EXECUTOR_ALLOWED_MODULES: JSON.stringify(input.allowedModules ?? DEFAULT_ALLOWED_MODULES),
+  };
 }
 
-export async function runPythonTest(input: PythonExecutionInput): Promise<PythonExecutionResult> {
-  const timeoutMs = Math.max(500, input.timeoutMs ?? DEFAULT_TIMEOUT_MS);
+async function spawnRunner(
+  payload: unknown,
+  env: NodeJS.ProcessEnv,
+  killAfterMs: number,
+): Promise<RunnerProcessOutput> {
   const startedAt = Date.now();
   const child = spawn('python3', [runnerPath], {
     stdio: ['pipe', 'pipe', 'pipe'],
-    env: {
-      ...process.env,
-      EXECUTOR_TIMEOUT: String(timeoutMs / 1_000),
-      EXECUTOR_CPU_LIMIT: String(input.cpuSeconds ?? DEFAULT_CPU_LIMIT_SECONDS),
-      EXECUTOR_MEM_LIMIT: String(input.memoryLimitBytes ?? DEFAULT_MEMORY_LIMIT_BYTES),
-      EXECUTOR_ALLOWED_MODULES: JSON.stringify(input.allowedModules ?? DEFAULT_ALLOWED_MODULES),
-    },
+    env,
   });
 
-  const payload = JSON.stringify({ source: input.source, stdin: input.stdin ?? '' });
-  child.stdin.write(payload);
+  child.stdin.write(JSON.stringify(payload));
   child.stdin.end();
 
   let stdout = '';
@@ -97,16 +127,14 @@ export async function runPythonTest(input: PythonExecutionInput): Promise<Python
     stderr += chunk.toString();
   });
 
-  let timedOutExternally = false;
   const timedOut = await new Promise<boolean>((resolve) => {
     const timer = setTimeout(() => {
       if (!child.killed) {
         killed = true;
-        timedOutExternally = true;
         child.kill('SIGKILL');
         resolve(true);
       }
-    }, timeoutMs + 200);
+    }, killAfterMs);
 
     child.on('exit', () => {
       clearTimeout(timer);
@@ -120,9 +148,33 @@ export async function runPythonTest(input: PythonExecutionInput): Promise<Python
     },
   );
 
-  const durationMs = Date.now() - startedAt;
+  return {
+    stdout,
+    stderr,
+    code,
+    signal,
+    timedOut: timedOut || killed,
+    durationMs: Date.now() - startedAt,
+  };
+}
+
+export async function runPythonTest(input: PythonExecutionInput): Promise<PythonExecutionResult> {
+  const timeoutMs = Math.max(MIN_TIMEOUT_MS, input.timeoutMs ?? DEFAULT_TIMEOUT_MS);
+  const { stdout, stderr, code, signal, timedOut, durationMs } = await spawnRunner(
+    {
+      source: input.source,
+      stdin: input.stdin ?? '',
+      check: input.staticCheck ?? false,
+      deterministic: input.deterministic ?? false,
+      seed: input.seed,
+      stepBudget: input.stepBudget,
+      profile: input.profile ?? false,
+    },
+    buildRunnerEnv(input, timeoutMs),
+    timeoutMs + 200,
+  );
 
-  if (timedOut || killed) {
+  if (timedOut) {
     return {
       stdout: '',
       stderr: stderr || 'Process terminated due to timeout',
@@ -133,8 +185,8 @@ export async function runPythonTest(input: PythonExecutionInput): Promise<Python
     };
   }
 
-  // Parse output to extract JSON, SVG, and segments
-  const { jsonOutput, svg, segments } = parseOutput(stdout);
+  // The runner prints a single JSON response; turtle results arrive as structured fields.
+  const jsonOutput = stdout.trim();
 
   try {
     const parsed = JSON.parse(jsonOutput || '{}');
@@ -143,13 +195,21 @@ export async function runPythonTest(input: PythonExecutionInput): Promise<Python
       stdout: typeof parsed.stdout === 'string' ? parsed.stdout : '',
       stderr: typeof parsed.stderr === 'string' ? parsed.stderr : stderr,
       exitCode: code,
-      timedOut: Boolean(parsed.timeout) || timedOutExternally,
+      timedOut: Boolean(parsed.timeout),
       signal,
       durationMs,
       usage,
       raw: parsed,
-      svg,
-      segments,
+      svg: typeof parsed.svg === 'string' ? parsed.svg : undefined,
+      segments: Array.isArray(parsed.segments) ? parsed.segments : undefined,
+      issues: Array.isArray(parsed.issues) ? parsed.issues.map(String) : undefined,
+      warnings: Array.isArray(parsed.warnings) ? (parsed.warnings as StaticCheckFinding[]) : undefined,
+      cached: parsed.cached === true,
+      truncated: parsed.truncated === true,
+      bytesDropped: typeof parsed.bytesDropped === 'number' ? parsed.bytesDropped : undefined,
+      budgetExceeded: parsed.budgetExceeded === true,
+      phases: parsePhases(parsed.phases),
+      profile: parsed.profile && typeof parsed.profile === 'object' ? parsed.profile : undefined,
     };
   } catch (error) {
     return {
@@ -159,53 +219,215 @@ export async function runPythonTest(input: PythonExecutionInput): Promise<Python
       timedOut: false,
       signal,
       durationMs,
-      svg,
-      segments,
     };
   }
 }
 
+export type OutputCompareMode = 'trim' | 'lines' | 'whitespace' | 'numeric' | 'unordered';
+
 export interface BatchTestInput {
   expectedStdout?: string;
   stdin?: string;
   timeoutMs?: number;
+  /** How the runner compares stdout with `expectedStdout` (default `trim`). */
+  compareMode?: OutputCompareMode;
+  /** Absolute/relative tolerance for numbers in `numeric` mode (default 1e-6). */
+  numericTolerance?: number;
+  /** Also return the full stdout of a compared case (omitted by default). */
+  includeStdout?: boolean;
+  /** Event grader of a maze/LED/music level, or a curriculum `api_events` judge. */
+  grader?: Record<string, unknown>;
+  /** The level's `assets` (e.g. the `maze` rows) used by `grader`. */
+  assets?: Record<string, unknown>;
+  /** Also return the compact event log of a graded case. */
+  includeEvents?: boolean;
+}
+
+/** Verdict of the runner's output judge (`output_judge.py`). */
+export interface OutputComparison {
+  pass: boolean;
+  mode: OutputCompareMode;
+  expectedLines: number;
+  actualLines: number;
+  stoppedEarly: boolean;
+  mismatch: {
+    line: number;
+    expectedLine: number | null;
+    expected: string | null;
+    actual: string | null;
+    /** Up to a few context lines plus the `-` expected / `+` actual line, with line numbers. */
+    diff: string[];
+  } | null;
+}
+
+/** Verdict of the runner's level grader (`level_grader.py`). */
+export interface LevelGrade {
+  pass: boolean;
+  channel: 'maze' | 'led' | 'music' | 'pixel';
+  /** The level's checks with `pass` and details (`steps`, `mismatch`, `missing`...). */
+  checks: Array<{ type: string; must: boolean; pass: boolean; [detail: string]: unknown }>;
+  eventCount: number;
+  stoppedEarly: boolean;
+  /** Maze only: final robot state. */
+  position?: [number, number];
+  heading?: 'N' | 'E' | 'S' | 'W';
+  goal?: [number, number] | null;
+  steps?: number;
+  bumps?: number;
+  /** With `includeEvents`: run-length maze actions (`F3`, `R`...) or LED/music events. */
+  events?: string[];
 }
 
 export interface BatchTestResult extends PythonExecutionResult {
   expectedStdout?: string;
   passed?: boolean;
+  comparison?: OutputComparison;
+  grade?: LevelGrade;
   containerId?: string;
 }
 
+export type BatchOptions = Pick<
+  PythonExecutionInput,
+  | 'allowedModules'
+  | 'cpuSeconds'
+  | 'memoryLimitBytes'
+  | 'timeoutMs'
+  | 'staticCheck'
+  | 'deterministic'
+  | 'seed'
+  | 'stepBudget'
+  | 'profile'
+> & { parallelism?: number; failFast?: boolean };
+
+/** The runner's `cases` request for a batch, and how long the whole batch may take. */
+export function buildBatchRequest(
+  source: string,
+  items: BatchTestInput[],
+  options?: BatchOptions,
+): { payload: Record<string, unknown>; defaultTimeoutMs: number; totalTimeoutMs: number } {
+  const defaultTimeoutMs = Math.max(MIN_TIMEOUT_MS, options?.timeoutMs ?? DEFAULT_TIMEOUT_MS);
+  const caseTimeouts = items.map((test) => Math.max(MIN_TIMEOUT_MS, test.timeoutMs ?? defaultTimeoutMs));
+  // Without an explicit value the runner picks its own (EXECUTOR_BATCH_PARALLELISM or the
+  // CPU count), so the overall deadline has to allow for the cases running one after another.
+  const parallelism = options?.parallelism === undefined ? undefined : Math.max(1, options.parallelism);
+
+  return {
+    payload: {
+      source,
+      parallelism,
+      failFast: options?.failFast ?? false,
+      check: options?.staticCheck ?? false,
+      deterministic: options?.deterministic ?? false,
+      seed: options?.seed,
+      stepBudget: options?.stepBudget,
+      profile: options?.profile ?? false,
+      cases: items.map((test, index) => ({
+        stdin: test.stdin ?? '',
+        expectedStdout: test.expectedStdout,
+        compareMode: test.compareMode,
+        numericTolerance: test.numericTolerance,
+        includeStdout: test.includeStdout,
+        grader: test.grader,
+        assets: test.assets,
+        includeEvents: test.includeEvents,
+        timeoutMs: caseTimeouts[index],
+      })),
+    },
+    defaultTimeoutMs,
+    totalTimeoutMs:
+      Math.ceil(caseTimeouts.reduce((total, value) => total + value, 0) / (parallelism ?? 1)) + 500,
+  };
+}
+
+/** Per-case results from the output of one `cases` runner invocation (local or in a container). */
+export function parseBatchOutput(items: BatchTestInput[], output: RunnerProcessOutput): BatchTestResult[] {
+  let parsedCases: Array<Record<string, unknown>> | undefined;
+  if (!output.timedOut) {
+    try {
+      const parsed = JSON.parse(output.stdout.trim() || '{}');
+      if (Array.isArray(parsed.cases)) {
+        parsedCases = parsed.cases;
+      }
+    } catch (error) {
+      // Fall through: every case reports the runner failure below.
+    }
+  }
+
+  return items.map((test, index) => {
+    const raw = parsedCases?.[index];
+    if (!raw) {
+      return {
+        stdout: '',
+        stderr:
+          output.stderr ||
+          (output.timedOut ? 'Process terminated due to timeout' : 'Failed to parse runner output'),
+        exitCode: output.code,
+        timedOut: output.timedOut,
+        signal: output.signal,
+        durationMs: output.durationMs,
+        expectedStdout: test.expectedStdout,
+        passed: typeof test.expectedStdout === 'string' || test.grader ? false : undefined,
+      };
+    }
+    return {
+      stdout: typeof raw.stdout === 'string' ? raw.stdout : '',
+      stderr: typeof raw.stderr === 'string' ? raw.stderr : '',
+      exitCode: output.code,
+      timedOut: Boolean(raw.timeout),
+      signal: output.signal,
+      durationMs: output.durationMs,
+      usage: parseUsage(raw.usage),
+      raw,
+      svg: typeof raw.svg === 'string' ? raw.svg : undefined,
+      segments: Array.isArray(raw.segments)
+        ? (raw.segments as Array<{ len: number; deg: number }>)
+        : undefined,
+      issues: Array.isArray(raw.issues) ? raw.issues.map(String) : undefined,
+      warnings: Array.isArray(raw.warnings) ? (raw.warnings as StaticCheckFinding[]) : undefined,
+      cached: raw.cached === true,
+      truncated: raw.truncated === true,
+      bytesDropped: typeof raw.bytesDropped === 'number' ? raw.bytesDropped : undefined,
+      budgetExceeded: raw.budgetExceeded === true,
+      phases: parsePhases(raw.phases),
+      profile:
+        raw.profile && typeof raw.profile === 'object' ? (raw.profile as RunnerProfile) : undefined,
+      expectedStdout: test.expectedStdout,
+      passed: typeof raw.passed === 'boolean' ? raw.passed : undefined,
+      comparison: parseComparison(raw.comparison),
+      grade: parseGrade(raw.grade),
+    };
+  });
+}
+
 export async function runPythonBatch(
   source: string,
   tests: BatchTestInput[],
-  options?: Pick<
-    PythonExecutionInput,
-    'allowedModules' | 'cpuSeconds' | 'memoryLimitBytes' | 'timeoutMs'
-  >,
+  options?: BatchOptions,
 ): Promise<BatchTestResult[]> {
   const items = tests.length ? tests : [{}];
-  const results: BatchTestResult[] = [];
-  // Sequential execution to prevent resource contention.
-  for (const test of items) {
-    const result = await runPythonTest({
-      stdin: test.stdin,
-      timeoutMs: test.timeoutMs ?? options?.timeoutMs,
-      source,
-      allowedModules: options?.allowedModules,
-      cpuSeconds: options?.cpuSeconds,
-      memoryLimitBytes: options?.memoryLimitBytes,
-    });
+  const { payload, defaultTimeoutMs, totalTimeoutMs } = buildBatchRequest(source, items, options);
 
-    let passed: boolean | undefined;
-    if (typeof test.expectedStdout === 'string') {
-      passed = result.stdout.trim() === test.expectedStdout.trim();
-    }
+  // One runner process compiles the source once and forks a child per case.
+  const output = await spawnRunner(payload, buildRunnerEnv(options ?? {}, defaultTimeoutMs), totalTimeoutMs);
+  return parseBatchOutput(items, output);
+}
+
+export function parseComparison(raw: unknown): OutputComparison | undefined {
+  if (!raw || typeof raw !== 'object' || typeof (raw as OutputComparison).pass !== 'boolean') {
+    return undefined;
+  }
+  return raw as OutputComparison;
+}
 
-    results.push({ ...result, expectedStdout: test.expectedStdout, passed });
+export function parseGrade(raw: unknown): LevelGrade | undefined {
+  if (!raw || typeof raw !== 'object' || typeof (raw as LevelGrade).pass !== 'boolean') {
+    return undefined;
   }
-  return results;
+  return raw as LevelGrade;
+}
+
+function parsePhases(raw: unknown): RunnerPhases | undefined {
+  return raw && typeof raw === 'object' ? (raw as RunnerPhases) : undefined;
 }
 
 function parseUsage(raw: unknown): PythonExecutionUsage | undefined {
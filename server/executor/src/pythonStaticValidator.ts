@@ -1,17 +1,158 @@
-﻿import { spawn } from 'child_process';
+﻿import { spawn, type ChildProcessWithoutNullStreams } from 'child_process';
 import path from 'path';
 
+export interface StaticAnalysisFinding {
+  line: number;
+  col?: number;
+  message: string;
+  severity?: 'error' | 'warning';
+}
+
 export interface StaticAnalysisResult {
   ok: boolean;
   issues: string[];
+  warnings?: StaticAnalysisFinding[];
+  /** Positioned errors and warnings; only returned for session (incremental) checks. */
+  findings?: StaticAnalysisFinding[];
+}
+
+const checkerPath = path.resolve(__dirname, '../src/runtime/python_static_checker.py');
+
+interface PendingCheck {
+  resolve: (result: StaticAnalysisResult) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
 }
 
+/**
+ * Long-lived `python_static_checker.py --serve` process. Requests are NDJSON lines tagged
+ * with an id; the checker answers in order and memoizes verdicts, so interpreter startup
+ * is paid once instead of on every lint.
+ */
+class CheckerServer {
+  private readonly child: ChildProcessWithoutNullStreams;
+  private readonly pending = new Map<number, PendingCheck>();
+  private buffer = '';
+  private nextId = 1;
+  closed = false;
+
+  constructor(pythonBinary: string) {
+    this.child = spawn(pythonBinary, [checkerPath, '--serve'], { stdio: ['pipe', 'pipe', 'pipe'] });
+    this.child.stdout.on('data', (chunk) => this.onData(chunk.toString()));
+    // Writing to a checker that died between requests fails with EPIPE on stdin
+    this.child.stdin.on('error', (error) => this.close(error));
+    this.child.stderr.resume();
+    this.child.on('error', (error) => this.close(error));
+    this.child.on('close', () => this.close(new Error('Static checker server exited')));
+    // An idle checker must not keep the Node process alive; pending checks hold their own timers.
+    this.child.unref();
+    for (const stream of [this.child.stdin, this.child.stdout, this.child.stderr]) {
+      (stream as unknown as { unref?: () => void }).unref?.();
+    }
+  }
+
+  check(
+    source: string,
+    allowedModules: string[],
+    timeoutMs: number,
+    session?: string,
+  ): Promise<StaticAnalysisResult> {
+    const id = this.nextId++;
+    return new Promise((resolve, reject) => {
+      if (this.closed) {
+        reject(new Error('Static checker server exited'));
+        return;
+      }
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error('Static analysis timed out'));
+        // A stuck checker would delay every later request, so start over with a new process.
+        // Checks queued behind this one are rejected as "exited" and fall back to a one-shot run.
+        this.close(new Error('Static checker server exited'));
+        this.child.kill('SIGKILL');
+      }, timeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      this.child.stdin.write(`${JSON.stringify({ id, source, allowedModules, session })}\n`);
+    });
+  }
+
+  private onData(chunk: string) {
+    this.buffer += chunk;
+    let newline = this.buffer.indexOf('\n');
+    while (newline !== -1) {
+      const line = this.buffer.slice(0, newline);
+      this.buffer = this.buffer.slice(newline + 1);
+      newline = this.buffer.indexOf('\n');
+      try {
+        const result = JSON.parse(line);
+        const entry = this.pending.get(result.id);
+        if (entry) {
+          this.pending.delete(result.id);
+          clearTimeout(entry.timer);
+          entry.resolve(toAnalysisResult(result));
+        }
+      } catch (error) {
+        // Ignore malformed lines; the request's own timeout reports the failure.
+      }
+    }
+  }
+
+  private close(error: Error) {
+    if (this.closed) {
+      return;
+    }
+    this.closed = true;
+    for (const entry of this.pending.values()) {
+      clearTimeout(entry.timer);
+      entry.reject(error);
+    }
+    this.pending.clear();
+    if (checkerServer === this) {
+      checkerServer = undefined;
+    }
+  }
+}
+
+let checkerServer: CheckerServer | undefined;
+let checkerServerFailed = false;
+
+function toAnalysisResult(result: Record<string, unknown>): StaticAnalysisResult {
+  const findings = Array.isArray(result.findings) ? (result.findings as StaticAnalysisFinding[]) : undefined;
+  return {
+    ok: Boolean(result.ok),
+    issues: Array.isArray(result.issues) ? result.issues.map(String) : [],
+    warnings: Array.isArray(result.warnings)
+      ? (result.warnings as StaticAnalysisFinding[])
+      : (findings ?? []).filter((finding) => finding.severity === 'warning'),
+    ...(findings ? { findings } : {}),
+  };
+}
+
+/**
+ * Statically check `source`. Passing a `sessionId` (e.g. one per open editor) lets the
+ * checker server reuse its analysis of unchanged top-level statements from that session's
+ * previous check and return positioned `findings`.
+ */
 export async function validatePythonSource(
   source: string,
   allowedModules: string[],
   timeoutMs = 1500,
+  sessionId?: string,
 ): Promise<StaticAnalysisResult> {
-  const checkerPath = path.resolve(__dirname, '../src/runtime/python_static_checker.py');
+  if (!checkerServerFailed) {
+    try {
+      checkerServer ??= new CheckerServer(process.env.PYTHON_BIN || 'python3');
+      return await checkerServer.check(source, allowedModules, timeoutMs, sessionId);
+    } catch (error) {
+      if ((error as { code?: string })?.code === 'ENOENT') {
+        // No usable interpreter under that name; use the per-check path, which probes alternatives.
+        checkerServerFailed = true;
+      } else if ((error as Error).message === 'Static analysis timed out') {
+        throw error;
+      }
+    }
+  }
+
   const candidates = [process.env.PYTHON_BIN, 'python3', 'python'].filter(
     (value): value is string => Boolean(value),
   );
@@ -73,11 +214,7 @@ function runAnalysis(
         return;
       }
       try {
-        const result = JSON.parse(stdout || '{}');
-        resolve({
-          ok: Boolean(result.ok),
-          issues: Array.isArray(result.issues) ? result.issues.map(String) : [],
-        });
+        resolve(toAnalysisResult(JSON.parse(stdout || '{}')));
       } catch (error) {
         reject(error);
       }
@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+"""Grade maze, LED and music levels inside the process that runs the submission.
+
+Event levels are judged on what a program does, not on its exact stdout. A grader hands
+the user code simulated APIs (a maze robot, an LED strip, a music track), collects
+``on``/``off``/``note``/``pixel`` lines from stdout while they are printed, keeps a compact
+event log and evaluates the level's checks when the run ends. The verdict travels back
+with the run; nothing is parsed out of stdout afterwards.
+
+Two grader dialects are accepted:
+
+- level graders (``apps/student-app/public/levels``): ``{"mode": "event", "events":
+  {"channel": ...}, "checks": [...]}`` plus the level's ``assets`` (``maze`` rows).
+  Checks: ``goal`` (reach_end), ``maxSteps``, ``eventSeq`` (same events in the same
+  order) and ``eventSet`` (same distinct events in any order).
+- curriculum judges (``packages/kids-coding-levels``): ``{"type": "api_events",
+  "criteria": {"end_state": "REACHED", "max_steps": n}}``, graded with the maze robot.
+
+Programs may drive the API from top-level code or define ``solve()`` / ``solve(api)``,
+which is called after the module body when that produced no events. Maze robots start
+on ``S`` facing east unless ``startDirection`` says otherwise; without a layout the grid
+is open and, as in the API's judge service, any completed run with a move reaches the end.
+``io`` graders (IO and pixel levels) are left to ``output_judge``.
+
+The grader in the sandboxed process only answers the program's queries and stops it
+early. User code shares that process, so its verdict is never trusted: the grader also
+keeps a run-length log of every counted action (``actions``) and ``replay_grader``
+replays that log on a fresh grader in the process that forked the run. A forged log can
+only claim actions the program could have performed through the API anyway.
+"""
+
+import json
+import math
+import re
+import sys
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_EVENTS = 100_000  # API calls and collected events before the run is stopped
+LOGGED_EVENTS = 200  # entries of the event log returned with ``includeEvents``
+DIFF_EVENTS = 5  # missing / unexpected events listed by ``eventSet``
+DEFAULT_HEADING = "E"
+
+HEADINGS = "NESW"
+OFFSETS = {"N": (0, -1), "E": (1, 0), "S": (0, 1), "W": (-1, 0)}
+BLOCKED_CELLS = "#D"  # walls and closed doors
+
+
+class GradeSettled(BaseException):
+    """Stops user code once its verdict can no longer change.
+
+    Derives from BaseException so a student's ``except Exception`` cannot swallow it.
+    """
+
+
+def _number(token: str) -> str:
+    """``1.0`` and ``1`` are the same tick or duration."""
+    try:
+        value = float(token)
+    except ValueError:
+        return token
+    if not math.isfinite(value):
+        return token
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+_LED_LINE = re.compile(r"^(on|off)\s*(\d+)(?:\s*,\s*(\d+))?$", re.IGNORECASE)
+
+
+def _led_event(line: str) -> Optional[str]:
+    match = _LED_LINE.match(line)
+    if match is None:
+        return None
+    state, first, second = match.groups()
+    return f"{state.lower()}{int(first)}" + ("" if second is None else f",{int(second)}")
+
+
+def _music_event(line: str) -> Optional[str]:
+    tokens = line.split()
+    if len(tokens) == 4 and tokens[0].lower() == "note":
+        return f"note {_number(tokens[1])} {tokens[2]} {_number(tokens[3])}"
+    if len(tokens) == 2 and tokens[0].lower() == "tempo":
+        return f"tempo {_number(tokens[1])}"
+    return None
+
+
+def _pixel_event(line: str) -> Optional[str]:
+    tokens = line.split()
+    if len(tokens) == 4 and tokens[0].lower() == "pixel":
+        return "pixel " + " ".join(_number(token) for token in tokens[1:])
+    return None
+
+
+# Channel -> parser of one stdout line into a canonical event (None for other lines)
+LINE_PARSERS: Dict[str, Callable[[str], Optional[str]]] = {
+    "led": _led_event,
+    "music": _music_event,
+    "pixel": _pixel_event,
+}
+
+
+class LevelGrader:
+    """Event log, stop rules and verdict shared by the channel graders."""
+
+    channel = ""
+
+    def __init__(self, checks: List[Dict[str, Any]], include_events: bool = False, stop_on_fail: bool = True):
+        self.checks = [dict(check, must=check.get("must", True)) for check in checks]
+        self.include_events = include_events
+        self.stop_on_fail = stop_on_fail
+        self.event_count = 0
+        self.failure: Optional[str] = None  # why the verdict was settled before the run ended
+        self.stopped_early = False
+        self.closed = False
+        self.finished = False
+        self.actions: List[List[Any]] = []  # run-length encoded [token, count], see ``replay``
+        self.api = SimpleNamespace()
+
+    def globals(self) -> Dict[str, Any]:
+        """Names added to the user code's globals."""
+        return {"api": self.api}
+
+    def feed(self, text: str) -> None:
+        """Consume a stdout chunk (channels that collect events from stdout)."""
+
+    def run_entry(self, user_globals: Dict[str, Any]) -> None:
+        """Call the program's ``solve`` if its module body produced no events."""
+        solve = user_globals.get("solve")
+        if self.event_count or self.closed or not callable(solve):
+            return
+        code = getattr(solve, "__code__", None)
+        if code is not None and code.co_argcount == 0:
+            solve()
+        else:
+            solve(self.api)
+
+    def close(self) -> None:
+        """Ignore further events (the program was stopped)."""
+        self.closed = True
+
+    def _count(self, token: str) -> bool:
+        """Count one API call or event and log it as ``token``; False once events are ignored."""
+        if self.closed or self.failure is not None:
+            return False
+        self.event_count += 1
+        if self.event_count > MAX_EVENTS:
+            self._settle("eventLimit")
+            return False
+        if self.actions and self.actions[-1][0] == token:
+            self.actions[-1][1] += 1
+        else:
+            self.actions.append([token, 1])
+        return True
+
+    def _apply(self, token: str) -> None:
+        """Perform one logged action again (see ``replay``)."""
+        raise ValueError(f"Unknown {self.channel} action {token!r}")
+
+    def replay(self, actions: Any) -> None:
+        """Perform a logged ``actions`` list; stops where the original run was stopped."""
+        if not isinstance(actions, list):
+            raise ValueError("Action log must be a list")
+        try:
+            for entry in actions:
+                if not (isinstance(entry, list) and len(entry) == 2 and isinstance(entry[0], str)
+                        and isinstance(entry[1], int) and entry[1] > 0):
+                    raise ValueError(f"Invalid action log entry {entry!r}")
+                for _ in range(entry[1]):
+                    # Once settled nothing counts any more, however long a forged run is
+                    if self.failure is not None:
+                        return
+                    self._apply(entry[0])
+        except GradeSettled:
+            pass
+
+    def _settle(self, failure: str) -> None:
+        self.failure = failure
+        if self.stop_on_fail:
+            self.stopped_early = True
+            raise GradeSettled(f"Level check failed: {failure}")
+
+    def _evaluate(self, check: Dict[str, Any]) -> Dict[str, Any]:
+        return {"pass": False, "error": f"Unsupported check type {check.get('type')!r}"}
+
+    def _state(self) -> Dict[str, Any]:
+        return {}
+
+    def _log(self) -> List[str]:
+        return []
+
+    def finish(self) -> Dict[str, Any]:
+        """Evaluate the checks after a completed run and return the verdict."""
+        self.closed = True
+        self.finished = not self.stopped_early
+        return self.verdict()
+
+    def verdict(self) -> Dict[str, Any]:
+        # Expected event lists stay out of the verdict; only counts and a diff come back
+        checks = [
+            dict({key: value for key, value in check.items() if key != "expect"}, **self._evaluate(check))
+            for check in self.checks
+        ]
+        if self.failure == "eventLimit":
+            checks.append({"type": "eventLimit", "must": True, "pass": False, "value": MAX_EVENTS})
+        verdict = {
+            "pass": all(check["pass"] for check in checks if check["must"]),
+            "channel": self.channel,
+            "checks": checks,
+            "eventCount": min(self.event_count, MAX_EVENTS),
+            "stoppedEarly": self.stopped_early,
+            **self._state(),
+        }
+        if self.include_events:
+            verdict["events"] = self._log()
+        return verdict
+
+
+class MazeGrader(LevelGrader):
+    """A robot on a grid of ``#`` walls, ``S`` start, ``E`` end, ``K`` keys and ``D`` doors."""
+
+    channel = "maze"
+
+    def __init__(self, rows: Optional[List[str]], checks: List[Dict[str, Any]],
+                 heading: str = DEFAULT_HEADING, **options):
+        super().__init__(checks, **options)
+        if heading not in OFFSETS:
+            raise ValueError(f"Unknown start direction {heading!r} (expected one of N, E, S, W)")
+        self.bounded = rows is not None
+        self.cells: Dict[Tuple[int, int], str] = {}
+        self.position = (0, 0)
+        self.goal: Optional[Tuple[int, int]] = None
+        for y, row in enumerate(rows or []):
+            for x, cell in enumerate(row):
+                self.cells[(x, y)] = cell
+                if cell == "S":
+                    self.position = (x, y)
+                elif cell == "E":
+                    self.goal = (x, y)
+        self.heading = heading
+        self.steps = 0
+        self.bumps = 0
+        self.has_key = False
+        self.events: List[List[Any]] = []  # run-length encoded [token, count]
+        limits = [check.get("value") for check in self.checks if check.get("type") == "maxSteps"]
+        limits = [value for value in limits if isinstance(value, (int, float))]
+        self.max_steps = min(limits) if limits else None
+
+        self.functions = _maze_functions(self)
+        self.api = SimpleNamespace(**self.functions)
+
+    def globals(self) -> Dict[str, Any]:
+        return {"api": self.api, **self.functions}
+
+    def _cell(self, position: Tuple[int, int]) -> str:
+        return self.cells.get(position, "#" if self.bounded else ".")
+
+    def _ahead(self, turn: int = 0) -> Tuple[int, int]:
+        dx, dy = OFFSETS[HEADINGS[(HEADINGS.index(self.heading) + turn) % 4]]
+        return self.position[0] + dx, self.position[1] + dy
+
+    def _clear(self, turn: int) -> bool:
+        return self._cell(self._ahead(turn)) not in BLOCKED_CELLS
+
+    def _reached(self) -> bool:
+        if self.goal is None:
+            return self.steps > 0
+        return self.position == self.goal
+
+    def _record(self, token: str) -> None:
+        if self.events and self.events[-1][0] == token:
+            self.events[-1][1] += 1
+        elif len(self.events) < LOGGED_EVENTS:
+            self.events.append([token, 1])
+
+    def _query(self, read: Callable[[], Any]) -> Any:
+        self._count("?")
+        return read()
+
+    def front_is_clear(self) -> bool:
+        return self._query(lambda: self._clear(0))
+
+    def move(self, steps: int = 1) -> None:
+        for _ in range(int(steps)):
+            if not self._count("F"):
+                return
+            if not self._clear(0):
+                # Bumping into a wall wastes the rest of the move
+                self.bumps += 1
+                self._record("X")
+                return
+            self.position = self._ahead()
+            self.steps += 1
+            self._record("F")
+            if self.max_steps is not None and self.steps > self.max_steps:
+                self._settle("maxSteps")
+
+    def turn_left(self) -> None:
+        if self._count("L"):
+            self.heading = HEADINGS[(HEADINGS.index(self.heading) + 3) % 4]
+            self._record("L")
+
+    def turn_right(self) -> None:
+        if self._count("R"):
+            self.heading = HEADINGS[(HEADINGS.index(self.heading) + 1) % 4]
+            self._record("R")
+
+    def take_key(self) -> None:
+        if not self._count("K"):
+            return
+        if self.bounded and self._cell(self.position) != "K":
+            self._record("k")  # nothing to pick up here
+            return
+        if self.bounded:
+            self.cells[self.position] = "."
+        self.has_key = True
+        self._record("K")
+
+    def open_door(self) -> None:
+        if not self._count("O"):
+            return
+        ahead = self._ahead()
+        if not self.has_key or (self.bounded and self._cell(ahead) != "D"):
+            self._record("o")
+            return
+        if self.bounded:
+            self.cells[ahead] = "."
+        self._record("O")
+
+    def _apply(self, token: str) -> None:
+        action = {
+            "F": self.move,
+            "L": self.turn_left,
+            "R": self.turn_right,
+            "K": self.take_key,
+            "O": self.open_door,
+            "?": lambda: self._count("?"),
+        }.get(token)
+        if action is None:
+            super()._apply(token)
+        else:
+            action()
+
+    def _evaluate(self, check: Dict[str, Any]) -> Dict[str, Any]:
+        kind = check.get("type")
+        if kind == "goal":
+            return {"pass": self.finished and self._reached()}
+        if kind == "endState":
+            state = "REACHED" if self.finished and self._reached() else "NOT_REACHED"
+            return {"pass": state == check.get("value"), "actual": state}
+        if kind == "maxSteps":
+            value = check.get("value")
+            return {"pass": value is None or self.steps <= value, "steps": self.steps}
+        return super()._evaluate(check)
+
+    def _state(self) -> Dict[str, Any]:
+        return {
+            "position": list(self.position),
+            "heading": self.heading,
+            "goal": None if self.goal is None else list(self.goal),
+            "steps": self.steps,
+            "bumps": self.bumps,
+        }
+
+    def _log(self) -> List[str]:
+        return [token if count == 1 else f"{token}{count}" for token, count in self.events]
+
+
+class EventGrader(LevelGrader):
+    """LED, music and pixel events, printed as lines or sent through ``api``."""
+
+    def __init__(self, channel: str, checks: List[Dict[str, Any]], collect_stdout: bool = True, **options):
+        if channel not in LINE_PARSERS:
+            raise ValueError(f"Unknown event channel {channel!r}")
+        self.channel = channel
+        self.parse = LINE_PARSERS[channel]
+        super().__init__(checks, **options)
+        for check in self.checks:
+            if isinstance(check.get("expect"), list):
+                check["expect"] = [self._canonical(str(event)) for event in check["expect"]]
+        self.collect_stdout = collect_stdout
+        self.events: List[str] = []
+        self._partial = ""
+        # The first required sequence can fail at its first wrong event
+        self._sequence = next(
+            (check["expect"] for check in self.checks
+             if check.get("type") == "eventSeq" and check["must"] and isinstance(check.get("expect"), list)),
+            None,
+        )
+
+        self.api = SimpleNamespace(**_event_functions(channel, self._send))
+
+    def _canonical(self, line: str) -> str:
+        return self.parse(line.strip()) or " ".join(line.split())
+
+    def _send(self, line: str, x: Any = None, y: Any = None) -> None:
+        if x is not None:
+            line = f"{line}{int(x)}" + ("" if y is None else f",{int(y)}")
+        event = self.parse(line)
+        if event is None:
+            raise ValueError(f"Invalid {self.channel} event: {line}")
+        self._record(event)
+
+    def _record(self, event: str) -> None:
+        if not self._count(event):
+            return
+        index = len(self.events)
+        self.events.append(event)
+        if self._sequence is not None and (index >= len(self._sequence) or self._sequence[index] != event):
+            self._settle("eventSeq")
+
+    def _apply(self, token: str) -> None:
+        event = self.parse(token)
+        if event is None:
+            super()._apply(token)
+        else:
+            self._record(event)
+
+    def feed(self, text: str) -> None:
+        if not self.collect_stdout or self.closed:
+            return
+        parts = (self._partial + text).split("\n")
+        self._partial = parts.pop()
+        for line in parts:
+            event = self.parse(line.strip())
+            if event is not None:
+                self._record(event)
+
+    def finish(self) -> Dict[str, Any]:
+        if self._partial and not self.closed:
+            self.feed("\n")
+        return super().finish()
+
+    def _evaluate(self, check: Dict[str, Any]) -> Dict[str, Any]:
+        kind = check.get("type")
+        expect = check.get("expect")
+        if kind not in ("eventSeq", "eventSet") or not isinstance(expect, list):
+            return super()._evaluate(check)
+        if kind == "eventSeq":
+            mismatch = None
+            for index in range(max(len(expect), len(self.events))):
+                want = expect[index] if index < len(expect) else None
+                got = self.events[index] if index < len(self.events) else None
+                if want != got:
+                    mismatch = {"index": index, "expected": want, "actual": got}
+                    break
+            return {
+                "pass": mismatch is None,
+                "expectedCount": len(expect),
+                "actualCount": len(self.events),
+                "mismatch": mismatch,
+            }
+        expected, actual = set(expect), set(self.events)
+        missing = [event for event in expect if event not in actual]
+        unexpected = sorted(actual - expected)
+        return {
+            "pass": not missing and not unexpected,
+            "expectedCount": len(expected),
+            "actualCount": len(actual),
+            "missing": missing[:DIFF_EVENTS],
+            "missingCount": len(missing),
+            "unexpected": unexpected[:DIFF_EVENTS],
+            "unexpectedCount": len(unexpected),
+        }
+
+    def _log(self) -> List[str]:
+        return self.events[:LOGGED_EVENTS]
+
+
+def _maze_functions(grader: "MazeGrader") -> Dict[str, Callable[..., Any]]:
+    """The robot API as plain functions.
+
+    User code gets closures rather than bound methods, so there is no ``__self__`` leading
+    to the grader. They still close over it, which is why the verdict is computed from the
+    action log by ``replay_grader`` and not by this grader.
+    """
+
+    def move(steps: int = 1) -> None:
+        grader.move(steps)
+
+    def turn_left() -> None:
+        grader.turn_left()
+
+    def turn_right() -> None:
+        grader.turn_right()
+
+    def front_is_clear() -> bool:
+        return grader.front_is_clear()
+
+    def left_is_clear() -> bool:
+        return grader._query(lambda: grader._clear(-1))
+
+    def right_is_clear() -> bool:
+        return grader._query(lambda: grader._clear(1))
+
+    def wall_ahead() -> bool:
+        return grader._query(lambda: not grader._clear(0))
+
+    def at_goal() -> bool:
+        return grader._query(grader._reached)
+
+    def get_position() -> Tuple[int, int]:
+        return grader._query(lambda: grader.position)
+
+    def has_key() -> bool:
+        return grader._query(lambda: grader.has_key)
+
+    def take_key() -> None:
+        grader.take_key()
+
+    def open_door() -> None:
+        grader.open_door()
+
+    return {
+        "move": move,
+        "move_forward": move,
+        "turn_left": turn_left,
+        "left": turn_left,
+        "turn_right": turn_right,
+        "right": turn_right,
+        "scan": front_is_clear,
+        "front_is_clear": front_is_clear,
+        "left_is_clear": left_is_clear,
+        "right_is_clear": right_is_clear,
+        "wall_ahead": wall_ahead,
+        "at_goal": at_goal,
+        "get_position": get_position,
+        "has_key": has_key,
+        "take_key": take_key,
+        "open_door": open_door,
+    }
+
+
+def _event_functions(channel: str, send: Callable[..., None]) -> Dict[str, Callable[..., Any]]:
+    """The LED, music or pixel API as plain functions (see ``_maze_functions``)."""
+    if channel == "led":
+
+        def on(x: Any, y: Any = None) -> None:
+            send("on", x, y)
+
+        def off(x: Any, y: Any = None) -> None:
+            send("off", x, y)
+
+        return {"on": on, "off": off}
+    if channel == "music":
+
+        def note(tick: Any, pitch: Any, duration: Any = 1) -> None:
+            send(f"note {tick} {pitch} {duration}")
+
+        def tempo(bpm: Any) -> None:
+            send(f"tempo {bpm}")
+
+        return {"note": note, "tempo": tempo}
+
+    def pixel(x: Any, y: Any, value: Any = 1) -> None:
+        send(f"pixel {x} {y} {value}")
+
+    return {"pixel": pixel}
+
+
+def grader_for(config: Dict[str, Any], assets: Optional[Dict[str, Any]] = None,
+               include_events: bool = False, stop_on_fail: bool = True) -> Optional[LevelGrader]:
+    """Grader for a level grader or curriculum judge; None for ``io`` graders."""
+    assets = assets or {}
+    options = {"include_events": include_events, "stop_on_fail": stop_on_fail}
+    if config.get("type") == "api_events":
+        criteria = config.get("criteria") or {}
+        checks = []
+        if criteria.get("end_state") is not None:
+            checks.append({"type": "endState", "value": criteria["end_state"]})
+        if criteria.get("max_steps") is not None:
+            checks.append({"type": "maxSteps", "value": criteria["max_steps"]})
+        heading = criteria.get("start_direction") or assets.get("startDirection") or DEFAULT_HEADING
+        return MazeGrader(criteria.get("maze") or assets.get("maze"), checks, heading, **options)
+    if config.get("mode") == "event":
+        events = config.get("events") or {}
+        channel = events.get("channel")
+        checks = config.get("checks") or []
+        if channel == "maze":
+            heading = assets.get("startDirection") or DEFAULT_HEADING
+            return MazeGrader(assets.get("maze"), checks, heading, **options)
+        return EventGrader(channel, checks, events.get("collectFromStdout", True), **options)
+    if config.get("mode") == "io" or config.get("type") == "stdout_compare":
+        return None
+    raise ValueError(f"Unsupported grader {config.get('type') or config.get('mode')!r}")
+
+
+def grader_from_request(payload: Dict[str, Any]) -> Optional[LevelGrader]:
+    """Grader for request keys ``grader``, ``assets``, ``includeEvents`` and ``stopOnMismatch``;
+    ``None`` without an event ``grader``."""
+    config = payload.get("grader")
+    if not isinstance(config, dict):
+        return None
+    return grader_for(
+        config,
+        payload.get("assets"),
+        bool(payload.get("includeEvents")),
+        bool(payload.get("stopOnMismatch", True)),
+    )
+
+
+def replay_grader(payload: Dict[str, Any], actions: Any) -> Optional[LevelGrader]:
+    """Fresh grader for ``payload`` (see ``grader_from_request``) that performed ``actions``.
+
+    This is how the verdict of a sandboxed run is computed: from the action log it sent
+    back, never from the grader that lived next to the user code. ``None`` without an
+    event ``grader``; a malformed log raises ``ValueError``.
+    """
+    grader = grader_from_request(payload)
+    if grader is not None:
+        grader.replay(actions)
+    return grader
+
+
+def grade_stdout(stdout: str, config: Dict[str, Any], assets: Optional[Dict[str, Any]] = None,
+                 include_events: bool = False) -> Dict[str, Any]:
+    """Grade recorded stdout of an LED, music or pixel level."""
+    grader = grader_for(config, assets, include_events, stop_on_fail=False)
+    if not isinstance(grader, EventGrader):
+        raise ValueError("Only stdout event channels can be graded from recorded output")
+    grader.feed(stdout)
+    return grader.finish()
+
+
+def main() -> None:
+    raw = sys.stdin.read()
+    payload = json.loads(raw or "{}")
+    verdict = grade_stdout(
+        payload.get("stdout", ""), payload.get("grader") or {}, payload.get("assets"),
+        bool(payload.get("includeEvents")),
+    )
+    print(json.dumps(verdict))
+
+
+if __name__ == "__main__":
+    main()
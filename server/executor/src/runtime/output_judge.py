@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Compare a program's stdout with the expected output while it is being written.
+
+``OutputComparer`` is fed stdout chunks as the program prints them and checks each
+complete line against the expected output straight away, so a wrong answer is known at
+its first bad line and the runner can stop the program there. Only a small verdict with
+a bounded diff snippet is returned, never the whole output.
+
+Modes:
+
+- ``trim`` (default): ``stdout.strip() == expected.strip()``, the executor's original rule.
+- ``lines``: line by line, ignoring trailing whitespace on each line and trailing blank lines.
+- ``whitespace``: runs of whitespace inside a line count as one space; blank lines are ignored.
+- ``numeric``: like ``lines`` but whitespace-separated tokens that parse as numbers are
+  compared with ``tolerance`` (absolute or relative).
+- ``unordered``: the same multiset of lines (whitespace-normalized, blank lines ignored)
+  in any order. A line that is not expected fails immediately; missing ones at the end.
+"""
+
+import json
+import math
+import sys
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+MODES = ("trim", "lines", "whitespace", "numeric", "unordered")
+DEFAULT_MODE = "trim"
+DEFAULT_NUMERIC_TOLERANCE = 1e-6
+DIFF_CONTEXT_LINES = 2  # matching lines shown before the first mismatch
+DIFF_LINE_CHARS = 120  # longer lines are cut in the diff snippet
+
+
+class OutputMismatch(BaseException):
+    """Stops user code once its output can no longer match.
+
+    Derives from BaseException so a student's ``except Exception`` cannot swallow it.
+    """
+
+
+def _clip(text: str) -> str:
+    return text if len(text) <= DIFF_LINE_CHARS else text[:DIFF_LINE_CHARS] + "…"
+
+
+def _number(token: str) -> Optional[float]:
+    try:
+        value = float(token)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+class OutputComparer:
+    """Incremental comparison of stdout against ``expected`` (see the module docstring)."""
+
+    def __init__(
+        self,
+        expected: str,
+        mode: str = DEFAULT_MODE,
+        tolerance: float = DEFAULT_NUMERIC_TOLERANCE,
+        stop_on_mismatch: bool = True,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown compareMode {mode!r} (expected one of {', '.join(MODES)})")
+        self.mode = mode
+        self.tolerance = float(tolerance)
+        self.stop_on_mismatch = stop_on_mismatch
+        self.mismatch: Optional[Dict[str, Any]] = None
+        self.stopped_early = False
+        self.closed = False
+        self._partial = ""
+        self._line_no = 0
+        self._seen_content = False
+        self._deferred: List[tuple] = []
+        self._recent: deque = deque(maxlen=DIFF_CONTEXT_LINES)
+        self._index = 0
+
+        lines = expected.split("\n")
+        if mode == "trim":
+            stripped = expected.strip()
+            lines = stripped.split("\n") if stripped else []
+        numbered = [(number, self._key(line)) for number, line in enumerate(lines, 1)]
+        if mode in ("whitespace", "unordered"):
+            numbered = [(number, key) for number, key in numbered if key]
+        elif mode != "trim":
+            while numbered and not numbered[-1][1]:
+                numbered.pop()
+        self._expected = [(number, key, lines[number - 1]) for number, key in numbered]
+        self._remaining = Counter(key for _, key, _ in self._expected) if mode == "unordered" else None
+
+    def _key(self, line: str):
+        if self.mode == "trim":
+            return line
+        if self.mode == "lines":
+            return line.rstrip()
+        if self.mode == "numeric":
+            return tuple(line.split())
+        return " ".join(line.split())
+
+    def _blank(self, key) -> bool:
+        return not key.strip() if self.mode == "trim" else not key
+
+    def _equal(self, actual, expected, last: bool) -> bool:
+        if actual == expected:
+            return True
+        if self.mode == "trim":
+            return last and actual.rstrip() == expected
+        if self.mode != "numeric" or len(actual) != len(expected):
+            return False
+        for got, want in zip(actual, expected):
+            if got == want:
+                continue
+            got_value, want_value = _number(got), _number(want)
+            if got_value is None or want_value is None:
+                return False
+            if not math.isclose(got_value, want_value, rel_tol=self.tolerance, abs_tol=self.tolerance):
+                return False
+        return True
+
+    def feed(self, text: str) -> None:
+        """Consume a stdout chunk; raises ``OutputMismatch`` after a mismatch if stopping early."""
+        if self.closed:
+            return
+        if self.mismatch is None:
+            parts = (self._partial + text).split("\n")
+            self._partial = parts.pop()
+            for line in parts:
+                self._line(line)
+                if self.mismatch is not None:
+                    break
+        if self.mismatch is not None and self.stop_on_mismatch:
+            self.stopped_early = True
+            raise OutputMismatch(f"Output differs from the expected output at line {self.mismatch['line']}")
+
+    def close(self) -> None:
+        """Ignore further output (the program was stopped or its output no longer matters)."""
+        self.closed = True
+
+    def _line(self, raw: str) -> None:
+        self._line_no += 1
+        key = self._key(raw)
+        if self._remaining is not None:
+            if not key:
+                return
+            if self._remaining[key] > 0:
+                self._remaining[key] -= 1
+                self._recent.append((self._line_no, raw))
+            else:
+                self._fail(self._line_no, raw, None)
+            return
+
+        if self._blank(key):
+            if self.mode == "whitespace" or (self.mode == "trim" and not self._seen_content):
+                return
+            # Blank lines only count once something follows them
+            self._deferred.append((self._line_no, raw, key))
+            return
+        if self.mode == "trim" and not self._seen_content:
+            key = key.lstrip()
+        self._seen_content = True
+        deferred, self._deferred = self._deferred, []
+        for line_no, deferred_raw, deferred_key in deferred:
+            if not self._match(line_no, deferred_raw, deferred_key):
+                return
+        self._match(self._line_no, raw, key)
+
+    def _match(self, line_no: int, raw: str, key) -> bool:
+        if self._index >= len(self._expected):
+            self._fail(line_no, raw, None)
+            return False
+        expected = self._expected[self._index]
+        if not self._equal(key, expected[1], self._index == len(self._expected) - 1):
+            self._fail(line_no, raw, expected)
+            return False
+        self._index += 1
+        self._recent.append((line_no, raw))
+        return True
+
+    def _fail(self, line_no: int, actual: Optional[str], expected: Optional[tuple]) -> None:
+        diff = [f" {number:>4} | {_clip(text)}" for number, text in self._recent]
+        if expected is not None:
+            diff.append(f"-{expected[0]:>4} | {_clip(expected[2])}")
+        if actual is not None:
+            diff.append(f"+{line_no:>4} | {_clip(actual)}")
+        self.mismatch = {
+            "line": line_no,
+            "expectedLine": None if expected is None else expected[0],
+            "expected": None if expected is None else _clip(expected[2]),
+            "actual": None if actual is None else _clip(actual),
+            "diff": diff,
+        }
+
+    def finish(self) -> Dict[str, Any]:
+        """Consume the trailing partial line and return the verdict."""
+        if self.mismatch is None and not self.closed:
+            if self._partial:
+                self._line(self._partial)
+                self._partial = ""
+            if self.mismatch is None:
+                self._fail_missing()
+        self.closed = True
+        return self.verdict()
+
+    def _fail_missing(self) -> None:
+        if self._remaining is not None:
+            for expected in self._expected:
+                if self._remaining[expected[1]] > 0:
+                    self._fail(self._line_no + 1, None, expected)
+                    return
+        elif self._index < len(self._expected):
+            self._fail(self._line_no + 1, None, self._expected[self._index])
+
+    def verdict(self) -> Dict[str, Any]:
+        return {
+            "pass": self.mismatch is None,
+            "mode": self.mode,
+            "expectedLines": len(self._expected),
+            "actualLines": self._line_no,
+            "stoppedEarly": self.stopped_early,
+            "mismatch": self.mismatch,
+        }
+
+
+def comparer_from_request(payload: Dict[str, Any]) -> Optional[OutputComparer]:
+    """``OutputComparer`` for request keys ``expectedStdout``, ``compareMode``,
+    ``numericTolerance`` and ``stopOnMismatch``; ``None`` without ``expectedStdout``."""
+    expected = payload.get("expectedStdout")
+    if not isinstance(expected, str):
+        return None
+    return OutputComparer(
+        expected,
+        payload.get("compareMode") or DEFAULT_MODE,
+        float(payload.get("numericTolerance", DEFAULT_NUMERIC_TOLERANCE)),
+        bool(payload.get("stopOnMismatch", True)),
+    )
+
+
+def compare(actual: str, expected: str, mode: str = DEFAULT_MODE,
+            tolerance: float = DEFAULT_NUMERIC_TOLERANCE) -> Dict[str, Any]:
+    """Compare two complete outputs and return the verdict."""
+    comparer = OutputComparer(expected, mode, tolerance, stop_on_mismatch=False)
+    comparer.feed(actual)
+    return comparer.finish()
+
+
+def main() -> None:
+    raw = sys.stdin.read()
+    payload = json.loads(raw or "{}")
+    comparer = comparer_from_request({"expectedStdout": "", **payload, "stopOnMismatch": False})
+    comparer.feed(payload.get("stdout", ""))
+    print(json.dumps(comparer.finish()))
+
+
+if __name__ == "__main__":
+    main()
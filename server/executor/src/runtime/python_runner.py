@@ -1,23 +1,75 @@
 #!/usr/bin/env python3
 """Sandbox runner for executing user Python code with resource limits."""
 
+import argparse
+import ast
 import builtins as _builtins
 import contextlib
+import hashlib
 import io
 import json
+import marshal
+import math
 import os
 import resource
+import selectors
 import signal
+import socket
 import sys
-from types import SimpleNamespace
+import time
+import tracemalloc
+from collections import OrderedDict
+from types import ModuleType, SimpleNamespace
+
+import level_grader
+import output_judge
+import python_static_checker
+import turtle_judge
 
 CPU_LIMIT_SECONDS = float(os.environ.get("EXECUTOR_CPU_LIMIT", "2.0"))
 MEM_LIMIT_BYTES = int(float(os.environ.get("EXECUTOR_MEM_LIMIT", str(256 * 1024 * 1024))))
+WALL_CLOCK_TIMEOUT_SECONDS = float(os.environ.get("EXECUTOR_TIMEOUT", "3.0"))
+BATCH_PARALLELISM = int(os.environ.get("EXECUTOR_BATCH_PARALLELISM", str(os.cpu_count() or 1)))
+CODE_CACHE_ENTRIES = int(os.environ.get("EXECUTOR_CODE_CACHE_ENTRIES", "256"))
+CODE_CACHE_DIR = os.environ.get("EXECUTOR_CODE_CACHE_DIR") or None
+CODE_CACHE_MAX_BYTES = int(os.environ.get("EXECUTOR_CODE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+OUTPUT_LIMIT_BYTES = int(os.environ.get("EXECUTOR_OUTPUT_LIMIT", str(64 * 1024)))
+# Runaway output stops the program after this many bytes. Unset, it is ``OUTPUT_STOP_FACTOR``
+# times the output limit, which a ``while True: print(1)`` loop reaches in well under a CPU
+# second, so such programs end with truncated output instead of a timeout.
+OUTPUT_STOP_BYTES = int(os.environ["EXECUTOR_OUTPUT_STOP"]) if os.environ.get("EXECUTOR_OUTPUT_STOP") else None
+OUTPUT_STOP_FACTOR = 2
+STREAM_FLUSH_INTERVAL_SECONDS = float(os.environ.get("EXECUTOR_STREAM_FLUSH_INTERVAL", "0.05"))
+RESULT_CACHE_ENTRIES = int(os.environ.get("EXECUTOR_RESULT_CACHE_ENTRIES", "512"))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("EXECUTOR_RESULT_CACHE_TTL", "300"))
+STEP_BUDGET = int(os.environ.get("EXECUTOR_STEP_BUDGET", "0"))
+PROFILE_TOP_LINES = int(os.environ.get("EXECUTOR_PROFILE_TOP_LINES", "10"))
 
 ALLOWED_MODULES = set(
     json.loads(os.environ.get("EXECUTOR_ALLOWED_MODULES", "[\"math\", \"random\", \"turtle\"]"))
 )
 
+# Request keys forwarded to sandbox modules (e.g. turtle SVG rendering and timeline recording).
+SANDBOX_OPTION_KEYS = ("svg", "svgTolerance", "svgMaxBytes", "timeline")
+
+# Request keys read by the in-runner drawing judge.
+DRAWING_JUDGE_KEYS = ("expectedSegments", "lengthTolerance", "angleTolerance", "rotationInvariant", "includeSegments")
+
+# Request (or batch case) keys read by the in-runner output judge.
+OUTPUT_JUDGE_KEYS = ("expectedStdout", "compareMode", "numericTolerance", "stopOnMismatch", "includeStdout")
+
+# Request (or batch case) keys read by the in-runner level grader (maze, LED and music levels).
+LEVEL_GRADER_KEYS = ("grader", "assets", "includeEvents")
+
+# Filename given to compiled user code; the step budget only counts lines of this file.
+USER_CODE_FILENAME = "<user_code>"
+
+# Modules whose behaviour depends on the wall clock or OS entropy; unavailable in deterministic mode.
+NONDETERMINISTIC_MODULES = {"time", "datetime", "secrets", "uuid"}
+
+# ``input`` is not listed: it reads the request's ``stdin`` from the StringIO installed as
+# ``sys.stdin`` (never the runner's own stdin), raises EOFError once that is used up and
+# writes its prompt through the capped stdout, so it is bounded like ``print``.
 DANGEROUS_BUILTINS = {
     "open",
     "exec",
@@ -27,18 +79,20 @@ DANGEROUS_BUILTINS = {
     "globals",
     "locals",
     "vars",
-    "input",
     "help",
     "quit",
     "exit",
 }
 
 
-def _apply_limits():
-    cpu_limit = max(1, int(CPU_LIMIT_SECONDS))
+def _apply_limits(limits=None):
+    limits = limits or default_limits()
+    # RLIMIT_CPU only has whole-second granularity, so it is just a backstop for code stuck
+    # in C; the precise CPU limit is the ITIMER_PROF timer below.
+    cpu_limit = math.ceil(limits.cpu_seconds) + 1
     resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
     try:
-        resource.setrlimit(resource.RLIMIT_AS, (MEM_LIMIT_BYTES, MEM_LIMIT_BYTES))
+        resource.setrlimit(resource.RLIMIT_AS, (limits.mem_bytes, limits.mem_bytes))
     except (ValueError, OSError):
         # Some platforms (e.g. macOS) might not support RLIMIT_AS adjustments.
         pass
@@ -46,9 +100,386 @@ def _apply_limits():
     def alarm_handler(_signum, _frame):
         raise TimeoutError("Execution timed out")
 
-    wall_clock_timeout = max(1, int(float(os.environ.get("EXECUTOR_TIMEOUT", "3.0"))))
+    def cpu_handler(_signum, _frame):
+        raise TimeoutError("CPU time limit exceeded")
+
     signal.signal(signal.SIGALRM, alarm_handler)
-    signal.alarm(wall_clock_timeout)
+    signal.signal(signal.SIGPROF, cpu_handler)
+    signal.setitimer(signal.ITIMER_REAL, max(0.001, limits.timeout_seconds))
+    signal.setitimer(signal.ITIMER_PROF, max(0.001, limits.cpu_seconds))
+
+
+def _cancel_timers():
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+def _output_stop_bytes(output_bytes):
+    return OUTPUT_STOP_BYTES if OUTPUT_STOP_BYTES is not None else OUTPUT_STOP_FACTOR * max(0, output_bytes)
+
+
+def default_limits():
+    return SimpleNamespace(
+        cpu_seconds=CPU_LIMIT_SECONDS,
+        mem_bytes=MEM_LIMIT_BYTES,
+        timeout_seconds=WALL_CLOCK_TIMEOUT_SECONDS,
+        output_bytes=OUTPUT_LIMIT_BYTES,
+        output_stop_bytes=_output_stop_bytes(OUTPUT_LIMIT_BYTES),
+        step_budget=STEP_BUDGET,
+    )
+
+
+def limits_from_request(data):
+    """Limits for one request: the process defaults with the request's overrides applied.
+
+    Overrides are honoured in every mode. ``cpuSeconds`` and ``memoryLimitBytes`` can only
+    tighten the defaults from the environment, never raise them, since the request comes
+    from the caller and the environment from whoever started the runner.
+    """
+    limits = default_limits()
+    if data.get("cpuSeconds") is not None:
+        limits.cpu_seconds = min(float(data["cpuSeconds"]), limits.cpu_seconds)
+    if data.get("memoryLimitBytes") is not None:
+        limits.mem_bytes = min(int(data["memoryLimitBytes"]), limits.mem_bytes)
+    if data.get("timeoutMs") is not None:
+        limits.timeout_seconds = float(data["timeoutMs"]) / 1000
+    if data.get("outputLimitBytes") is not None:
+        limits.output_bytes = int(data["outputLimitBytes"])
+        limits.output_stop_bytes = _output_stop_bytes(limits.output_bytes)
+    if data.get("outputStopBytes") is not None:
+        limits.output_stop_bytes = int(data["outputStopBytes"])
+    if data.get("stepBudget") is not None:
+        limits.step_budget = int(data["stepBudget"])
+    return limits
+
+
+class StepBudgetExceeded(BaseException):
+    """Stops user code that executes more lines than its step budget; see ``OutputLimitExceeded``."""
+
+
+class StepCounter:
+    """Counts executed lines of user code via ``sys.settrace`` and enforces a budget.
+
+    Only frames of ``USER_CODE_FILENAME`` get a local trace function, so library code
+    (turtle, math, ...) runs untraced. Nothing is installed when no budget is set and
+    profiling is off. A budget of ``0`` only counts; with ``per_line`` the hits of every
+    line number are kept in ``lines`` for the profile's hot-line report.
+    """
+
+    def __init__(self, budget, per_line=False):
+        self.budget = budget
+        self.steps = 0
+        self.exceeded = False
+        self.lines = {} if per_line else None
+
+    def _call(self, frame, event, _arg):
+        if frame.f_code.co_filename == USER_CODE_FILENAME:
+            return self._line
+        return None
+
+    def _line(self, frame, event, _arg):
+        if event == "line":
+            self.steps += 1
+            if self.lines is not None:
+                self.lines[frame.f_lineno] = self.lines.get(frame.f_lineno, 0) + 1
+            if self.budget and self.steps > self.budget:
+                self.exceeded = True
+                raise StepBudgetExceeded(f"Step budget of {self.budget} exceeded")
+        return self._line
+
+    def start(self):
+        sys.settrace(self._call)
+
+    def stop(self):
+        sys.settrace(None)
+
+
+class PhaseTimer:
+    """Wall and CPU seconds per named phase, reported as the response's ``phases``."""
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add(self, name, wall_seconds, cpu_seconds):
+        entry = self.phases.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0})
+        entry["wall_seconds"] += wall_seconds
+        entry["cpu_seconds"] += cpu_seconds
+
+
+def _process_age_seconds():
+    """Wall seconds since this process was started (Linux ``/proc``; ``None`` elsewhere)."""
+    try:
+        with open("/proc/self/stat", "rb") as handle:
+            # Field 22 (after the parenthesised command name) is the start time in clock ticks since boot
+            started_ticks = int(handle.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "rb") as handle:
+            uptime = float(handle.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(0.0, uptime - started_ticks / os.sysconf("SC_CLK_TCK"))
+
+
+def _profile_report(counter, snapshot, peak_bytes, top=PROFILE_TOP_LINES):
+    """Profile block: tracemalloc peak and allocations plus the hottest user-code lines."""
+    total = counter.steps or 1
+    hot = sorted(counter.lines.items(), key=lambda item: (-item[1], item[0]))[:top]
+    allocations = snapshot.filter_traces([tracemalloc.Filter(True, USER_CODE_FILENAME)]).statistics("lineno")
+    return {
+        "peak_bytes": peak_bytes,
+        "live_blocks": sum(stat.count for stat in snapshot.statistics("filename")),
+        "steps": counter.steps,
+        "hot_lines": [
+            {"line": line, "hits": hits, "share": round(hits / total, 4)} for line, hits in hot
+        ],
+        "allocation_lines": [
+            {"line": stat.traceback[0].lineno, "bytes": stat.size, "blocks": stat.count}
+            for stat in [stat for stat in allocations if stat.traceback[0].lineno > 0][:top]
+        ],
+    }
+
+
+class OutputLimitExceeded(BaseException):
+    """Stops user code that keeps printing past the output stop limit.
+
+    Derives from BaseException so a student's ``except Exception`` cannot swallow it.
+    """
+
+
+class CappedOutput(io.TextIOBase):
+    """Text sink that keeps only the first and last ``limit_bytes / 2`` bytes written.
+
+    The tail lives in a fixed-size ring buffer, so runaway output costs O(limit) memory.
+    Once more than ``stop_bytes`` have been written every further write raises
+    ``OutputLimitExceeded`` (until ``silence()`` is called).
+
+    ``on_write`` sees every write in full (the output judges need all of it), while
+    ``on_stream`` only gets the first ``limit_bytes`` (at most ``stop_bytes``) bytes, so
+    streamed frames are bounded like the final result.
+    """
+
+    def __init__(self, limit_bytes, stop_bytes=0, on_write=None, on_stream=None):
+        super().__init__()
+        self._on_write = on_write
+        self._on_stream = on_stream
+        self._stream_room = max(0, min(limit_bytes, stop_bytes) if stop_bytes else limit_bytes)
+        self._head_limit = max(0, limit_bytes) // 2
+        self._head = bytearray()
+        self._ring = bytearray(max(0, limit_bytes) - self._head_limit)
+        self._ring_pos = 0
+        self._ring_len = 0
+        self._stop_bytes = stop_bytes
+        self._silenced = False
+        self.bytes_written = 0
+        self.stopped = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if not isinstance(text, str):
+            raise TypeError(f"write() argument must be str, not {type(text).__name__}")
+        if self.stopped and self._silenced:
+            return len(text)
+        data = text.encode("utf-8", "surrogatepass")
+        if self._on_stream is not None and not self.stopped and self._stream_room > 0:
+            piece = data[:self._stream_room]
+            self._stream_room -= len(piece)
+            # A character cut at the limit is left out rather than sent half-encoded
+            self._on_stream(text if len(piece) == len(data) else piece.decode("utf-8", "ignore"))
+        if self._on_write is not None and not self.stopped:
+            # May raise (output judge mismatch); such a write is discarded, not counted as dropped
+            self._on_write(text)
+        self.bytes_written += len(data)
+
+        room = self._head_limit - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data:
+            self._push_tail(data)
+
+        if self._stop_bytes and self.bytes_written > self._stop_bytes:
+            self.stopped = True
+            if not self._silenced:
+                raise OutputLimitExceeded(
+                    f"Output limit exceeded: program stopped after {self.bytes_written} bytes"
+                )
+        return len(text)
+
+    def _push_tail(self, data):
+        capacity = len(self._ring)
+        if not capacity:
+            return
+        if len(data) >= capacity:
+            self._ring[:] = data[-capacity:]
+            self._ring_pos = 0
+            self._ring_len = capacity
+            return
+        end = self._ring_pos + len(data)
+        if end <= capacity:
+            self._ring[self._ring_pos:end] = data
+        else:
+            first = capacity - self._ring_pos
+            self._ring[self._ring_pos:] = data[:first]
+            self._ring[:len(data) - first] = data[first:]
+        self._ring_pos = end % capacity
+        self._ring_len = min(capacity, self._ring_len + len(data))
+
+    def silence(self):
+        """Drop further writes without raising (used while exit handlers run)."""
+        self._silenced = True
+
+    @property
+    def bytes_dropped(self):
+        return self.bytes_written - len(self._head) - self._ring_len
+
+    @property
+    def truncated(self):
+        return self.bytes_dropped > 0
+
+    def getvalue(self):
+        if self._ring_len < len(self._ring):
+            tail = bytes(self._ring[:self._ring_len])
+        else:
+            tail = bytes(self._ring[self._ring_pos:] + self._ring[:self._ring_pos])
+        head = bytes(self._head).decode("utf-8", "replace")
+        if not self.truncated:
+            return head + tail.decode("utf-8", "replace")
+        marker = f"\n... [{self.bytes_dropped} bytes truncated] ...\n"
+        return head + marker + tail.decode("utf-8", "replace")
+
+
+class FrameEmitter:
+    """Writes NDJSON frames (``stdout``/``stderr`` chunks, ``turtle`` events) while code runs.
+
+    Pending output is coalesced in order and flushed on a newline, once 4 KiB or 256 turtle
+    events are queued, or when ``interval`` seconds passed since the last flush. Frames go
+    straight to ``fd`` with ``os.write`` so forked children never touch the parent's buffers.
+    """
+
+    def __init__(self, fd, request_id=None, interval=STREAM_FLUSH_INTERVAL_SECONDS):
+        self.fd = fd
+        self.request_id = request_id
+        self.interval = interval
+        self._pending = []
+        self._pending_size = 0
+        self._last_flush = time.monotonic()
+
+    def output(self, stream, text):
+        if self._pending and self._pending[-1][0] == stream:
+            self._pending[-1][1].append(text)
+        else:
+            self._pending.append((stream, [text]))
+        self._pending_size += len(text)
+        if "\n" in text or self._pending_size >= 4096 or self._due():
+            self.flush()
+
+    def turtle(self, event):
+        if self._pending and self._pending[-1][0] == "turtle":
+            self._pending[-1][1].append(event)
+        else:
+            self._pending.append(("turtle", [event]))
+        self._pending_size += 16
+        if len(self._pending[-1][1]) >= 256 or self._due():
+            self.flush()
+
+    def _due(self):
+        return time.monotonic() - self._last_flush >= self.interval
+
+    def flush(self):
+        pending, self._pending, self._pending_size = self._pending, [], 0
+        self._last_flush = time.monotonic()
+        for kind, items in pending:
+            if kind == "turtle":
+                self.send({"type": "turtle", "events": items})
+            else:
+                self.send({"type": kind, "data": "".join(items)})
+
+    def send(self, frame):
+        if self.request_id is not None:
+            frame["id"] = self.request_id
+        data = (json.dumps(frame) + "\n").encode("utf-8")
+        while data:
+            written = os.write(self.fd, data)
+            data = data[written:]
+
+
+# Emitter of the run in progress; the turtle module publishes live drawing events to it.
+_active_frames = None
+
+# Sandbox-provided modules (e.g. turtle) loaded by the current run. Each exposes
+# ``_sandbox_result(options)`` returning a dict that is merged into the runner response,
+# and may expose ``_sandbox_configure(options)`` which is called right after loading.
+_sandbox_modules = []
+
+# Request options of the run in progress, see SANDBOX_OPTION_KEYS.
+_sandbox_options = {}
+
+_turtle_code = None
+
+
+def _find_turtle_path():
+    # Try multiple possible locations for turtle.py
+    possible_paths = [
+        os.path.join(os.path.dirname(__file__), "turtle.py"),  # Local development
+        "/opt/task/turtle.py",  # Docker container
+        os.path.join(os.getcwd(), "turtle.py"),  # Current working directory
+    ]
+    for path in possible_paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _load_turtle_module():
+    """Instantiate the custom turtle module, compiling its source only once per process."""
+    global _turtle_code
+
+    loaded = sys.modules.get("turtle")
+    if loaded is not None and getattr(loaded, "__file__", None) == getattr(_turtle_code, "co_filename", None):
+        return loaded
+
+    if _turtle_code is None:
+        turtle_path = _find_turtle_path()
+        if turtle_path is None:
+            raise ImportError("turtle.py module not found")
+        with open(turtle_path, "r", encoding="utf-8") as handle:
+            _turtle_code = compile(handle.read(), turtle_path, "exec")
+
+    turtle_module = ModuleType("turtle")
+    turtle_module.__file__ = _turtle_code.co_filename
+    sys.modules["turtle"] = turtle_module
+    exec(_turtle_code, turtle_module.__dict__)
+    if _active_frames is not None:
+        turtle_module._event_listener = _active_frames.turtle
+    turtle_module._sandbox_configure(_sandbox_options)
+    _sandbox_modules.append(turtle_module)
+    return turtle_module
+
+
+def _reset_sandbox_modules():
+    # Every run starts from fresh module state, even when several runs share a process.
+    for module in _sandbox_modules:
+        if sys.modules.get(module.__name__) is module:
+            del sys.modules[module.__name__]
+    _sandbox_modules.clear()
+
+
+def _collect_sandbox_results():
+    results = {}
+    for module in _sandbox_modules:
+        collect = getattr(module, "_sandbox_result", None)
+        if collect is not None:
+            results.update(collect(_sandbox_options))
+    return results
 
 
 class RestrictedImporter:
@@ -59,48 +490,253 @@ class RestrictedImporter:
         root = name.split(".")[0]
         if root not in self.allowed_modules:
             raise ImportError(f"Import of '{root}' is not allowed")
-        
+
         # Handle custom turtle module
         if name == "turtle":
-            import importlib.util
-            import os
-            # Try multiple possible locations for turtle.py
-            possible_paths = [
-                os.path.join(os.path.dirname(__file__), "turtle.py"),  # Local development
-                "/opt/task/turtle.py",  # Docker container
-                os.path.join(os.getcwd(), "turtle.py"),  # Current working directory
-            ]
-            
-            turtle_path = None
-            for path in possible_paths:
-                if os.path.exists(path):
-                    turtle_path = path
-                    break
-            
-            if turtle_path is None:
-                raise ImportError("turtle.py module not found")
-                
-            spec = importlib.util.spec_from_file_location("turtle", turtle_path)
-            turtle_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(turtle_module)
-            sys.modules["turtle"] = turtle_module
-            return turtle_module
-        
+            return _load_turtle_module()
+
         return __import__(name, globals, locals, fromlist, level)
 
 
-def _make_safe_builtins():
+def _make_safe_builtins(allowed_modules=None):
     safe = dict(_builtins.__dict__)
     for name in DANGEROUS_BUILTINS:
         safe.pop(name, None)
-    safe["__import__"] = RestrictedImporter(ALLOWED_MODULES)
+    safe["__import__"] = RestrictedImporter(ALLOWED_MODULES if allowed_modules is None else allowed_modules)
     return safe
 
 
-def execute_user_code(source: str, stdin_payload: str):
-    _apply_limits()
+class StaticCheckError(Exception):
+    """Raised by ``prepare_code`` when the static checker rejects a submission."""
+
+    def __init__(self, issues, timings, rejections=(), warnings=()):
+        super().__init__("; ".join(issues))
+        self.issues = issues
+        self.timings = timings
+        self.rejections = list(rejections)
+        self.warnings = list(warnings)
+
+
+class LRUCache:
+    """Small bounded mapping with least-recently-used eviction and an optional TTL."""
+
+    def __init__(self, max_entries, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        expires_at = None if self.ttl_seconds is None else time.monotonic() + self.ttl_seconds
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+# Bumped whenever the layout of cached entries changes, so stale disk entries are never read.
+CODE_CACHE_FORMAT = b"code+warnings\0"
 
-    import socket
+
+class CodeCache:
+    """Content-addressed cache of compiled submissions.
+
+    Keys hash the source together with the Python version, the allowed-module set and
+    whether the static check ran, so a hit is always safe to execute. Entries are
+    ``(code, warnings)`` tuples (the checker's warnings travel with the code) and are
+    kept in memory (useful in server mode, where the parent compiles before forking) and,
+    when ``directory`` is set, marshalled to disk with size-bounded LRU eviction (by mtime).
+    """
+
+    def __init__(self, max_entries, directory=None, max_bytes=0):
+        self.memory = LRUCache(max_entries)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(source, allowed_modules, check):
+        digest = hashlib.sha256()
+        digest.update(CODE_CACHE_FORMAT)
+        digest.update(sys.version.encode("utf-8"))
+        digest.update(b"\0" + json.dumps(sorted(allowed_modules)).encode("utf-8"))
+        digest.update(b"\0" + (b"checked" if check else b"unchecked"))
+        digest.update(b"\0" + source.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        code = self.memory.get(key)
+        if code is None and self.directory:
+            code = self._read(key)
+            if code is not None:
+                self.memory.put(key, code)
+        if code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return code
+
+    def put(self, key, code):
+        self.memory.put(key, code)
+        if self.directory:
+            self._write(key, code)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as handle:
+                code = marshal.loads(handle.read())
+            os.utime(path)
+            return code
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _write(self, key, code):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as handle:
+                handle.write(marshal.dumps(code))
+            os.replace(temp_path, self._path(key))
+            self._evict()
+        except OSError:
+            # The disk cache is best effort; a failed write only costs a recompile.
+            pass
+
+    def _evict(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(".bin"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+            total -= size
+
+
+CODE_CACHE = CodeCache(CODE_CACHE_ENTRIES, CODE_CACHE_DIR, CODE_CACHE_MAX_BYTES)
+
+# Memoized responses of deterministic runs, keyed by ``_result_cache_key``.
+RESULT_CACHE = LRUCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+
+
+def prepare_code(source: str, allowed_modules=None, check=False):
+    """Parse ``source`` once, optionally run the static checker on that tree, then compile it.
+
+    Returns a namespace with the code object, the checker's ``warnings``,
+    ``parse_seconds``/``check_seconds``/``compile_seconds`` timings and the CPU seconds of
+    the whole step (``cpu_seconds``). Sources already
+    compiled under the same settings are served from ``CODE_CACHE`` without parsing or
+    compiling.
+    """
+    allowed_modules = ALLOWED_MODULES if allowed_modules is None else allowed_modules
+    timings = {"parse_seconds": 0.0, "check_seconds": 0.0, "compile_seconds": 0.0}
+    started_cpu = time.process_time()
+
+    cache_key = CODE_CACHE.key(source, allowed_modules, check)
+    cached = CODE_CACHE.get(cache_key)
+    if cached is not None:
+        code, warnings = cached
+        timings.update(code_cache_hits=CODE_CACHE.hits, code_cache_misses=CODE_CACHE.misses)
+        return SimpleNamespace(
+            code=code, warnings=warnings, timings=timings, cpu_seconds=time.process_time() - started_cpu
+        )
+
+    started = time.perf_counter()
+    tree = compile(source, USER_CODE_FILENAME, "exec", ast.PyCF_ONLY_AST)
+    timings["parse_seconds"] = time.perf_counter() - started
+
+    warnings = []
+    if check:
+        started = time.perf_counter()
+        report = python_static_checker.report_tree(tree, allowed_modules)
+        timings["check_seconds"] = time.perf_counter() - started
+        if report["issues"]:
+            raise StaticCheckError(report["issues"], timings, report["rejections"], report["warnings"])
+        warnings = report["warnings"]
+
+    started = time.perf_counter()
+    code = compile(tree, USER_CODE_FILENAME, "exec")
+    timings["compile_seconds"] = time.perf_counter() - started
+    CODE_CACHE.put(cache_key, (code, warnings))
+    timings.update(code_cache_hits=CODE_CACHE.hits, code_cache_misses=CODE_CACHE.misses)
+    return SimpleNamespace(
+        code=code, warnings=warnings, timings=timings, cpu_seconds=time.process_time() - started_cpu
+    )
+
+
+def compile_source(source: str):
+    return prepare_code(source).code
+
+
+def execute_user_code(
+    source,
+    stdin_payload: str,
+    allowed_modules=None,
+    limits=None,
+    check=False,
+    seed=None,
+    frames=None,
+    sandbox_options=None,
+    comparer=None,
+    profile=False,
+    grader=None,
+):
+    """Run ``source`` under the sandbox limits.
+
+    ``source`` may be a string, a code object or the result of ``prepare_code``. A non-None
+    ``seed`` seeds ``random`` before the user code runs (deterministic mode). With a
+    ``FrameEmitter`` in ``frames`` output and turtle events are streamed while the code runs.
+    ``sandbox_options`` is passed to sandbox modules when they are loaded and collected.
+    An ``output_judge.OutputComparer`` in ``comparer`` sees stdout as it is written and may
+    stop the program at the first mismatching line. ``profile`` traces allocations and
+    per-line hits of the user code (see ``_profile_report``); it slows the run down. A
+    ``level_grader.LevelGrader`` in ``grader`` puts its simulated APIs into the user globals,
+    collects events from stdout and calls the program's ``solve`` after the module body.
+    """
+    global _active_frames, _sandbox_options
+
+    _reset_sandbox_modules()
+    _apply_limits(limits)
+    if isinstance(source, str):
+        try:
+            prepared = prepare_code(source, allowed_modules, check)
+        except BaseException:
+            _cancel_timers()
+            raise
+    elif isinstance(source, SimpleNamespace):
+        prepared = source
+    else:
+        prepared = SimpleNamespace(code=source, warnings=[], timings={})
+    timer = PhaseTimer()
+    timer.add(
+        "compile",
+        sum(prepared.timings.get(key, 0.0) for key in ("parse_seconds", "check_seconds", "compile_seconds")),
+        getattr(prepared, "cpu_seconds", 0.0),
+    )
 
     def disabled_socket(*_args, **_kwargs):
         raise OSError("Network access is disabled")
@@ -108,12 +744,38 @@ def execute_user_code(source: str, stdin_payload: str):
     socket.socket = disabled_socket  # type: ignore
 
     user_globals = {
-        "__builtins__": _make_safe_builtins(),
+        "__builtins__": _make_safe_builtins(allowed_modules),
     }
+    if grader is not None:
+        user_globals.update(grader.globals())
+
+    if seed is not None:
+        import random
 
+        random.seed(seed)
+
+    limits = limits or default_limits()
     stdin_buffer = io.StringIO(stdin_payload or "")
-    stdout_buffer = io.StringIO()
-    stderr_buffer = io.StringIO()
+    def on_stdout(text):
+        if comparer is not None:
+            comparer.feed(text)
+        if grader is not None:
+            grader.feed(text)
+
+    stdout_buffer = CappedOutput(
+        limits.output_bytes,
+        limits.output_stop_bytes,
+        None if comparer is None and grader is None else on_stdout,
+        None if frames is None else lambda text: frames.output("stdout", text),
+    )
+    stderr_buffer = CappedOutput(
+        limits.output_bytes,
+        limits.output_stop_bytes,
+        None,
+        None if frames is None else lambda text: frames.output("stderr", text),
+    )
+    _active_frames = frames
+    _sandbox_options = sandbox_options or {}
 
     original_stdout = sys.stdout
     original_stderr = sys.stderr
@@ -124,84 +786,170 @@ def execute_user_code(source: str, stdin_payload: str):
     sys.stderr = stderr_buffer
     sys.stdin = stdin_buffer
     
+    output_error = None
+    report = None
+    counter = StepCounter(limits.step_budget, per_line=profile) if limits.step_budget > 0 or profile else None
     try:
-        exec(compile(source, filename="<user_code>", mode="exec"), user_globals)
-        
+        started_wall, started_cpu = time.perf_counter(), time.process_time()
+        try:
+            if profile:
+                tracemalloc.start()
+            if counter is not None:
+                counter.start()
+            exec(prepared.code, user_globals)
+            if grader is not None:
+                grader.run_entry(user_globals)
+        except OutputLimitExceeded as exc:
+            output_error = str(exc)
+            stdout_buffer.silence()
+            stderr_buffer.silence()
+        except (output_judge.OutputMismatch, level_grader.GradeSettled):
+            # The verdict is settled; whatever the program would do next is irrelevant
+            for judge in (comparer, grader):
+                if judge is not None:
+                    judge.close()
+            stdout_buffer.silence()
+            stderr_buffer.silence()
+        finally:
+            if counter is not None:
+                counter.stop()
+            if profile:
+                report = _profile_report(counter, tracemalloc.take_snapshot(), tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        if counter is not None and counter.exceeded:
+            # The student's code may have swallowed the exception with a bare ``except``
+            raise StepBudgetExceeded(f"Step budget of {counter.budget} exceeded")
+
+        if comparer is not None:
+            comparer.stop_on_mismatch = False
+        if grader is not None:
+            grader.stop_on_fail = False
+
         # Force any atexit handlers to run while stdout is still redirected
         import atexit
         atexit._run_exitfuncs()
-        
+        timer.add("execute", time.perf_counter() - started_wall, time.process_time() - started_cpu)
+
+        # Graphics results travel beside stdout, never inside it
+        with timer.phase("render"):
+            graphics = _collect_sandbox_results()
+
+    except (TimeoutError, StepBudgetExceeded) as exc:
+        # Checker warnings often explain why the run did not finish
+        exc.warnings = prepared.warnings
+        raise
     finally:
         sys.stdin = original_stdin
         sys.stdout = original_stdout
         sys.stderr = original_stderr
-        signal.alarm(0)
+        _cancel_timers()
+        _active_frames = None
+        _sandbox_options = {}
+        if frames is not None:
+            frames.flush()
 
+    stderr = stderr_buffer.getvalue()
+    if output_error:
+        stderr = f"{stderr}{output_error}\n"
     return SimpleNamespace(
         stdout=stdout_buffer.getvalue(),
-        stderr=stderr_buffer.getvalue(),
+        stderr=stderr,
         usage=resource.getrusage(resource.RUSAGE_SELF),
+        timings=prepared.timings,
+        truncated=stdout_buffer.truncated or stderr_buffer.truncated,
+        bytes_dropped=stdout_buffer.bytes_dropped + stderr_buffer.bytes_dropped,
+        output_limit_exceeded=output_error is not None,
+        graphics=graphics,
+        steps=None if counter is None else counter.steps,
+        phases=timer.phases,
+        profile=report,
+        warnings=prepared.warnings,
     )
 
 
-def parse_turtle_output(stdout_content):
-    """Parse turtle SVG and segments output from stdout."""
-    svg = None
-    segments = None
-    
-    lines = stdout_content.split('\n')
-    i = 0
-    while i < len(lines):
-        if lines[i] == "SVG_OUTPUT_START":
-            i += 1
-            svg_lines = []
-            while i < len(lines) and lines[i] != "SVG_OUTPUT_END":
-                svg_lines.append(lines[i])
-                i += 1
-            svg = '\n'.join(svg_lines)
-        elif lines[i] == "SEGMENTS_OUTPUT_START":
-            i += 1
-            if i < len(lines) and lines[i] != "SEGMENTS_OUTPUT_END":
-                try:
-                    segments_data = json.loads(lines[i])
-                    segments = segments_data.get("segments", [])
-                except json.JSONDecodeError:
-                    pass
-        i += 1
-    
-    return svg, segments
+def _allowed_modules_from_request(data):
+    allowed_modules = data.get("allowedModules")
+    if data.get("deterministic"):
+        return set(ALLOWED_MODULES if allowed_modules is None else allowed_modules) - NONDETERMINISTIC_MODULES
+    return None if allowed_modules is None else set(allowed_modules)
 
 
-def main():
-    raw = sys.stdin.read()
-    data = json.loads(raw)
-    source = data.get("source", "")
-    stdin_payload = data.get("stdin", "")
+def _seed_from_request(data):
+    if not data.get("deterministic"):
+        return None
+    seed = data.get("seed", 0)
+    return seed if isinstance(seed, (int, str)) else json.dumps(seed, sort_keys=True)
+
 
+def _build_response(source, stdin_payload, data, limits, frames=None, judge_options=None):
+    judge_options = data if judge_options is None else judge_options
+    comparer = None
+    grader = None
     try:
-        result = execute_user_code(source, stdin_payload)
-        
-        # Parse turtle output from stdout
-        svg, segments = parse_turtle_output(result.stdout)
-        
+        comparer = output_judge.comparer_from_request(judge_options)
+        grader = level_grader.grader_from_request(judge_options)
+        result = execute_user_code(
+            source,
+            stdin_payload,
+            _allowed_modules_from_request(data),
+            limits,
+            bool(data.get("check")),
+            _seed_from_request(data),
+            frames,
+            {key: data[key] for key in SANDBOX_OPTION_KEYS if key in data},
+            comparer,
+            bool(data.get("profile")),
+            grader,
+        )
+
         response = {
             "stdout": result.stdout,
             "stderr": result.stderr,
             "timeout": False,
+            "truncated": result.truncated,
+            "bytesDropped": result.bytes_dropped,
             "usage": {
                 "cpu_seconds": result.usage.ru_utime + result.usage.ru_stime,
                 "max_rss": result.usage.ru_maxrss,
+                **result.timings,
             },
         }
-        
-        # Add turtle-specific outputs if found
-        if svg is not None:
-            response["svg"] = svg
-        if segments is not None:
-            response["segments"] = segments
-            
+        if result.steps is not None:
+            response["usage"]["steps"] = result.steps
+        if result.warnings:
+            response["warnings"] = result.warnings
+        response["phases"] = result.phases
+        if result.profile is not None:
+            response["profile"] = result.profile
+
+        # Add turtle-specific outputs (svg, segments) if any were drawn
+        response.update(result.graphics)
+        if "expectedSegments" in data:
+            # Grade the drawing here so the raw segment list need not be shipped back
+            response["drawing"] = turtle_judge.compare_request(result.graphics.get("segments") or [], data)
+            if not data.get("includeSegments"):
+                response.pop("segments", None)
+        if comparer is not None:
+            # Likewise the verdict replaces the output unless the caller asks for both
+            response["comparison"] = comparer.finish()
+            response["passed"] = response["comparison"]["pass"]
+            if not judge_options.get("includeStdout"):
+                response.pop("stdout")
+        if grader is not None:
+            response["grade"] = grader.finish()
+            response["passed"] = response.get("passed", True) and response["grade"]["pass"]
+
+    except StaticCheckError as exc:
+        response = _rejection_response(exc)
     except TimeoutError as exc:
         response = {"stdout": "", "stderr": str(exc), "timeout": True}
+        if getattr(exc, "warnings", None):
+            response["warnings"] = exc.warnings
+    except StepBudgetExceeded as exc:
+        # Deterministic, unlike a timeout: the same code always stops at the same line
+        response = {"stdout": "", "stderr": str(exc), "timeout": False, "budgetExceeded": True}
+        if getattr(exc, "warnings", None):
+            response["warnings"] = exc.warnings
     except Exception as exc:  # pylint: disable=broad-except
         response = {
             "stdout": "",
@@ -209,7 +957,593 @@ def main():
             "timeout": False,
         }
 
-    print(json.dumps(response))
+    if (comparer is not None or grader is not None) and "passed" not in response:
+        # A run that did not finish never passes; report how far its output got
+        response["passed"] = False
+        if comparer is not None and comparer.mismatch is not None:
+            response["comparison"] = comparer.verdict()
+        if grader is not None and grader.failure is not None:
+            response["grade"] = grader.verdict()
+    if grader is not None:
+        # For the forking process, which recomputes the verdict (see ``_regrade``)
+        response["gradeActions"] = grader.actions
+    return response
+
+
+def _regrade(judge_options, response):
+    """Replace a run's level verdict with one replayed from its action log.
+
+    Called in the process that forked the run. The child's grader shared its memory with
+    the user code, so only the logged actions (``gradeActions``) are taken from it.
+    """
+    actions = response.pop("gradeActions", None)
+    if not isinstance(judge_options.get("grader"), dict):
+        return response
+    response.pop("grade", None)
+    try:
+        grader = level_grader.replay_grader(judge_options, actions if actions is not None else [])
+    except ValueError as exc:
+        response["passed"] = False
+        response["stderr"] = f"{response.get('stderr', '')}Level grading failed: {exc}\n"
+        return response
+    if grader is None:
+        return response
+    completed = "usage" in response and not response.get("timeout") and not response.get("issues")
+    if completed:
+        response["grade"] = grader.finish()
+        comparison = response.get("comparison")
+        response["passed"] = response["grade"]["pass"] and (comparison is None or comparison["pass"])
+    else:
+        # A run that did not finish never passes; report a verdict settled on the way
+        response["passed"] = False
+        if grader.failure is not None:
+            response["grade"] = grader.verdict()
+    return response
+
+
+def _rejection_response(exc):
+    return {
+        "stdout": "",
+        "stderr": "Static analysis failed: " + "; ".join(exc.issues),
+        "timeout": False,
+        "issues": exc.issues,
+        "rejections": exc.rejections,
+        "warnings": exc.warnings,
+        "usage": dict(exc.timings),
+    }
+
+
+def _prepare_request(data):
+    """Compile a request's source in the calling process; returns ``(prepared, error_response)``."""
+    try:
+        prepared = prepare_code(
+            data.get("source", ""), _allowed_modules_from_request(data), bool(data.get("check"))
+        )
+    except StaticCheckError as exc:
+        return None, _rejection_response(exc)
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as exc:
+        return None, {"stdout": "", "stderr": f"{type(exc).__name__}: {exc}", "timeout": False}
+    return prepared, None
+
+
+def _case_judge_options(data, case):
+    # Batch-level compare and grader settings apply to every case; each case brings its own
+    # expected output
+    keys = OUTPUT_JUDGE_KEYS + LEVEL_GRADER_KEYS
+    options = {key: data[key] for key in keys if key in data and key != "expectedStdout"}
+    options.update((key, case[key]) for key in keys if key in case)
+    return options
+
+
+def run_request(data, prepared=None, frames=None):
+    """Execute one runner request and build the JSON-serialisable response."""
+    return _build_response(
+        prepared or data.get("source", ""),
+        data.get("stdin", ""),
+        data,
+        limits_from_request(data),
+        frames,
+    )
+
+
+def _run_case(code, case, data):
+    limits = limits_from_request(data)
+    if case.get("timeoutMs") is not None:
+        limits.timeout_seconds = float(case["timeoutMs"]) / 1000
+    return _build_response(code, case.get("stdin", ""), data, limits, judge_options=_case_judge_options(data, case))
+
+
+def _case_failed(response):
+    # Runs that raised never carry a usage block; rejected ones carry ``issues``.
+    return (
+        response.get("timeout")
+        or response.get("budgetExceeded")
+        or response.get("passed") is False
+        or "usage" not in response
+        or bool(response.get("issues"))
+    )
+
+
+def _result_cache_key(data, case=None):
+    """Key for ``RESULT_CACHE``: everything that can influence a deterministic run's output."""
+    limits = limits_from_request(data)
+    material = {
+        "source": hashlib.sha256(data.get("source", "").encode("utf-8", "surrogatepass")).hexdigest(),
+        "stdin": hashlib.sha256(
+            (case if case is not None else data).get("stdin", "").encode("utf-8", "surrogatepass")
+        ).hexdigest(),
+        "case": {key: value for key, value in (case or {}).items() if key != "stdin"},
+        "allowedModules": sorted(_allowed_modules_from_request(data)),
+        "limits": sorted(vars(limits).items()),
+        "seed": _seed_from_request(data),
+        "check": bool(data.get("check")),
+        "options": {
+            key: data[key]
+            for key in SANDBOX_OPTION_KEYS + DRAWING_JUDGE_KEYS + OUTPUT_JUDGE_KEYS + LEVEL_GRADER_KEYS
+            + ("profile",)
+            if key in data
+        },
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _cached_result(key):
+    response = RESULT_CACHE.get(key)
+    return None if response is None else dict(response, cached=True)
+
+
+def _remember_result(key, response):
+    # Timeouts depend on machine load, so only settled outcomes are memoized.
+    if not response.get("timeout") and not response.get("skipped"):
+        RESULT_CACHE.put(key, dict(response))
+
+
+def run_batch(data):
+    """Compile ``source`` once and run every entry of ``cases`` in its own forked child.
+
+    ``parallelism`` bounds how many children run at once and ``failFast`` stops
+    scheduling (and kills in-flight cases) after the first failing case; cases that
+    never ran are reported as ``{"skipped": true}``. Results keep the input order.
+    Deterministic requests serve previously seen cases from ``RESULT_CACHE``;
+    ``finish_request`` memoizes the fresh ones in the process that owns the cache.
+    """
+    cases = data.get("cases") or [{}]
+    parallelism = max(1, int(data.get("parallelism") or BATCH_PARALLELISM))
+    fail_fast = bool(data.get("failFast"))
+
+    timer = PhaseTimer()
+    with timer.phase("compile"):
+        prepared, error = _prepare_request(data)
+    if error is not None:
+        results = [_run_case_error(error, case) for case in cases]
+        return _batch_response(results, error.get("usage"), timer.phases)
+    code = prepared.code
+
+    deterministic = bool(data.get("deterministic"))
+    cache_keys = [_result_cache_key(data, case) if deterministic else None for case in cases]
+    results = [_cached_result(key) if key else None for key in cache_keys]
+    pending = [index for index, result in enumerate(results) if result is None]
+    stopped = fail_fast and any(result is not None and _case_failed(result) for result in results)
+
+    if pending and not stopped:
+        with timer.phase("execute"):
+            fresh = run_cases([(code, cases[index], data) for index in pending], parallelism, fail_fast)
+        for index, result in zip(pending, fresh):
+            results[index] = result
+
+    return _batch_response([result or {"skipped": True} for result in results], prepared.timings, timer.phases)
+
+
+def run_cases(jobs, parallelism=None, fail_fast=False):
+    """Run ``(code, case, data)`` jobs, each in its own forked child, and return their responses.
+
+    ``code`` is a compiled code object (or ``prepare_code`` result) and ``case`` a batch
+    entry; ``data`` supplies everything else, exactly as for ``run_batch``. Jobs may mix
+    sources, so callers can compile many programs up front and fan all of their cases out
+    at once. At most ``parallelism`` children run at a time; with ``fail_fast`` scheduling
+    stops (and in-flight children are killed) after the first failing case, and jobs that
+    never finished are reported as ``{"skipped": true}``. Results keep the input order.
+    """
+    parallelism = max(1, int(parallelism or BATCH_PARALLELISM))
+    results = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    pending.reverse()
+    running = {}
+    stopped = False
+
+    with selectors.DefaultSelector() as selector:
+        while running or (pending and not stopped):
+            while pending and not stopped and len(running) < parallelism:
+                index, (code, case, data) = pending.pop()
+                pid, read_fd = _fork_child(_run_case, code, case, data)
+                running[read_fd] = (index, pid, [])
+                selector.register(read_fd, selectors.EVENT_READ)
+
+            for key, _ in selector.select():
+                index, pid, chunks = running[key.fd]
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    chunks.append(chunk)
+                    continue
+                selector.unregister(key.fd)
+                os.close(key.fd)
+                del running[key.fd]
+                _, case, data = jobs[index]
+                results[index] = _regrade(_case_judge_options(data, case), _child_response(pid, b"".join(chunks)))
+                if fail_fast and _case_failed(results[index]):
+                    stopped = True
+
+            if stopped:
+                for read_fd, (index, pid, _) in list(running.items()):
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                    selector.unregister(read_fd)
+                    os.close(read_fd)
+                    results[index] = {"skipped": True}
+                running.clear()
+
+    return [result or {"skipped": True} for result in results]
+
+
+def _run_case_error(error, case):
+    response = dict(error)
+    if isinstance(case.get("expectedStdout"), str):
+        response["passed"] = False
+    return response
+
+
+def _batch_response(results, timings=None, phases=None):
+    executed = [result for result in results if "cpu_seconds" in result.get("usage", {})]
+    verdicts = [result["passed"] for result in results if "passed" in result]
+    return {
+        "cases": results,
+        "passed": all(verdicts) if verdicts else None,
+        "timeout": any(result.get("timeout") for result in results),
+        "usage": {
+            "cpu_seconds": sum(result["usage"]["cpu_seconds"] for result in executed),
+            "max_rss": max((result["usage"]["max_rss"] for result in executed), default=0),
+            **(timings or {}),
+        },
+        "phases": phases or {},
+    }
+
+
+def encode_response(response):
+    """JSON-encode ``response`` and add the encoding time itself as ``phases.serialize``.
+
+    The response is encoded without ``phases`` first and that block is appended to the
+    text afterwards, so the measured cost is the real one for the whole payload.
+    """
+    response = dict(response)
+    phases = dict(response.pop("phases", None) or {})
+    wall, cpu = time.perf_counter(), time.process_time()
+    body = json.dumps(response)
+    phases["serialize"] = {
+        "wall_seconds": time.perf_counter() - wall,
+        "cpu_seconds": time.process_time() - cpu,
+    }
+    return body[:-1] + (", " if response else "") + '"phases": ' + json.dumps(phases) + "}"
+
+
+def _fork_child(func, *args):
+    """Fork a child that runs ``func`` and writes its JSON response to a pipe.
+
+    Limits applied inside the child (rlimits, alarm, disabled sockets) never leak into
+    the parent. Returns ``(pid, read_fd)``; pass the bytes read to ``_child_response``.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            payload = encode_response(func(*args))
+        except BaseException as exc:  # pylint: disable=broad-except
+            payload = json.dumps({
+                "stdout": "",
+                "stderr": f"{type(exc).__name__}: {exc}",
+                "timeout": isinstance(exc, TimeoutError),
+            })
+        with os.fdopen(write_fd, "w", encoding="utf-8") as pipe:
+            pipe.write(payload)
+        os._exit(0)
+
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def _child_response(pid, payload):
+    """Reap ``pid``; a child killed by the kernel (e.g. SIGXCPU) reports a timeout.
+
+    A child killed while writing its result leaves a truncated payload; that is treated
+    like no payload at all, never raised, since the caller may be a long-lived server.
+    """
+    _, status = os.waitpid(pid, 0)
+    if payload:
+        try:
+            return json.loads(payload)
+        except (ValueError, UnicodeDecodeError):
+            pass
+    if os.WIFSIGNALED(status):
+        return {
+            "stdout": "",
+            "stderr": f"Execution terminated by signal {os.WTERMSIG(status)}",
+            "timeout": os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL),
+        }
+    return {"stdout": "", "stderr": "Runner child exited without a result", "timeout": False}
+
+
+def _run_forked(func, *args):
+    pid, read_fd = _fork_child(func, *args)
+    with os.fdopen(read_fd, "rb") as pipe:
+        payload = pipe.read()
+    return _child_response(pid, payload)
+
+
+def start_request(data, frames=None, prepare=True):
+    """First half of ``handle_request``: answer ``data`` from the caches or set up its run.
+
+    Returns ``(response, None)`` when nothing has to execute (a ``RESULT_CACHE`` hit or a
+    submission that does not compile) and ``(None, job)`` otherwise. ``job.func(*job.args)``
+    produces the response, normally in a forked child, and ``finish_request(job, response)``
+    memoizes it. Both halves run in the long-lived process, so with ``prepare`` (compile
+    here, not inside the run) ``CODE_CACHE`` and ``RESULT_CACHE`` outlive every child.
+    """
+    if "cases" in data:
+        cases = data.get("cases") or [{}]
+        keys = [_result_cache_key(data, case) for case in cases] if data.get("deterministic") else []
+        job = SimpleNamespace(func=run_batch, args=(data,), cache_keys=keys)
+        if keys and all(RESULT_CACHE.get(key) is not None for key in keys):
+            return finish_request(job, run_batch(data)), None
+        if prepare:
+            # The batch compiles again wherever it runs; that is then a CODE_CACHE hit
+            _prepare_request(data)
+        return None, job
+
+    cache_key = _result_cache_key(data) if data.get("deterministic") else None
+    if cache_key:
+        cached = _cached_result(cache_key)
+        if cached is not None:
+            return cached, None
+
+    prepared = error = None
+    if prepare:
+        prepared, error = _prepare_request(data)
+    job = SimpleNamespace(func=run_request, args=(data, prepared, frames), cache_keys=[cache_key] if cache_key else [])
+    if error is not None:
+        return finish_request(job, error), None
+    return None, job
+
+
+def finish_request(job, response):
+    """Second half of ``handle_request``: grade and memoize the results of a job.
+
+    Batch cases were graded by ``run_cases`` already.
+    """
+    if job.func is run_request:
+        response = _regrade(job.args[0], response)
+    results = (response.get("cases") or []) if job.func is run_batch else [response]
+    for key, result in zip(job.cache_keys, results):
+        if not result.get("cached"):
+            _remember_result(key, result)
+    return response
+
+
+def handle_request(data, fork=False, frames=None):
+    """Dispatch a single request or a ``cases`` batch; batches always fork per case.
+
+    Deterministic requests are answered from ``RESULT_CACHE`` when possible. With ``fork``
+    the source is compiled here and a single request runs in a forked child; requests
+    with a level ``grader`` always do, so their verdict is computed outside the sandbox.
+    ``frames`` streams a single request's output while it runs (ignored for batches).
+    """
+    response, job = start_request(data, frames, prepare=fork)
+    if job is None:
+        return response
+    if job.func is run_request and (fork or isinstance(data.get("grader"), dict)):
+        return finish_request(job, _run_forked(job.func, *job.args))
+    return finish_request(job, job.func(*job.args))
+
+
+def preload_modules(modules=None):
+    """Import allowed modules (and compile turtle) in the parent so forked children inherit them."""
+    for name in sorted(ALLOWED_MODULES if modules is None else modules):
+        try:
+            if name == "turtle":
+                # Only compile: the module itself holds per-run drawing state.
+                if _find_turtle_path() is not None and _turtle_code is None:
+                    _load_turtle_module()
+                    sys.modules.pop("turtle", None)
+            else:
+                __import__(name)
+        except ImportError:
+            pass
+
+
+def _parse_request(line):
+    """Decode one NDJSON request line; returns ``(data, error_response)``."""
+    try:
+        data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        return None, {"stdout": "", "stderr": f"Invalid request: {exc}", "timeout": False}
+    if not isinstance(data, dict):
+        return None, {"stdout": "", "stderr": "Invalid request: expected a JSON object", "timeout": False}
+    return data, None
+
+
+def _encode_reply(data, response, frames=None):
+    if frames is not None:
+        response = {"type": "result", **response}
+    if data is not None and "id" in data:
+        response["id"] = data["id"]
+    return encode_response(response).encode("utf-8") + b"\n"
+
+
+def _serve_stream(reader, writer):
+    for line in reader:
+        if not line.strip():
+            continue
+        data, response = _parse_request(line)
+        frames = None
+        if data is not None:
+            frames = FrameEmitter(writer.fileno(), data.get("id")) if data.get("stream") else None
+            try:
+                response = handle_request(data, fork=True, frames=frames)
+            except Exception as exc:  # pylint: disable=broad-except
+                response = {"stdout": "", "stderr": f"Invalid request: {type(exc).__name__}: {exc}", "timeout": False}
+        writer.write(_encode_reply(data, response, frames))
+        writer.flush()
+
+
+class _Client:
+    """One socket connection of ``serve``: unread request lines and the request in flight."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = b""
+        self.lines = []
+        self.running = None  # (data, frames, job) of the request whose child is running
+        self.eof = False
+        self.closed = False
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b"\n")
+        self.lines.extend(line for line in lines if line.strip())
+
+    def reply(self, data, response, frames=None):
+        try:
+            self.conn.sendall(_encode_reply(data, response, frames))
+        except OSError:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.conn.close()
+
+
+def _serve_socket(server):
+    """Answer every connection of ``server`` from this process, forking only per request.
+
+    Requests are admitted (cache lookup, compilation) here with ``start_request`` and run
+    in a forked child whose result pipe joins the same selector as the connections, so
+    connections proceed concurrently while each one is answered in order. Streamed frames
+    are written to the connection by the child itself; the result line follows once the
+    child has exited.
+    """
+    with selectors.DefaultSelector() as selector:
+        selector.register(server, selectors.EVENT_READ)
+        clients = []
+        while True:
+            for key, _ in selector.select():
+                if key.fileobj is server:
+                    conn, _ = server.accept()
+                    client = _Client(conn)
+                    clients.append(client)
+                    selector.register(conn, selectors.EVENT_READ, client)
+                elif isinstance(key.data, _Client):
+                    client = key.data
+                    try:
+                        chunk = client.conn.recv(65536)
+                    except OSError:
+                        chunk = b""
+                    if chunk:
+                        client.feed(chunk)
+                    else:
+                        selector.unregister(client.conn)
+                        client.eof = True
+                else:
+                    client, pid, chunks = key.data
+                    chunk = os.read(key.fd, 65536)
+                    if chunk:
+                        chunks.append(chunk)
+                        continue
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+                    data, frames, job = client.running
+                    client.running = None
+                    response = finish_request(job, _child_response(pid, b"".join(chunks)))
+                    if not client.closed:
+                        client.reply(data, response, frames)
+
+            for client in clients:
+                while client.lines and client.running is None and not client.closed:
+                    data, response = _parse_request(client.lines.pop(0))
+                    frames = None
+                    if data is not None:
+                        frames = FrameEmitter(client.conn.fileno(), data.get("id")) if data.get("stream") else None
+                        try:
+                            response, job = start_request(data, frames)
+                        except Exception as exc:  # pylint: disable=broad-except
+                            response, job = {
+                                "stdout": "",
+                                "stderr": f"Invalid request: {type(exc).__name__}: {exc}",
+                                "timeout": False,
+                            }, None
+                        if job is not None:
+                            pid, read_fd = _fork_child(job.func, *job.args)
+                            client.running = (data, frames, job)
+                            selector.register(read_fd, selectors.EVENT_READ, (client, pid, []))
+                            continue
+                    client.reply(data, response, frames)
+                if client.eof and not client.lines and client.running is None:
+                    client.close()
+            clients = [client for client in clients if not client.closed]
+
+
+def serve(socket_path=None):
+    """Long-lived zygote: preload once, then fork a fresh child for every NDJSON request.
+
+    Without ``socket_path`` requests are read from stdin and answered in order on stdout.
+    With a Unix socket all connections are served by this process (see ``_serve_socket``),
+    so ``CODE_CACHE`` and ``RESULT_CACHE`` are shared by every client while requests of
+    different connections still run concurrently.
+    """
+    preload_modules()
+
+    if socket_path is None:
+        _serve_stream(sys.stdin.buffer, sys.stdout.buffer)
+        return
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(64)
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: sys.exit(0))
+    try:
+        _serve_socket(server)
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--serve", action="store_true", help="serve NDJSON requests, forking per request")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of stdin (with --serve)")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.socket)
+        return
+
+    # Interpreter start-up and imports, before the request is even read
+    startup = {"wall_seconds": _process_age_seconds(), "cpu_seconds": time.process_time()}
+    raw = sys.stdin.read()
+    data = json.loads(raw)
+    if data.get("stream"):
+        sys.stdout.flush()
+        frames = FrameEmitter(sys.stdout.fileno(), data.get("id"))
+        response = {"type": "result", **handle_request(data, frames=frames)}
+        if "id" in data:
+            response["id"] = data["id"]
+    else:
+        response = dict(handle_request(data))
+    response["phases"] = {"startup": startup, **(response.get("phases") or {})}
+    print(encode_response(response))
 
 
 if __name__ == "__main__":
@@ -1,9 +1,15 @@
 ﻿#!/usr/bin/env python3
 """Simple static analysis to reject dangerous Python constructs."""
 
+import argparse
 import ast
+import hashlib
 import json
+import math
+import os
 import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 DANGEROUS_BUILTINS = {
     "eval",
@@ -11,7 +17,6 @@ DANGEROUS_BUILTINS = {
     "compile",
     "open",
     "__import__",
-    "input",
     "globals",
     "locals",
     "vars",
@@ -40,22 +45,89 @@ DANGEROUS_MODULES = {
 }
 
 
+DEFAULT_ALLOWED_MODULES = set(
+    json.loads(os.environ.get("EXECUTOR_ALLOWED_MODULES", "[\"math\", \"random\", \"turtle\"]"))
+)
+VERDICT_CACHE_ENTRIES = int(os.environ.get("EXECUTOR_CHECKER_CACHE_ENTRIES", "1024"))
+
+# Iterations of a constant ``range`` (and elements of a multiplied literal sequence) above
+# which a submission is warned about / rejected. The sandbox manages roughly 10**7 simple
+# loop iterations per CPU second and 256 MiB of memory.
+RANGE_WARN = 10**7
+RANGE_REJECT = 10**8
+SEQUENCE_WARN = 10**7
+SEQUENCE_REJECT = 10**8
+
+# Loop conditions built only from these can change only through assignments to their names
+PLAIN_CONDITION_NODES = (
+    ast.Name,
+    ast.Constant,
+    ast.Compare,
+    ast.BoolOp,
+    ast.UnaryOp,
+    ast.BinOp,
+    ast.expr_context,
+    ast.operator,
+    ast.cmpop,
+    ast.boolop,
+    ast.unaryop,
+)
+
+# Functions the level graders call after the module body (see ``level_grader.run_entry``)
+ENTRY_POINTS = {"solve"}
+
+TRY_NODES = (ast.Try, ast.TryStar) if hasattr(ast, "TryStar") else (ast.Try,)
+
+# Builtins that consume a whole iterable argument eagerly
+CONSUMING_BUILTINS = {"list", "tuple", "set", "frozenset", "dict", "sum", "sorted", "max", "min", "any", "all"}
+
+
 def analyze(source: str, allowed_modules: set[str]) -> list[str]:
-    issues: list[str] = []
     try:
         tree = ast.parse(source)
     except SyntaxError as exc:  # pragma: no cover - surfaced to caller
-        issues.append(f"SyntaxError: {exc}")
-        return issues
+        return [f"SyntaxError: {exc}"]
+    return analyze_tree(tree, allowed_modules)
+
+
+def analyze_tree(tree: ast.AST, allowed_modules: set[str]) -> list[str]:
+    """Run the safety visitor and runaway-code rejections on an already-parsed module."""
+    return report_tree(tree, allowed_modules)["issues"]
+
+
+def report_tree(tree: ast.AST, allowed_modules: set[str]) -> dict:
+    """Full checker report shared with the runner.
+
+    ``issues`` lists every reason to reject the submission as text; runaway-code findings
+    are also returned as ``{"line", "col", "message"}`` dicts in ``rejections`` and
+    ``warnings``.
+    """
+    issues = safety_issues(tree, allowed_modules)
+    rejections, warnings = find_runaway_code(tree)
+    issues.extend(f"Line {finding['line']}: {finding['message']}" for finding in rejections)
+    return {"issues": issues, "rejections": rejections, "warnings": warnings}
+
+
+def safety_issues(tree: ast.AST, allowed_modules: set[str]) -> list[str]:
+    """Imports, builtins and attributes that are not allowed in the sandbox."""
+    return [finding["message"] for finding in safety_findings(tree, allowed_modules)]
+
+
+def safety_findings(tree: ast.AST, allowed_modules: set[str]) -> list[dict]:
+    """``safety_issues`` as ``{"line", "col", "message"}`` dicts."""
+    findings: list[dict] = []
+
+    def report(node: ast.AST, message: str) -> None:
+        findings.append({"line": node.lineno, "col": node.col_offset, "message": message})
 
     class Visitor(ast.NodeVisitor):
         def visit_Import(self, node: ast.Import) -> None:  # noqa: N802
             for alias in node.names:
                 root = alias.name.split(".")[0]
                 if root not in allowed_modules:
-                    issues.append(f"Import of module '{root}' is not allowed")
+                    report(node, f"Import of module '{root}' is not allowed")
                 if root in DANGEROUS_MODULES:
-                    issues.append(f"Dangerous module '{root}' cannot be imported")
+                    report(node, f"Dangerous module '{root}' cannot be imported")
             self.generic_visit(node)
 
         def visit_ImportFrom(self, node: ast.ImportFrom) -> None:  # noqa: N802
@@ -63,9 +135,9 @@ def analyze(source: str, allowed_modules: set[str]) -> list[str]:
                 return
             root = node.module.split(".")[0]
             if root not in allowed_modules:
-                issues.append(f"Import from module '{root}' is not allowed")
+                report(node, f"Import from module '{root}' is not allowed")
             if root in DANGEROUS_MODULES:
-                issues.append(f"Dangerous module '{root}' cannot be imported")
+                report(node, f"Dangerous module '{root}' cannot be imported")
             self.generic_visit(node)
 
         def visit_Call(self, node: ast.Call) -> None:  # noqa: N802
@@ -73,32 +145,722 @@ def analyze(source: str, allowed_modules: set[str]) -> list[str]:
             if isinstance(func, ast.Name):
                 name = func.id
                 if name in DANGEROUS_BUILTINS:
-                    issues.append(f"Use of builtin '{name}' is not allowed")
+                    report(node, f"Use of builtin '{name}' is not allowed")
             elif isinstance(func, ast.Attribute):
                 if isinstance(func.attr, str) and func.attr in DANGEROUS_ATTRS:
-                    issues.append("Access to special attribute is not allowed")
+                    report(node, "Access to special attribute is not allowed")
                 value = func.value
                 if isinstance(value, ast.Name) and value.id in DANGEROUS_MODULES:
-                    issues.append(f"Access on dangerous module '{value.id}' is not allowed")
+                    report(node, f"Access on dangerous module '{value.id}' is not allowed")
             self.generic_visit(node)
 
         def visit_Attribute(self, node: ast.Attribute) -> None:  # noqa: N802
             if isinstance(node.attr, str) and node.attr in DANGEROUS_ATTRS:
-                issues.append("Access to special attribute is not allowed")
+                report(node, "Access to special attribute is not allowed")
             self.generic_visit(node)
 
     Visitor().visit(tree)
-    return issues
+    return findings
+
+
+def _constant_int(node: ast.AST) -> float | None:
+    """Value of a constant integer expression such as ``10**9`` or ``2 * 1000``, else None.
+
+    Evaluated in floats so ``10**10**10`` cannot stall the checker; huge values become inf.
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, int) and not isinstance(node.value, bool):
+        return float(node.value)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _constant_int(node.operand)
+        if value is None:
+            return None
+        return -value if isinstance(node.op, ast.USub) else value
+    if isinstance(node, ast.BinOp):
+        left = _constant_int(node.left)
+        right = _constant_int(node.right)
+        if left is None or right is None:
+            return None
+        try:
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if isinstance(node.op, ast.FloorDiv):
+                return math.floor(left / right)
+            if isinstance(node.op, ast.Pow):
+                if right < 0:
+                    return None
+                return math.inf if abs(left) > 1 and right * math.log10(abs(left)) > 300 else left**right
+            if isinstance(node.op, ast.LShift):
+                return math.inf if right > 1000 else left * 2.0**right
+        except (ZeroDivisionError, OverflowError, ValueError):
+            return None
+    return None
+
+
+def _range_length(node: ast.AST) -> float | None:
+    """Number of iterations of a ``range(...)`` call with constant arguments, else None."""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "range"):
+        return None
+    if node.keywords or not 1 <= len(node.args) <= 3:
+        return None
+    values = [_constant_int(arg) for arg in node.args]
+    if any(value is None for value in values):
+        return None
+    if len(values) == 1:
+        start, stop, step = 0.0, values[0], 1.0
+    else:
+        start, stop = values[0], values[1]
+        step = values[2] if len(values) == 3 else 1.0
+    if step == 0 or math.isinf(start) and math.isinf(stop):
+        return None
+    return max(0.0, (stop - start) / step)
+
+
+def _sequence_length(node: ast.AST) -> int | None:
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes)):
+        return len(node.value)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return len(node.elts)
+    return None
+
+
+def _body_nodes(statements: list[ast.stmt]):
+    """Walk statements without entering nested function, lambda or class bodies."""
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        yield node
+        for child in ast.iter_child_nodes(node):
+            if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+                stack.append(child)
+
+
+def _loop_can_exit(loop: ast.While | ast.For | ast.AsyncFor) -> bool:
+    """True when the loop body contains a break (of this loop), return, raise, yield or input().
+
+    A ``yield`` hands control back to the consumer, which may simply stop iterating, so an
+    endless generator loop is fine.
+    """
+    stack: list[tuple[ast.AST, bool]] = [(statement, True) for statement in loop.body]
+    while stack:
+        node, own_loop = stack.pop()
+        if isinstance(node, ast.Break) and own_loop:
+            return True
+        if isinstance(node, (ast.Return, ast.Raise, ast.Yield, ast.YieldFrom)):
+            return True
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ("input", "exit", "quit"):
+            # Reading past the end of stdin raises EOFError, which ends the loop.
+            return True
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+                continue
+            # A break inside a nested loop only leaves that loop
+            nested = isinstance(node, (ast.For, ast.AsyncFor, ast.While)) and child in node.body
+            stack.append((child, own_loop and not nested))
+    return False
+
+
+def _assigned_names(statements: list[ast.stmt]) -> set[str]:
+    names: set[str] = set()
+    for node in _body_nodes(statements):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+    return names
+
+
+def _is_recursive_without_base(function: ast.FunctionDef) -> bool:
+    """True when ``function`` calls itself and has no branch that could avoid the call."""
+    calls_itself = False
+    for node in _body_nodes(function.body):
+        if isinstance(
+            node,
+            (ast.If, ast.IfExp, ast.While, ast.For, ast.AsyncFor, ast.Try, ast.BoolOp, ast.comprehension, ast.Match),
+        ):
+            return False
+        if isinstance(node, (ast.Return, ast.Raise)) and not any(
+            isinstance(child, ast.Call) and isinstance(child.func, ast.Name) and child.func.id == function.name
+            for child in ast.walk(node)
+        ):
+            # A return/raise that does not recurse gives the recursion a way to stop
+            return False
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == function.name:
+            calls_itself = True
+    return calls_itself
+
+
+def _referenced_names(statements: list[ast.AST]) -> set[str]:
+    """Names loaded and attributes read by ``statements``, not counting nested function bodies.
+
+    Decorators and default values of nested functions run where they are defined, so
+    they count; lambda and class bodies are included as well.
+    """
+    names: set[str] = set()
+    stack = list(statements)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            stack.extend(node.decorator_list)
+            stack.extend(default for default in node.args.defaults + node.args.kw_defaults if default is not None)
+            continue
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, ast.Attribute):
+            names.add(node.attr)
+        stack.extend(ast.iter_child_nodes(node))
+    return names
+
+
+def _call_name(call: ast.Call) -> str | None:
+    if isinstance(call.func, ast.Name):
+        return call.func.id
+    if isinstance(call.func, ast.Attribute):
+        return call.func.attr
+    return None
+
+
+def _scan_runaway_code(tree: ast.AST) -> tuple[list[dict], dict]:
+    """Raw runaway findings of ``tree`` plus the call summary needed to judge them.
+
+    Every finding carries ``severity`` (before reachability is known) and private keys:
+    ``_function`` names the outermost function it is in, ``_guarded`` holds the message
+    used instead when an exception may be what ends it (``None`` if that cannot apply)
+    and ``_caught`` tells whether a ``try`` around it was found in ``tree`` itself. The
+    summary maps ``refs`` (per function name, ``None`` for module-level code) to the
+    names it references and lists the names called inside ``try`` bodies in ``guarded``.
+    ``_resolve_runaway_code`` turns scans into rejections and warnings; the incremental
+    analyzer resolves the scans of all of a session's blocks together.
+    """
+    findings: list[dict] = []
+    # Names a called function could rebind behind the loop's back
+    declared_global = {
+        name for node in ast.walk(tree) if isinstance(node, (ast.Global, ast.Nonlocal)) for name in node.names
+    }
+
+    refs: dict[str | None, set[str]] = {None: _referenced_names(getattr(tree, "body", []))}
+    owner: dict[int, str] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and id(node) not in owner:
+            refs.setdefault(node.name, set()).update(_referenced_names(node.body))
+            for child in ast.walk(node):
+                owner.setdefault(id(child), node.name)
+
+    caught: set[int] = set()
+    guarded_calls: set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, TRY_NODES) and node.handlers:
+            for child in (child for statement in node.body for child in ast.walk(statement)):
+                caught.add(id(child))
+                if isinstance(child, ast.Call) and _call_name(child):
+                    guarded_calls.add(_call_name(child))
+    # Functions called from a try body run under it too, and so do the functions they call
+    pending = set(guarded_calls)
+    while pending:
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name in pending:
+                caught.update(id(child) for statement in node.body for child in ast.walk(statement))
+                caught.add(id(node))
+        pending = set().union(*(refs.get(name, set()) for name in pending)) - guarded_calls
+        guarded_calls |= pending
+
+    def add(node: ast.AST, severity: str, message: str, guarded: str | None = None) -> None:
+        findings.append(
+            {
+                "line": node.lineno,
+                "col": node.col_offset,
+                "message": message,
+                "severity": severity,
+                "_function": owner.get(id(node)),
+                "_guarded": guarded,
+                "_caught": id(node) in caught,
+            }
+        )
+
+    def flag(node: ast.AST, size: float, warn: float, reject: float, message: str) -> None:
+        if size > reject:
+            add(node, "error", message)
+        elif size > warn:
+            add(node, "warning", message)
+
+    def check_iterable(node: ast.AST, can_exit: bool = False) -> None:
+        length = _range_length(node)
+        if length is not None:
+            size = "an unbounded" if math.isinf(length) else f"{length:.0f}-step"
+            message = f"Loop over {size} range is likely to exceed the time limit"
+            # A loop that can break out early (a search) only runs long if nothing is found
+            flag(node, length, RANGE_WARN, math.inf if can_exit else RANGE_REJECT, message)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.While):
+            test = node.test
+            if isinstance(test, ast.Constant) and test.value:
+                if not _loop_can_exit(node):
+                    add(
+                        node,
+                        "error",
+                        "Infinite loop: 'while' with a constant condition never breaks",
+                        "Loop 'while' with a constant condition can only end through an exception",
+                    )
+            elif not _loop_can_exit(node) and all(isinstance(child, PLAIN_CONDITION_NODES) for child in ast.walk(test)):
+                read = {child.id for child in ast.walk(test) if isinstance(child, ast.Name)}
+                if read and not read & (_assigned_names(node.body) | declared_global):
+                    add(node, "warning", "Loop condition never changes inside the loop")
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            check_iterable(node.iter, _loop_can_exit(node))
+        elif isinstance(node, ast.comprehension):
+            check_iterable(node.iter)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in CONSUMING_BUILTINS:
+            for arg in node.args:
+                check_iterable(arg)
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mult):
+            for sequence, count in ((node.left, node.right), (node.right, node.left)):
+                length = _sequence_length(sequence)
+                times = _constant_int(count)
+                if length and times is not None:
+                    flag(
+                        node,
+                        length * times,
+                        SEQUENCE_WARN,
+                        SEQUENCE_REJECT,
+                        "Sequence multiplication builds a value too large for the sandbox",
+                    )
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and _is_recursive_without_base(node):
+            add(
+                node,
+                "error",
+                f"Function '{node.name}' calls itself without a base case",
+                f"Function '{node.name}' calls itself until an exception stops it",
+            )
+
+    return findings, {"refs": refs, "guarded": guarded_calls}
+
+
+def _resolve_runaway_code(findings: list[dict], summaries: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Split scanned findings into ``(rejections, warnings)`` knowing the whole program.
+
+    A function counts as called when module-level code, an ``ENTRY_POINTS`` name or a
+    called function references it by name (generously: callbacks and dict entries count).
+    """
+    refs: dict[str | None, set[str]] = {}
+    guarded: set[str] = set()
+    for summary in summaries:
+        for name, names in summary["refs"].items():
+            refs.setdefault(name, set()).update(names)
+        guarded |= summary["guarded"]
+
+    reachable = refs.get(None, set()) | ENTRY_POINTS
+    pending = set(reachable)
+    while pending:
+        pending = set().union(*(refs.get(name, set()) for name in pending)) - reachable
+        reachable |= pending
+    while True:
+        more = set().union(*(refs.get(name, set()) for name in guarded)) - guarded
+        if not more:
+            break
+        guarded |= more
+
+    rejections: list[dict] = []
+    warnings: list[dict] = []
+    for finding in findings:
+        public = {key: value for key, value in finding.items() if not key.startswith("_") and key != "severity"}
+        function = finding["_function"]
+        if finding["severity"] != "error":
+            warnings.append(public)
+        elif function is not None and function not in reachable:
+            warnings.append({**public, "message": f"{public['message']} (in a function that is never called)"})
+        elif finding["_guarded"] and (finding["_caught"] or function in guarded):
+            warnings.append({**public, "message": finding["_guarded"]})
+        else:
+            rejections.append(public)
+    rejections.sort(key=lambda finding: (finding["line"], finding["col"]))
+    warnings.sort(key=lambda finding: (finding["line"], finding["col"]))
+    return rejections, warnings
+
+
+def find_runaway_code(tree: ast.AST) -> tuple[list[dict], list[dict]]:
+    """Cheap heuristics for code that cannot finish within the sandbox limits.
+
+    Returns ``(rejections, warnings)`` as ``{"line", "col", "message"}`` dicts:
+
+    * ``while True`` (or any constant true condition) with no break, return, raise, yield
+      or ``input()`` in its body is rejected; a loop whose condition only compares plain
+      names the body never assigns is a warning.
+    * ``range`` with constant arguments that is iterated (loop, comprehension or eager
+      builtin such as ``sum``) over more than ``RANGE_REJECT`` / ``RANGE_WARN`` steps; a
+      ``for`` loop whose body can break, return, raise or yield is only warned about.
+    * Literal string/list/tuple multiplication by a constant producing more than
+      ``SEQUENCE_REJECT`` / ``SEQUENCE_WARN`` elements, e.g. ``"a" * 10**10``.
+    * Functions that call themselves without any branch that could stop the recursion.
+
+    Only code that can run is rejected: findings inside functions that are never called
+    are warnings. So are endless loops and recursion inside a ``try`` with ``except``
+    handlers (directly or through the functions called there), since an exception may
+    be what ends them.
+    """
+    findings, summary = _scan_runaway_code(tree)
+    return _resolve_runaway_code(findings, [summary])
+
+
+CONTINUATION_KEYWORDS = ("else", "elif", "except", "finally")
+SESSION_ENTRIES = int(os.environ.get("EXECUTOR_CHECKER_SESSIONS", "256"))
+
+
+def _starts_statement(line: str) -> bool:
+    """Column-0 line beginning with a name, keyword or decorator (``for``, ``x = ...``, ``print(``)."""
+    return line[:1] == "@" or line[:1].isidentifier()
+
+
+def split_top_level(source: str, resync: bool = False) -> list[tuple[int, str]]:
+    """Split ``source`` into ``(first_line, text)`` blocks, one per top-level statement.
+
+    Works on raw lines (tracking brackets, strings and backslash continuations) rather than
+    on a parse tree, so it still splits files containing syntax errors. Decorators stay
+    with their definition and ``else``/``except``/... with their compound statement;
+    blank and comment-only lines between statements are dropped. With ``resync`` every
+    column-0 line that starts a statement begins a new block even inside an unclosed
+    bracket or string; ``IncrementalAnalyzer`` re-splits a block that way once it fails
+    to parse, so one half-typed line cannot swallow the rest of the file.
+    """
+    blocks: list[tuple[int, list[str]]] = []
+    depth = 0
+    quote = None  # open triple-quote delimiter
+    continued = False
+    for number, line in enumerate(source.splitlines(), start=1):
+        stripped = line.strip()
+        if resync and _starts_statement(line):
+            depth, quote, continued = 0, None, False
+        if quote is None and not continued and line[:1] not in ("", " ", "\t", "#") and stripped:
+            word = stripped.split(None, 1)[0].rstrip(":")
+            starts_block = depth == 0 and word not in CONTINUATION_KEYWORDS and line[0] not in ")]}"
+            if starts_block and not (blocks and blocks[-1][1][-1].lstrip().startswith("@")):
+                blocks.append((number, []))
+        if blocks and (stripped or quote is not None or depth or continued):
+            blocks[-1][1].append(line)
+        elif blocks and blocks[-1][1]:
+            blocks[-1][1].append(line)
+
+        # Track brackets, strings and continuations up to the end of this line
+        index = 0
+        continued = False
+        while index < len(line):
+            char = line[index]
+            if quote is not None:
+                if char == "\\":
+                    index += 2
+                    continue
+                if line.startswith(quote, index):
+                    index += len(quote)
+                    quote = None
+                    continue
+            elif char == "#":
+                break
+            elif char in "\"'":
+                if line.startswith(char * 3, index):
+                    quote = char * 3
+                    index += 3
+                    continue
+                # Single-line string: skip to its closing quote (or the end of a malformed line)
+                index += 1
+                while index < len(line) and line[index] != char:
+                    index += 2 if line[index] == "\\" else 1
+            elif char in "([{":
+                depth += 1
+            elif char in ")]}":
+                depth = max(0, depth - 1)
+            elif char == "\\" and index == len(line) - 1:
+                continued = True
+            index += 1
+
+    result = []
+    for first_line, lines in blocks:
+        # Trailing blank/comment lines belong to no statement; keep them out of the cache key
+        while lines and (not lines[-1].strip() or lines[-1].lstrip().startswith("#")):
+            lines.pop()
+        if lines:
+            result.append((first_line, "\n".join(lines) + "\n"))
+    return result
+
+
+def _analyze_block(text: str, allowed_modules: set[str]) -> tuple[list[dict], list[dict]] | None:
+    """Findings for one block, with lines relative to the block and a ``severity``.
+
+    Runaway-code findings are returned as scanned (see ``_scan_runaway_code``) together
+    with the block's call summary, since whether they can run depends on the other blocks.
+    Returns None when the block does not parse but splits into several statements once
+    resynchronised (see ``split_top_level``); the caller then checks those one by one.
+    """
+    try:
+        tree = ast.parse(text)
+    except SyntaxError as exc:
+        if len(split_top_level(text, resync=True)) > 1:
+            return None
+        error = {
+            "line": exc.lineno or 1,
+            "col": max(0, (exc.offset or 1) - 1),
+            "message": f"SyntaxError: {exc.msg}",
+            "severity": "error",
+        }
+        return [error], []
+    except (ValueError, RecursionError, MemoryError) as exc:
+        return [{"line": 1, "col": 0, "message": f"{type(exc).__name__}: {exc}", "severity": "error"}], []
+    runaway, summary = _scan_runaway_code(tree)
+    return [{**finding, "severity": "error"} for finding in safety_findings(tree, allowed_modules)] + runaway, [summary]
+
+
+class IncrementalAnalyzer:
+    """Checker state for one editor session.
+
+    Keeps the findings of every top-level statement from the previous ``update`` keyed by
+    the statement's text, so only statements whose text changed are parsed and walked
+    again; moved statements are reused with shifted line numbers. A block that does not
+    parse is re-split at every column-0 statement, so a syntax error (even an unclosed
+    bracket or string) only affects the statement it is in. Runaway code is judged over
+    all blocks together, so a function called from another statement counts as called.
+    """
+
+    def __init__(self, allowed_modules: set[str]):
+        self.allowed_modules = set(allowed_modules)
+        self.blocks: dict[str, tuple[list[dict], list[dict]]] = {}
+
+    def update(self, source: str) -> dict:
+        blocks = split_top_level(source)
+        current: dict[str, tuple[list[dict], list[dict]]] = {}
+        findings: list[dict] = []
+        summaries: list[dict] = []
+        reanalyzed = 0
+
+        def analyze(text: str) -> tuple[list[dict], list[dict]]:
+            nonlocal reanalyzed
+            local = current.get(text)
+            if local is None:
+                local = self.blocks.get(text)
+            if local is None:
+                reanalyzed += 1
+                local = _analyze_block(text, self.allowed_modules)
+                if local is None:
+                    # Unparsable block: its statements are cached (and reused) one by one
+                    parts = [(first_line, analyze(part)) for first_line, part in split_top_level(text, resync=True)]
+                    local = (
+                        [
+                            {**finding, "line": finding["line"] + first_line - 1}
+                            for first_line, (part_findings, _) in parts
+                            for finding in part_findings
+                        ],
+                        [summary for _, (_, part_summaries) in parts for summary in part_summaries],
+                    )
+            current[text] = local
+            return local
+
+        for first_line, text in blocks:
+            local, local_summaries = analyze(text)
+            findings.extend({**finding, "line": finding["line"] + first_line - 1} for finding in local)
+            summaries.extend(local_summaries)
+        self.blocks = current
+
+        rejections, warnings = _resolve_runaway_code(
+            [finding for finding in findings if "_function" in finding], summaries
+        )
+        findings = [
+            *(finding for finding in findings if "_function" not in finding),
+            *({**finding, "severity": "error"} for finding in rejections),
+            *({**finding, "severity": "warning"} for finding in warnings),
+        ]
+        findings.sort(key=lambda finding: (finding["line"], finding["col"]))
+        errors = [finding for finding in findings if finding["severity"] == "error"]
+        return {
+            "ok": not errors,
+            "issues": [f"Line {finding['line']}: {finding['message']}" for finding in errors],
+            "findings": findings,
+            "blocks": len(blocks),
+            "reanalyzed": reanalyzed,
+        }
+
+
+def check_source(source: str, allowed_modules: set[str]) -> dict:
+    """Parse and check ``source``; returns ``{"ok", "issues", "rejections", "warnings"}``."""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as exc:
+        return {"ok": False, "issues": [f"SyntaxError: {exc}"], "rejections": [], "warnings": []}
+    except (ValueError, RecursionError, MemoryError) as exc:
+        # e.g. a NUL byte in the source, or nesting too deep for the parser
+        return {"ok": False, "issues": [f"{type(exc).__name__}: {exc}"], "rejections": [], "warnings": []}
+    report = report_tree(tree, allowed_modules)
+    return {"ok": not report["issues"], **report}
+
+
+class VerdictCache:
+    """Bounded LRU of checker verdicts keyed by source hash and allowed-module set."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+
+    @staticmethod
+    def key(source: str, allowed_modules: set[str]) -> str:
+        digest = hashlib.sha256(json.dumps(sorted(allowed_modules)).encode("utf-8"))
+        digest.update(b"\0" + source.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def check(self, source: str, allowed_modules: set[str]) -> tuple[dict, bool]:
+        """Verdict for ``source`` and whether it came from the cache."""
+        key = self.key(source, allowed_modules)
+        verdict = self.entries.get(key)
+        if verdict is not None:
+            self.entries.move_to_end(key)
+            return verdict, True
+        verdict = check_source(source, allowed_modules)
+        if self.max_entries > 0:
+            self.entries[key] = verdict
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return verdict, False
+
+
+def serve(reader, writer, cache: VerdictCache) -> None:
+    """Answer NDJSON ``{"source", "allowedModules", "id"?, "session"?}`` requests in order.
+
+    Requests naming a ``session`` go through that session's ``IncrementalAnalyzer``
+    (at most ``SESSION_ENTRIES`` sessions are kept, least recently used first out).
+    """
+    sessions: OrderedDict[str, IncrementalAnalyzer] = OrderedDict()
+    for line in reader:
+        if not line.strip():
+            continue
+        payload = None
+        try:
+            payload = json.loads(line)
+            if not isinstance(payload, dict):
+                raise ValueError("expected a JSON object")
+            response = _serve_request(payload, sessions, cache)
+        except Exception as exc:  # pylint: disable=broad-except
+            # One bad request must not take the server (and every editor session) down
+            response = {"ok": False, "issues": [f"Invalid request: {exc}"], "rejections": [], "warnings": []}
+        if isinstance(payload, dict) and "id" in payload:
+            response["id"] = payload["id"]
+        writer.write(json.dumps(response) + "\n")
+        writer.flush()
+
+
+def _serve_request(payload: dict, sessions: OrderedDict, cache: VerdictCache) -> dict:
+    allowed_modules = set(payload.get("allowedModules", []))
+    source = payload.get("source", "")
+    if not isinstance(source, str):
+        raise ValueError("'source' must be a string")
+    session = payload.get("session")
+    if session is None:
+        verdict, cached = cache.check(source, allowed_modules)
+        return {**verdict, "cached": cached}
+    session = str(session)
+    analyzer = sessions.pop(session, None)
+    if analyzer is None or analyzer.allowed_modules != allowed_modules:
+        analyzer = IncrementalAnalyzer(allowed_modules)
+    sessions[session] = analyzer
+    while len(sessions) > SESSION_ENTRIES:
+        sessions.popitem(last=False)
+    return analyzer.update(source)
+
+
+def _is_python(level: dict, default: bool = True) -> bool:
+    """Whether a level (or level file) is Python; levels that name no language inherit ``default``."""
+    language = level.get("language", level.get("lang"))
+    if not isinstance(language, str):
+        return default
+    return language.strip().lower() in ("python", "python3", "py")
+
+
+def _level_sources(path: str) -> list[tuple[str, str]]:
+    """``(label, source)`` pairs from a ``.py`` file or the starter/solution code of a level file.
+
+    Levels in another language (``language``/``lang`` on the file or the level, e.g. the
+    JavaScript curriculum) are skipped; levels that name no language count as Python.
+    """
+    with open(path, "r", encoding="utf-8-sig") as handle:
+        if path.endswith(".py"):
+            return [(path, handle.read())]
+        try:
+            data = json.load(handle)
+        except json.JSONDecodeError:
+            return []
+
+    def snippets(level: dict, prefix: str) -> list[tuple[str, str]]:
+        found = []
+        starter = level.get("starter")
+        candidates = {
+            "starter": starter.get("code") if isinstance(starter, dict) else level.get("starter_code"),
+            "solution": level.get("solution") or level.get("reference_solution"),
+        }
+        for name, source in candidates.items():
+            if isinstance(source, str) and source.strip():
+                found.append((f"{prefix}:{name}", source))
+        return found
+
+    if not isinstance(data, dict):
+        return []
+    python = _is_python(data)
+    if isinstance(data.get("levels"), list):
+        pairs = []
+        for index, level in enumerate(data["levels"]):
+            if isinstance(level, dict) and _is_python(level, python):
+                pairs.extend(snippets(level, f"{path}#{level.get('level', index + 1)}"))
+        return pairs
+    return snippets(data, path) if python else []
+
+
+def _check_item(item: tuple[str, str, list[str]]) -> dict:
+    label, source, allowed_modules = item
+    return {"source": label, **check_source(source, set(allowed_modules))}
+
+
+def check_directory(directory: str, allowed_modules: set[str], jobs: int = 0) -> list[dict]:
+    """Check every ``.py`` file and Python level starter/solution under ``directory`` in a process pool.
+
+    Results keep a deterministic (sorted path) order regardless of ``jobs``.
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if name not in ("node_modules", ".git", "__pycache__"))
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith((".py", ".json")))
+    modules = sorted(allowed_modules)
+    items = [(label, source, modules) for path in paths for label, source in _level_sources(path)]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(items) < 2:
+        return [_check_item(item) for item in items]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_check_item, items, chunksize=max(1, len(items) // (jobs * 4))))
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--serve", action="store_true", help="answer NDJSON requests from stdin until EOF")
+    parser.add_argument("--batch", metavar="DIR", help="check all .py files and level solutions under DIR")
+    parser.add_argument("--jobs", "-j", type=int, default=0, help="worker processes for --batch (default: CPUs)")
+    parser.add_argument(
+        "--allowed-modules",
+        help="comma-separated modules allowed in --batch (default: EXECUTOR_ALLOWED_MODULES)",
+    )
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(sys.stdin, sys.stdout, VerdictCache(VERDICT_CACHE_ENTRIES))
+        return
+
+    if args.batch:
+        allowed = DEFAULT_ALLOWED_MODULES
+        if args.allowed_modules is not None:
+            allowed = {name.strip() for name in args.allowed_modules.split(",") if name.strip()}
+        results = check_directory(args.batch, allowed, args.jobs)
+        failed = sum(1 for result in results if not result["ok"])
+        print(json.dumps({"checked": len(results), "failed": failed, "results": results}, ensure_ascii=False))
+        sys.exit(1 if failed else 0)
+
     raw = sys.stdin.read()
     payload = json.loads(raw or "{}")
-    source = payload.get("source", "")
-    allowed_modules = set(payload.get("allowedModules", []))
-
-    issues = analyze(source, allowed_modules)
-    print(json.dumps({"ok": not issues, "issues": issues}))
+    print(json.dumps(check_source(payload.get("source", ""), set(payload.get("allowedModules", [])))))
 
 
 if __name__ == "__main__":
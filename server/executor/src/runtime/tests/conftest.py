@@ -0,0 +1,27 @@
+"""Shared setup for the runtime tests.
+
+The runtime modules import each other as top-level modules (that is how they are shipped
+into the sandbox image), so the runtime directory goes on ``sys.path``. Runs go through
+a forked child like in server mode: the sandbox sets rlimits and timers that must never
+reach the pytest process.
+"""
+
+import os
+import sys
+
+import pytest
+
+RUNTIME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RUNTIME_DIR)
+
+import python_runner  # noqa: E402
+
+
+@pytest.fixture
+def run():
+    """Run one runner request (or ``cases`` batch) the way ``--serve`` does."""
+
+    def run(source, **request):
+        return python_runner.handle_request(dict(request, source=source), fork=True)
+
+    return run
@@ -0,0 +1,146 @@
+import pytest
+
+import level_grader
+from level_grader import GradeSettled, grade_stdout, grader_for
+
+MAZE = ["#####", "#S.E#", "#####"]
+
+
+def _maze(checks, **options):
+    return grader_for({"mode": "event", "events": {"channel": "maze"}, "checks": checks}, {"maze": MAZE}, **options)
+
+
+def test_maze_reaching_the_goal_passes():
+    grader = _maze([{"type": "goal"}, {"type": "maxSteps", "value": 2}], include_events=True)
+    grader.move()
+    grader.move()
+
+    verdict = grader.finish()
+    assert verdict["pass"] and verdict["position"] == [3, 1] and verdict["steps"] == 2
+    assert verdict["events"] == ["F2"]
+
+
+def test_maze_bumping_into_a_wall_does_not_move():
+    grader = _maze([{"type": "goal"}], include_events=True)
+    grader.turn_left()
+    grader.move()
+
+    verdict = grader.finish()
+    assert not verdict["pass"] and verdict["bumps"] == 1 and verdict["events"] == ["L", "X"]
+
+
+def test_maze_stops_once_max_steps_is_exceeded():
+    grader = grader_for({"type": "api_events", "criteria": {"end_state": "REACHED", "max_steps": 1}}, {"maze": MAZE})
+    grader.move()
+    with pytest.raises(GradeSettled):
+        grader.move()
+
+    verdict = grader.finish()
+    assert not verdict["pass"] and verdict["stoppedEarly"]
+    assert [check["pass"] for check in verdict["checks"]] == [False, False]
+
+
+def test_open_maze_reaches_the_end_after_any_move():
+    grader = grader_for({"type": "api_events", "criteria": {"end_state": "REACHED"}})
+    grader.move(3)
+
+    assert grader.finish()["pass"]
+
+
+LED = {"mode": "event", "events": {"channel": "led"}, "checks": [{"type": "eventSeq", "expect": ["on 1", "off1"]}]}
+
+
+def test_led_sequence_from_stdout_is_canonicalized():
+    verdict = grade_stdout("hello\nON 1\noff 1", LED)
+
+    assert verdict["pass"] and verdict["eventCount"] == 2
+
+
+def test_led_sequence_reports_the_first_wrong_event():
+    verdict = grade_stdout("on1\non2\n", LED)
+
+    check = verdict["checks"][0]
+    assert not verdict["pass"] and check["mismatch"] == {"index": 1, "expected": "off1", "actual": "on2"}
+    assert "expect" not in check
+
+
+def test_led_sequence_stops_the_program_at_the_first_wrong_event():
+    grader = grader_for(LED)
+    with pytest.raises(GradeSettled):
+        grader.feed("on2\n")
+
+    assert grader.finish()["stoppedEarly"]
+
+
+def test_music_set_ignores_order_and_number_format():
+    config = {
+        "mode": "event",
+        "events": {"channel": "music"},
+        "checks": [{"type": "eventSet", "expect": ["note 0 C4 1", "note 1 E4 1.0"]}],
+    }
+
+    assert grade_stdout("note 1.0 E4 1\nnote 0 C4 1\n", config)["pass"]
+    verdict = grade_stdout("note 0 C4 1\nnote 2 G4 1\n", config)
+    check = verdict["checks"][0]
+    assert check["missing"] == ["note 1 E4 1"] and check["unexpected"] == ["note 2 G4 1"]
+
+
+def test_io_graders_are_left_to_the_output_judge():
+    assert grader_for({"mode": "io"}) is None
+    with pytest.raises(ValueError):
+        grader_for({"mode": "event", "events": {"channel": "smoke"}})
+
+
+def test_runner_grades_a_maze_solve_function(run):
+    source = "def solve():\n    for _ in range(2):\n        move()\n"
+    response = run(source, grader={"mode": "event", "events": {"channel": "maze"}, "checks": [{"type": "goal"}]},
+                   assets={"maze": MAZE})
+
+    assert response["passed"] is True and response["grade"]["channel"] == "maze"
+
+
+def test_event_limit_fails_the_level(monkeypatch):
+    monkeypatch.setattr(level_grader, "MAX_EVENTS", 3)
+
+    verdict = grade_stdout("on1\n" * 5, {"mode": "event", "events": {"channel": "led"}, "checks": []})
+    assert not verdict["pass"] and verdict["checks"][-1]["type"] == "eventLimit"
+
+
+MAZE_GRADER = {"mode": "event", "events": {"channel": "maze"}, "checks": [{"type": "goal"}]}
+
+
+def test_api_functions_do_not_expose_the_grader(run):
+    response = run("print(hasattr(move, '__self__'), hasattr(api.move, '__self__'))\n",
+                   grader=MAZE_GRADER, assets={"maze": MAZE}, includeStdout=True)
+
+    assert response["stdout"] == "False False\n"
+
+
+def test_tampering_with_the_sandboxed_grader_does_not_pass_the_level(run):
+    source = (
+        "grader = move.__closure__[0].cell_contents\n"
+        "grader._reached = lambda *args, **kwargs: True\n"
+        "grader.position = grader.goal\n"
+        "grader.actions.append(['F', 1])\n"
+        "print(at_goal())\n"
+    )
+    response = run(source, grader=MAZE_GRADER, assets={"maze": MAZE}, includeEvents=True)
+
+    assert "gradeActions" not in response
+    assert response["passed"] is False
+    # A forged action is replayed like a real one: one step, still short of the end
+    assert response["grade"]["position"] == [2, 1] and response["grade"]["events"] == ["F"]
+
+
+def test_replay_rejects_a_malformed_action_log():
+    for actions in ([["teleport", 1]], [["F", -1]], {"F": 1}):
+        with pytest.raises(ValueError):
+            level_grader.replay_grader({"grader": MAZE_GRADER}, actions)
+
+
+def test_runner_regrades_led_events_from_the_action_log(run):
+    passed = run("print('on 1')\napi.off(1)\n", grader=LED)
+    failed = run("print('on 1')\nprint('on 2')\n", grader=LED)
+
+    assert passed["passed"] is True and passed["grade"]["eventCount"] == 2
+    assert failed["passed"] is False and failed["grade"]["stoppedEarly"] is True
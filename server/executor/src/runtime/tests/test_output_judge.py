@@ -0,0 +1,94 @@
+import pytest
+
+import output_judge
+from output_judge import OutputComparer, OutputMismatch, compare
+
+
+@pytest.mark.parametrize(
+    "mode, actual, expected",
+    [
+        ("trim", "\n  1\n2  \n\n", "1\n2"),
+        ("lines", "1  \n2\n\n\n", "1\n2\n"),
+        ("whitespace", "a   b\n\n\tc\n", "a b\nc"),
+        ("numeric", "0.30000000000000004 1e3\n", "0.3 1000\n"),
+        ("unordered", "b\na\n\nc\n", "c\na\nb\n"),
+    ],
+)
+def test_modes_accept_equivalent_output(mode, actual, expected):
+    assert compare(actual, expected, mode)["pass"]
+
+
+@pytest.mark.parametrize(
+    "mode, actual, expected",
+    [
+        ("trim", "1\n 2\n", "1\n2\n"),
+        ("lines", "1\n\n2\n", "1\n2\n"),
+        ("whitespace", "ab\n", "a b\n"),
+        ("numeric", "0.31\n", "0.3\n"),
+        ("numeric", "x\n", "1\n"),
+        ("unordered", "a\na\n", "a\nb\n"),
+    ],
+)
+def test_modes_reject_different_output(mode, actual, expected):
+    assert not compare(actual, expected, mode)["pass"]
+
+
+def test_numeric_tolerance_is_configurable():
+    assert compare("1.05\n", "1\n", "numeric", tolerance=0.1)["pass"]
+    assert not compare("1.05\n", "1\n", "numeric")["pass"]
+
+
+def test_mismatch_reports_the_first_bad_line_with_context():
+    verdict = compare("1\n2\n4\n", "1\n2\n3\n", "lines")
+
+    assert verdict["mismatch"] == {
+        "line": 3,
+        "expectedLine": 3,
+        "expected": "3",
+        "actual": "4",
+        "diff": ["    1 | 1", "    2 | 2", "-   3 | 3", "+   3 | 4"],
+    }
+
+
+def test_missing_lines_fail_at_the_end():
+    verdict = compare("1\n", "1\n2\n", "lines")
+
+    assert verdict["mismatch"]["line"] == 2 and verdict["mismatch"]["actual"] is None
+    assert compare("a\n", "a\nb\n", "unordered")["mismatch"]["expected"] == "b"
+
+
+def test_diff_lines_are_clipped():
+    verdict = compare("x" * 500 + "\n", "y\n", "lines")
+
+    assert verdict["mismatch"]["actual"] == "x" * output_judge.DIFF_LINE_CHARS + "…"
+
+
+def test_feed_stops_at_the_first_mismatching_line_across_chunks():
+    comparer = OutputComparer("1\n2\n3\n", "lines")
+    comparer.feed("1\n")
+    comparer.feed("5")
+    with pytest.raises(OutputMismatch):
+        comparer.feed("\n3\n")
+
+    verdict = comparer.finish()
+    assert verdict["stoppedEarly"] and verdict["mismatch"]["line"] == 2
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        OutputComparer("1", "fuzzy")
+
+
+def test_comparer_from_request_needs_expected_stdout():
+    assert output_judge.comparer_from_request({"compareMode": "lines"}) is None
+    comparer = output_judge.comparer_from_request({"expectedStdout": "1", "compareMode": "numeric"})
+    assert comparer.mode == "numeric" and comparer.stop_on_mismatch
+
+
+def test_runner_returns_the_verdict_instead_of_stdout(run):
+    response = run("for i in range(100000):\n    print(i)\n", expectedStdout="0\n1\n3\n")
+
+    assert response["passed"] is False
+    assert response["comparison"]["stoppedEarly"] is True
+    assert response["comparison"]["mismatch"]["actual"] == "2"
+    assert "stdout" not in response
@@ -0,0 +1,139 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import python_runner
+import python_static_checker
+from conftest import RUNTIME_DIR
+
+
+def test_input_reads_the_request_stdin(run):
+    response = run("name = input('Name? ')\nprint('Hi', name)\nprint(int(input()) + 1)\n", stdin="Ada\n41\n")
+
+    assert response["stdout"] == "Name? Hi Ada\n42\n"
+    assert response["timeout"] is False
+
+
+def test_input_past_the_end_of_stdin_raises_eof_instead_of_blocking(run):
+    response = run("total = 0\nwhile True:\n    total += int(input())\n", stdin="1\n2\n3\n", timeoutMs=2000)
+
+    assert response["timeout"] is False
+    assert response["stderr"].startswith("EOFError")
+
+
+def test_input_prompts_count_towards_the_output_stop(run):
+    response = run("while True:\n    input('?' * 100)\n", stdin="\n" * 100_000, outputStopBytes=10_000)
+
+    assert response["timeout"] is False
+    assert "Output limit exceeded" in response["stderr"]
+    assert 10_000 < len(response["stdout"]) <= 10_100
+
+
+def test_input_never_reads_the_servers_own_stdin():
+    requests = [{"id": 1, "source": "print(input())"}, {"id": 2, "source": "print('second')"}]
+    completed = subprocess.run(
+        [sys.executable, os.path.join(RUNTIME_DIR, "python_runner.py"), "--serve"],
+        input="".join(json.dumps(request) + "\n" for request in requests),
+        capture_output=True,
+        text=True,
+        timeout=30,
+    )
+    first, second = (json.loads(line) for line in completed.stdout.splitlines())
+
+    assert first["id"] == 1 and first["stderr"].startswith("EOFError")
+    assert second["id"] == 2 and second["stdout"] == "second\n"
+
+
+def test_static_checker_accepts_input():
+    assert python_static_checker.check_source("x = input()\nprint(x)\n", {"math"})["ok"]
+
+
+def test_runaway_print_stops_with_truncated_output_before_the_cpu_limit(run):
+    response = run("while True:\n    print(1)\n")
+
+    assert response["timeout"] is False
+    assert "Output limit exceeded" in response["stderr"]
+    assert response["truncated"] is True
+    assert response["stdout"].startswith("1\n1\n") and "bytes truncated" in response["stdout"]
+    assert response["phases"]["execute"]["cpu_seconds"] < python_runner.CPU_LIMIT_SECONDS / 2
+
+
+def test_output_stop_follows_the_requested_output_limit(run):
+    response = run("while True:\n    print('x' * 99)\n", outputLimitBytes=1000)
+
+    assert "program stopped after 2" in response["stderr"]
+    assert response["bytesDropped"] > 1000
+
+
+def test_request_limits_cannot_raise_the_process_defaults():
+    limits = python_runner.limits_from_request({"cpuSeconds": 1e6, "memoryLimitBytes": 1 << 40})
+    assert limits.cpu_seconds == python_runner.CPU_LIMIT_SECONDS
+    assert limits.mem_bytes == python_runner.MEM_LIMIT_BYTES
+
+    limits = python_runner.limits_from_request({"cpuSeconds": 0.5, "memoryLimitBytes": 1 << 20})
+    assert limits.cpu_seconds == 0.5 and limits.mem_bytes == 1 << 20
+
+
+def test_capped_output_keeps_head_and_tail():
+    output = python_runner.CappedOutput(10)
+    for index in range(10):
+        output.write(f"{index}\n")
+
+    assert output.truncated and output.bytes_dropped == 10
+    assert output.getvalue() == "0\n1\n2\n... [10 bytes truncated] ...\n\n8\n9\n"
+
+
+def test_sub_second_timeouts_are_honoured(run):
+    started = time.monotonic()
+    response = run("while True:\n    pass\n", timeoutMs=300)
+
+    assert response["timeout"] is True
+    assert time.monotonic() - started < 1
+
+
+def test_step_budget_stops_a_loop_without_a_timeout(run):
+    response = run("i = 0\nwhile True:\n    i += 1\n", stepBudget=10_000)
+
+    assert response["budgetExceeded"] is True and response["timeout"] is False
+    assert response["stderr"] == "Step budget of 10000 exceeded"
+
+
+def test_deterministic_runs_block_clock_modules(run):
+    assert run("import time\n", deterministic=True)["stderr"].startswith("ImportError")
+
+
+def test_batch_cases_run_in_order_with_their_own_stdin(run):
+    response = run("print(int(input()) * 2)\n", cases=[{"stdin": "1\n"}, {"stdin": "5\n", "expectedStdout": "10"}])
+
+    first, second = response["cases"]
+    assert first["stdout"] == "2\n"
+    assert second["passed"] is True
+
+
+def test_capped_output_streams_only_what_fits_under_the_limit():
+    streamed = []
+    output = python_runner.CappedOutput(6, on_stream=streamed.append)
+    for text in ("ab", "ééé", "more"):
+        output.write(text)
+
+    assert streamed == ["ab", "éé"]
+
+
+def _exited_child(kill=False):
+    pid = os.fork()
+    if pid == 0:
+        if kill:
+            os.kill(os.getpid(), signal.SIGKILL)
+        os._exit(0)
+    return pid
+
+
+def test_truncated_child_payload_is_reported_not_raised():
+    killed = python_runner._child_response(_exited_child(kill=True), b'{"stdout": "12')
+    exited = python_runner._child_response(_exited_child(), b'{"stdout": "\xff')
+
+    assert killed["timeout"] is True and killed["stderr"] == f"Execution terminated by signal {int(signal.SIGKILL)}"
+    assert exited == {"stdout": "", "stderr": "Runner child exited without a result", "timeout": False}
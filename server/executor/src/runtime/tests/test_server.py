@@ -0,0 +1,122 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import RUNTIME_DIR
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A ``--serve --socket`` runner; yields a function sending one request per new connection."""
+    path = str(tmp_path / "runner.sock")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(RUNTIME_DIR, "python_runner.py"), "--serve", "--socket", path],
+        env=dict(os.environ, EXECUTOR_CODE_CACHE_DIR=""),
+    )
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        assert process.poll() is None and time.monotonic() < deadline
+        time.sleep(0.02)
+
+    def connect():
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(path)
+        conn.settimeout(10)
+        return conn
+
+    def request(*payloads, raw=None):
+        with connect() as conn:
+            lines = raw if raw is not None else [json.dumps(payload) for payload in payloads]
+            conn.sendall("".join(line + "\n" for line in lines).encode("utf-8"))
+            reader = conn.makefile("r", encoding="utf-8")
+            return [json.loads(reader.readline()) for _ in lines]
+
+    request.connect = connect
+    yield request
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def test_code_cache_is_shared_across_connections(server):
+    (first,) = server({"source": "print(6 * 7)"})
+    (second,) = server({"source": "print(6 * 7)"})
+
+    assert first["stdout"] == second["stdout"] == "42\n"
+    assert second["usage"]["code_cache_hits"] == first["usage"]["code_cache_hits"] + 1
+
+
+def test_deterministic_results_are_cached_across_connections(server):
+    request = {"source": "import random\nprint(random.random())", "deterministic": True, "seed": 3}
+    (first,) = server(request)
+    (second,) = server(request)
+
+    assert "cached" not in first
+    assert second["cached"] is True
+    assert second["stdout"] == first["stdout"]
+
+
+def test_deterministic_batch_cases_are_cached_across_connections(server):
+    request = {
+        "source": "print(2)",
+        "deterministic": True,
+        "cases": [{"expectedStdout": "2\n"}, {"expectedStdout": "4\n"}],
+    }
+    (first,) = server(request)
+    (second,) = server(dict(request, cases=request["cases"] + [{"expectedStdout": "6\n"}]))
+
+    assert [case["passed"] for case in second["cases"]] == [True, False, False]
+    assert [case.get("cached", False) for case in second["cases"]] == [True, True, False]
+    (third,) = server(request)
+    assert all(case["cached"] for case in third["cases"])
+
+
+def test_connections_run_concurrently_and_answer_in_order(server):
+    slow = server.connect()
+    slow.sendall(b'{"id": "slow", "source": "while True: pass", "timeoutMs": 1500, "cpuSeconds": 1}\n')
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    replies = server({"id": 1, "source": "print(1)"}, {"id": 2, "source": "print(2)"})
+    assert time.monotonic() - started < 1
+    assert [(reply["id"], reply["stdout"]) for reply in replies] == [(1, "1\n"), (2, "2\n")]
+
+    with slow:
+        reply = json.loads(slow.makefile("r", encoding="utf-8").readline())
+    assert reply["id"] == "slow" and reply["timeout"] is True
+
+
+def test_bad_request_lines_do_not_stop_the_server(server):
+    bad_limits = {"source": "print(1)", "deterministic": True, "cpuSeconds": "x"}
+    replies = server(raw=["not json", "[1, 2]", json.dumps(bad_limits)])
+
+    assert all(reply["stderr"].startswith("Invalid request") for reply in replies)
+    assert server({"source": "print('still up')"})[0]["stdout"] == "still up\n"
+
+
+def test_streamed_frames_precede_the_result(server):
+    with server.connect() as conn:
+        conn.sendall(b'{"id": 7, "stream": true, "source": "print(1)\\nprint(2)"}\n')
+        reader = conn.makefile("r", encoding="utf-8")
+        frames = []
+        while not frames or frames[-1]["type"] != "result":
+            frames.append(json.loads(reader.readline()))
+
+    assert "".join(frame["data"] for frame in frames if frame["type"] == "stdout") == "1\n2\n"
+    assert frames[-1]["id"] == 7 and frames[-1]["stdout"] == "1\n2\n"
+
+
+def test_streamed_frames_respect_the_output_limit(server):
+    with server.connect() as conn:
+        conn.sendall(b'{"stream": true, "outputLimitBytes": 1000, "source": "print(\\"x\\" * 5000000)\\nprint(\\"y\\")"}\n')
+        reader = conn.makefile("r", encoding="utf-8")
+        frames = []
+        while not frames or frames[-1]["type"] != "result":
+            frames.append(json.loads(reader.readline()))
+
+    assert sum(len(frame["data"]) for frame in frames if frame["type"] == "stdout") == 1000
+    assert frames[-1]["truncated"] is True
@@ -0,0 +1,208 @@
+import io
+import json
+
+import pytest
+
+import python_static_checker as checker
+
+ALLOWED = {"math", "random", "turtle"}
+
+
+def _messages(findings):
+    return [(finding["line"], finding["message"]) for finding in findings]
+
+
+def test_split_keeps_decorators_and_continuation_clauses_together():
+    source = "@dec\ndef f():\n    pass\n\nif x:\n    pass\nelse:\n    pass\nprint(1)\n"
+
+    assert [line for line, _ in checker.split_top_level(source)] == [1, 5, 9]
+
+
+def test_unclosed_bracket_does_not_hide_following_statements():
+    analyzer = checker.IncrementalAnalyzer(ALLOWED)
+    result = analyzer.update("x = (\nfor i in range(10**9):\n    pass\nprint(1)\n")
+
+    messages = _messages(result["findings"])
+    assert messages[0] == (1, "SyntaxError: '(' was never closed")
+    assert (2, "Loop over 1000000000-step range is likely to exceed the time limit") in messages
+    assert not result["ok"]
+
+
+def test_unclosed_triple_quote_does_not_hide_following_statements():
+    analyzer = checker.IncrementalAnalyzer(ALLOWED)
+    result = analyzer.update('s = """\nwhile True:\n    pass\nimport os\n')
+
+    messages = [message for _, message in _messages(result["findings"])]
+    assert any(message.startswith("SyntaxError") for message in messages)
+    assert "Infinite loop: 'while' with a constant condition never breaks" in messages
+    assert "Import of module 'os' is not allowed" in messages
+
+
+def test_valid_column_zero_continuations_are_not_split():
+    analyzer = checker.IncrementalAnalyzer(ALLOWED)
+    source = 's = """\nfor x in y\nimport os\n"""\nsquares = [x * x\nfor x in range(3)]\nprint(s, squares)\n'
+
+    result = analyzer.update(source)
+    assert result["ok"], result["issues"]
+    assert result["findings"] == []
+
+
+def test_unchanged_statements_are_reused_after_a_syntax_error():
+    analyzer = checker.IncrementalAnalyzer(ALLOWED)
+    analyzer.update("a = 1\nb = (\nfor i in range(3):\n    print(i)\n")
+
+    result = analyzer.update("a = 1\nb = (2\nfor i in range(3):\n    print(i)\n")
+    # The broken block and its changed first statement; the loop comes from the cache
+    assert result["reanalyzed"] == 2
+    assert _messages(result["findings"])[0][0] == 2
+
+
+def test_findings_shift_with_moved_statements():
+    analyzer = checker.IncrementalAnalyzer(ALLOWED)
+    analyzer.update("while True:\n    pass\n")
+
+    result = analyzer.update("x = 1\n\nwhile True:\n    pass\n")
+    assert result["reanalyzed"] == 1
+    assert _messages(result["findings"]) == [(3, "Infinite loop: 'while' with a constant condition never breaks")]
+
+
+def _serve(*lines):
+    writer = io.StringIO()
+    checker.serve(io.StringIO("".join(line + "\n" for line in lines)), writer, checker.VerdictCache(8))
+    return [json.loads(line) for line in writer.getvalue().splitlines()]
+
+
+def test_serve_answers_bad_requests_and_keeps_going():
+    responses = _serve(
+        "not json",
+        "[1, 2]",
+        json.dumps({"id": 1, "source": 5}),
+        json.dumps({"id": 2, "source": "a = 1\0"}),
+        json.dumps({"id": 3, "session": "s", "source": "x = (\0"}),
+        json.dumps({"id": 4, "source": "print(1)"}),
+    )
+
+    assert [response["ok"] for response in responses] == [False, False, False, False, False, True]
+    assert all(issue.startswith("Invalid request") for response in responses[:3] for issue in response["issues"])
+    assert [response.get("id") for response in responses] == [None, None, 1, 2, 3, 4]
+
+
+def test_serve_caches_verdicts():
+    first, second = _serve(*[json.dumps({"source": "print(1)", "allowedModules": ["math"]})] * 2)
+
+    assert first["cached"] is False and second["cached"] is True
+
+
+def test_check_directory_skips_levels_in_other_languages(tmp_path):
+    (tmp_path / "python.json").write_text(
+        json.dumps({"language": "python", "levels": [{"level": 1, "reference_solution": "print(1)"}]})
+    )
+    (tmp_path / "javascript.json").write_text(
+        json.dumps({"language": "javascript", "levels": [{"level": 1, "reference_solution": "function solve(t){}"}]})
+    )
+    (tmp_path / "mixed.json").write_text(
+        json.dumps({"levels": [{"lang": "javascript", "solution": "let x = 1;"}, {"lang": "python", "solution": "x = 1"}]})
+    )
+    (tmp_path / "single.json").write_text(json.dumps({"lang": "js", "solution": "console.log(1)"}))
+    (tmp_path / "untagged.json").write_text(json.dumps({"solution": "while True:\n    pass\n"}))
+
+    results = checker.check_directory(str(tmp_path), {"math"}, jobs=1)
+    assert [(result["source"].rsplit("/", 1)[1], result["ok"]) for result in results] == [
+        ("mixed.json#2:solution", True),
+        ("python.json#1:solution", True),
+        ("untagged.json:solution", False),
+    ]
+
+
+def _runaway(source):
+    rejections, warnings = checker.find_runaway_code(checker.ast.parse(source))
+    return [finding["message"] for finding in rejections], [finding["message"] for finding in warnings]
+
+
+def test_endless_loop_inside_try_is_only_a_warning():
+    source = "it = iter([1, 2])\ntry:\n    while True:\n        print(next(it))\nexcept StopIteration:\n    pass\n"
+
+    assert _runaway(source) == ([], ["Loop 'while' with a constant condition can only end through an exception"])
+
+
+def test_endless_loop_in_a_function_called_inside_try_is_only_a_warning():
+    source = (
+        "def spin(it):\n    while True:\n        next(it)\n\n"
+        "def drain(it):\n    spin(it)\n\n"
+        "try:\n    drain(iter([1]))\nexcept StopIteration:\n    pass\n"
+    )
+
+    rejections, warnings = _runaway(source)
+    assert rejections == [] and len(warnings) == 1
+
+
+def test_runaway_code_in_functions_that_are_never_called_is_only_a_warning():
+    source = "def f(n):\n    return f(n - 1)\n\ndef spin():\n    while True:\n        pass\n\nprint(1)\n"
+
+    rejections, warnings = _runaway(source)
+    assert rejections == []
+    assert warnings == [
+        "Function 'f' calls itself without a base case (in a function that is never called)",
+        "Infinite loop: 'while' with a constant condition never breaks (in a function that is never called)",
+    ]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "while True:\n    pass\n",
+        "def f(n):\n    return f(n - 1)\n\nf(3)\n",
+        "def spin():\n    while True:\n        pass\n\ndef start():\n    spin()\n\nstart()\n",
+        "def solve():\n    while True:\n        pass\n",
+        "try:\n    while True:\n        pass\nfinally:\n    print(1)\n",
+    ],
+)
+def test_runaway_code_that_runs_unguarded_is_still_rejected(source):
+    rejections, _ = _runaway(source)
+
+    assert len(rejections) == 1
+
+
+def test_incremental_analysis_sees_calls_and_guards_in_other_statements():
+    analyzer = checker.IncrementalAnalyzer(ALLOWED)
+    analyzer.update("def spin():\n    while True:\n        pass\n")
+
+    assert not analyzer.update("def spin():\n    while True:\n        pass\n\nspin()\n")["ok"]
+    guarded = "def spin():\n    while True:\n        pass\n\ntry:\n    spin()\nexcept KeyboardInterrupt:\n    pass\n"
+    result = analyzer.update(guarded)
+    assert result["ok"] and result["reanalyzed"] == 1
+    assert [finding["severity"] for finding in result["findings"]] == ["warning"]
+
+
+@pytest.mark.parametrize(
+    "source, rejected, warned",
+    [
+        ("for i in range(10**9):\n    pass\n", 1, 0),
+        ("total = sum(range(20_000_000))\n", 0, 1),
+        ("xs = [x for x in range(10)]\n", 0, 0),
+        ("s = 'a' * 10**10\n", 1, 0),
+        ("n = 1\nwhile n < 10:\n    print(n)\n", 0, 1),
+        ("n = 1\nwhile n < 10:\n    n += 1\n", 0, 0),
+        ("def f(n):\n    if n == 0:\n        return 0\n    return f(n - 1)\n\nf(3)\n", 0, 0),
+    ],
+)
+def test_runaway_heuristics(source, rejected, warned):
+    rejections, warnings = _runaway(source)
+
+    assert (len(rejections), len(warnings)) == (rejected, warned)
+
+
+def test_endless_generator_loop_is_accepted():
+    source = "def naturals():\n    n = 0\n    while True:\n        yield n\n        n += 1\n\nprint(next(naturals()))\n"
+
+    assert _runaway(source) == ([], [])
+
+
+def test_huge_range_loop_that_can_break_is_only_a_warning():
+    source = "for n in range(1, 10**9):\n    if n * n > 50:\n        print(n)\n        break\n"
+
+    rejections, warnings = _runaway(source)
+    assert rejections == [] and warnings == ["Loop over 999999999-step range is likely to exceed the time limit"]
+    # A break of an inner loop does not leave the outer one
+    nested = "for n in range(10**9):\n    for m in range(3):\n        break\n"
+    assert len(_runaway(nested)[0]) == 1
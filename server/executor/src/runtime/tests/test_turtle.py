@@ -0,0 +1,45 @@
+import math
+import re
+
+import pytest
+
+
+def _path_commands(svg):
+    return re.findall(r'd="([^"]*)"', svg)
+
+
+def test_circle_with_steps_renders_a_polygon(run):
+    response = run("import turtle\nturtle.circle(50, steps=6)\n")
+
+    assert len(response["segments"]) == 6
+    (path,) = _path_commands(response["svg"])
+    assert "A" not in path
+    # The move to the start point plus one vertex per side
+    assert len(re.findall(r"-?\d+\.\d+ -?\d+\.\d+", path)) == 7
+
+
+@pytest.mark.parametrize("radius, extent", [(50, 360), (-40, 360), (30, 90), (30, -120)])
+def test_stepped_arc_segments_are_the_standard_chords(run, radius, extent):
+    segments = run(f"import turtle\nturtle.circle({radius}, {extent}, steps=5)\n")["segments"]
+
+    turn = extent if radius >= 0 else -extent
+    chord = 2 * abs(radius) * math.sin(math.radians(extent / 10))
+    assert len(segments) == 5
+    for index, segment in enumerate(segments):
+        assert segment["len"] == pytest.approx(chord)
+        assert segment["deg"] == pytest.approx((turn / 5 * (index + 0.5)) % 360)
+
+
+def test_circle_without_steps_stays_an_svg_arc(run):
+    response = run("import turtle\nturtle.circle(50)\n")
+
+    (path,) = _path_commands(response["svg"])
+    assert path.count("A ") == 3
+    assert len(response["segments"]) > 6
+
+
+def test_polygon_path_continues_into_the_next_stroke(run):
+    response = run("import turtle\nturtle.circle(40, 180, steps=4)\nturtle.forward(30)\n")
+
+    assert len(_path_commands(response["svg"])) == 1
+    assert len(response["segments"]) == 5
@@ -0,0 +1,71 @@
+import pytest
+
+import turtle_judge
+from turtle_judge import canonicalize, compare
+
+
+def test_canonicalize_merges_flips_and_drops_segments():
+    lengths, headings = canonicalize(
+        [
+            {"len": 50, "deg": 0},
+            {"len": 50, "deg": 360},
+            {"len": 0, "deg": 90},
+            {"len": -20, "deg": 270},
+            {"len": 10, "deg": -270},
+        ]
+    )
+
+    assert list(lengths) == [100, 30]
+    assert list(headings) == [0, 90]
+
+
+def test_canonicalize_snaps_float_noise_to_zero():
+    _, headings = canonicalize([{"len": 1, "deg": 359.99999999}, {"len": 1, "deg": 90}])
+
+    assert list(headings) == [0, 90]
+
+
+def test_rotation_invariant_headings_are_relative_to_the_first_segment():
+    _, headings = canonicalize([{"len": 1, "deg": 45}, {"len": 1, "deg": 135}], rotation_invariant=True)
+
+    assert list(headings) == [0, 90]
+
+
+def _square(size, start=0.0, pieces=1):
+    return [{"len": size / pieces, "deg": start + 90 * side} for side in range(4) for _ in range(pieces)]
+
+
+def test_rotated_and_split_drawings_match():
+    verdict = compare(_square(100, start=30, pieces=4), _square(100))
+
+    assert verdict["pass"] and verdict["actualSegments"] == verdict["expectedSegments"] == 4
+    assert verdict["maxAngleError"] == pytest.approx(0)
+
+
+def test_rotation_matters_without_rotation_invariance():
+    assert not compare(_square(100, start=30), _square(100), rotation_invariant=False)["pass"]
+
+
+def test_tolerances_decide_the_first_mismatch():
+    actual = _square(100)
+    actual[2] = {"len": 105, "deg": 180.5}
+
+    assert compare(actual, _square(100))["pass"]
+    verdict = compare(actual, _square(100), length_tolerance=0.01)
+    assert verdict["mismatchIndex"] == 2 and verdict["maxLengthError"] == pytest.approx(0.05)
+    assert compare(actual, _square(100), angle_tolerance=0.1)["mismatchIndex"] == 2
+
+
+def test_segment_count_mismatch():
+    verdict = compare(_square(100)[:3], _square(100))
+
+    assert not verdict["pass"] and verdict["mismatchIndex"] == 3
+
+
+def test_compare_request_reads_request_keys():
+    verdict = turtle_judge.compare_request(
+        _square(110), {"expectedSegments": _square(100), "lengthTolerance": 0.05}
+    )
+
+    assert verdict["mismatchIndex"] == 0
+    assert turtle_judge.compare_request([], {})["pass"]
@@ -4,77 +4,541 @@ This module provides a turtle graphics interface that generates SVG paths
 instead of requiring a GUI environment.
 """
 
+import base64
 import math
-import sys
-import json
-from typing import List, Tuple, Dict, Any
+import re
+from array import array
+from typing import List, Tuple, Dict, Any, Optional
 
+# Optional callable installed by the sandbox runner to receive drawing events live
+_event_listener = None
+
+# Animation timeline, recorded only when the runner asks for it (see ``_sandbox_configure``)
+_timeline = None
+
+# Primitive kinds stored on the canvas
+LINE = 0
+ARC = 1
+
+DEFAULT_COLOR = "black"
+DEFAULT_WIDTH = 2.0
+
+# Colour names, #hex values and rgb()/hsl() forms; anything else could break out of the SVG attribute
+_COLOR_PATTERN = re.compile(r"^(#[0-9A-Fa-f]{3,8}|[A-Za-z]{1,32}|(rgb|hsl)a?\([0-9.,% ]{1,48}\))$")
+
+
+def _default_steps(radius: float, extent: float) -> int:
+    """Chord count used by the standard library turtle for an arc."""
+    frac = abs(extent) / 360.0
+    return 1 + int(min(11 + abs(radius) / 6.0, 59.0) * frac)
+
+
+class Canvas:
+    """Every drawn primitive, shared by all turtles, in flat ``array`` buffers.
+
+    Lines and arcs are appended as raw floats (an arc is one primitive however many chords
+    it stands for) and the bounding box is updated on each draw, so drawing allocates no
+    strings or dicts. SVG text and judge dicts are only produced on request at the end of
+    the run.
+    """
+
+    __slots__ = (
+        "_kind",
+        "_x0",
+        "_y0",
+        "_x1",
+        "_y1",
+        "_lens",
+        "_degs",
+        "_extents",
+        "_steps",
+        "_style",
+        "styles",
+        "_style_index",
+        "turtle_count",
+        "segment_total",
+        "min_x",
+        "min_y",
+        "max_x",
+        "max_y",
+    )
 
-class TurtleState:
     def __init__(self):
+        self.styles: List[Tuple[str, float]] = []
+        self._style_index: Dict[Tuple[str, float], int] = {}
+        self.turtle_count = 0
+        self.clear()
+
+    def clear(self):
+        """Drop all primitives; style indexes held by turtles stay valid."""
+        self._kind = array("b")
+        self._x0 = array("d")
+        self._y0 = array("d")
+        self._x1 = array("d")
+        self._y1 = array("d")
+        self._lens = array("d")  # line length, or arc radius
+        self._degs = array("d")  # line heading, or heading at the start of the arc
+        self._extents = array("d")  # arc extent as passed to circle(), 0 for lines
+        self._steps = array("i")  # judge segments this primitive expands to
+        self._style = array("i")
+        self.segment_total = 0
+        self.min_x = math.inf
+        self.min_y = math.inf
+        self.max_x = -math.inf
+        self.max_y = -math.inf
+
+    def style(self, color: str, width: float) -> int:
+        key = (color, width)
+        index = self._style_index.get(key)
+        if index is None:
+            index = len(self.styles)
+            self.styles.append(key)
+            self._style_index[key] = index
+        return index
+
+    def include(self, x: float, y: float):
+        if x < self.min_x:
+            self.min_x = x
+        if x > self.max_x:
+            self.max_x = x
+        if y < self.min_y:
+            self.min_y = y
+        if y > self.max_y:
+            self.max_y = y
+
+    def add(self, kind, x0, y0, x1, y1, length, deg, extent, steps, style):
+        self._kind.append(kind)
+        self._x0.append(x0)
+        self._y0.append(y0)
+        self._x1.append(x1)
+        self._y1.append(y1)
+        self._lens.append(length)
+        self._degs.append(deg)
+        self._extents.append(extent)
+        self._steps.append(steps)
+        self._style.append(style)
+        self.segment_total += steps
+
+    def primitive_count(self) -> int:
+        return len(self._kind)
+
+    def segment_count(self) -> int:
+        """Number of judge segments, counting each arc as its chords."""
+        return self.segment_total
+
+    def get_segments(self) -> List[Dict[str, float]]:
+        """Get all segments for judge, expanding arcs into the chords a standard turtle draws."""
+        segments = []
+        append = segments.append
+        for kind, length, deg, extent, steps in zip(
+            self._kind, self._lens, self._degs, self._extents, self._steps
+        ):
+            if kind == LINE:
+                append({"len": length, "deg": deg})
+                continue
+            step = extent / steps
+            chord = 2.0 * length * math.sin(math.radians(step / 2))
+            if length < 0:
+                chord, step = -chord, -step
+            heading = deg + step / 2
+            for _ in range(steps):
+                append({"len": chord, "deg": heading % 360})
+                heading += step
+        return segments
+
+
+# Timeline record types; each record is an opcode byte followed by varint arguments
+OP_DRAW = 0  # dx, dy, ms: move with the pen down
+OP_MOVE = 1  # dx, dy, ms: move with the pen up
+OP_HEADING = 2  # heading, ms: turn to an absolute heading
+OP_PEN = 3  # down: 1 = pen down, 0 = pen up
+OP_STYLE = 4  # index into the ``styles`` table
+OP_SPEED = 5  # speed 0-10
+OP_TURTLE = 6  # turtle: following records apply to this turtle
+
+TIMELINE_SCALE = 100  # positions and headings are sent in hundredths
+TIMELINE_MAX_BYTES = 256 * 1024
+
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+class Timeline:
+    """Compact, delta-encoded record of turtle state changes for client-side playback.
+
+    Positions are quantized to ``1 / TIMELINE_SCALE`` units and sent as deltas from the
+    turtle's previous quantized position, so rounding never accumulates. Every move and
+    turn carries its playback duration derived from the turtle's ``speed()``, so a client
+    only has to add deltas and wait; arcs arrive as their chords. Recording stops (and
+    ``truncated`` is set) once the buffer reaches ``max_bytes``.
+    """
+
+    __slots__ = ("data", "current", "positions", "duration_ms", "truncated", "max_bytes")
+
+    def __init__(self, max_bytes: int = TIMELINE_MAX_BYTES):
+        self.data = bytearray()
+        self.current = 0
+        self.positions: Dict[int, Tuple[int, int]] = {}
+        self.duration_ms = 0
+        self.truncated = False
+        self.max_bytes = max_bytes
+
+    def _record(self, turtle: "TurtleState", op: int, *values: int) -> bool:
+        if self.truncated:
+            return False
+        if len(self.data) >= self.max_bytes:
+            self.truncated = True
+            return False
+        data = self.data
+        if turtle.index != self.current:
+            self.current = turtle.index
+            data.append(OP_TURTLE)
+            _write_varint(data, turtle.index)
+        data.append(op)
+        for value in values:
+            _write_varint(data, value)
+        return True
+
+    def move(self, turtle: "TurtleState", x: float, y: float, distance: float, draw: bool):
+        qx, qy = round(x * TIMELINE_SCALE), round(y * TIMELINE_SCALE)
+        last_x, last_y = self.positions.get(turtle.index, (0, 0))
+        speed = turtle.speed_value
+        ms = round(abs(distance) * 1000 / (speed * 50)) if speed else 0
+        if self._record(turtle, OP_DRAW if draw else OP_MOVE, _zigzag(qx - last_x), _zigzag(qy - last_y), ms):
+            self.positions[turtle.index] = (qx, qy)
+            self.duration_ms += ms
+
+    def heading(self, turtle: "TurtleState", turned: float):
+        speed = turtle.speed_value
+        ms = round(abs(turned) * 1000 / (speed * 180)) if speed else 0
+        if self._record(turtle, OP_HEADING, round(turtle.angle * TIMELINE_SCALE) % (360 * TIMELINE_SCALE), ms):
+            self.duration_ms += ms
+
+    def state(self, turtle: "TurtleState", op: int, value: int):
+        self._record(turtle, op, value)
+
+    def encode(self, styles: List[Tuple[str, float]]) -> Dict[str, Any]:
+        return {
+            "format": 1,
+            "scale": TIMELINE_SCALE,
+            "styles": [[color, width] for color, width in styles],
+            "data": base64.b64encode(bytes(self.data)).decode("ascii"),
+            "bytes": len(self.data),
+            "durationMs": self.duration_ms,
+            "truncated": self.truncated,
+        }
+
+
+def _write_varint(data: bytearray, value: int):
+    while value > 0x7F:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+# Argument count of each timeline record type
+_OP_ARITY = {OP_DRAW: 3, OP_MOVE: 3, OP_HEADING: 2, OP_PEN: 1, OP_STYLE: 1, OP_SPEED: 1, OP_TURTLE: 1}
+
+
+def decode_timeline(encoded: str) -> List[Tuple[int, ...]]:
+    """Decode a timeline ``data`` string into ``(op, *args)`` tuples, deltas unzigzagged."""
+    data = base64.b64decode(encoded)
+    records: List[Tuple[int, ...]] = []
+    position = 0
+    while position < len(data):
+        op = data[position]
+        position += 1
+        values = []
+        for _ in range(_OP_ARITY[op]):
+            value = shift = 0
+            while True:
+                byte = data[position]
+                position += 1
+                value |= (byte & 0x7F) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+            values.append(value)
+        if op in (OP_DRAW, OP_MOVE):
+            values[0] = _unzigzag(values[0])
+            values[1] = _unzigzag(values[1])
+        records.append((op, *values))
+    return records
+
+
+class TurtleState:
+    """Position, heading and pen of one turtle; drawing goes to a (shared) ``Canvas``."""
+
+    __slots__ = ("x", "y", "angle", "pen_down", "color", "width", "speed_value", "style", "canvas", "index")
+
+    def __init__(self, canvas: Optional[Canvas] = None):
+        self.canvas = canvas if canvas is not None else Canvas()
+        self.index = self.canvas.turtle_count
+        self.canvas.turtle_count += 1
         self.x = 0.0
         self.y = 0.0
         self.angle = 0.0  # degrees, 0 = east, 90 = north
         self.pen_down = True
-        self.paths: List[str] = []
-        self.segments: List[Dict[str, float]] = []  # Store segments for judge
-        
+        self.color = DEFAULT_COLOR
+        self.width = DEFAULT_WIDTH
+        self.speed_value = 3
+        self.style = self.canvas.style(self.color, self.width)
+
     def forward(self, distance: float):
         """Move turtle forward by distance."""
+        radians = math.radians(self.angle)
+        x, y = self.x, self.y
+        new_x = x + distance * math.cos(radians)
+        new_y = y + distance * math.sin(radians)
+
         if self.pen_down:
-            # Calculate new position
-            radians = math.radians(self.angle)
-            new_x = self.x + distance * math.cos(radians)
-            new_y = self.y + distance * math.sin(radians)
-            
-            # Create a separate path for each forward movement
-            path_data = f"M {self.x:.2f} {self.y:.2f} L {new_x:.2f} {new_y:.2f}"
-            self.paths.append(path_data)
-            
-            # Add segment data for judge
-            self.segments.append({
-                "len": distance,
-                "deg": self.angle % 360
-            })
-            
-            # Update position
-            self.x = new_x
-            self.y = new_y
-        else:
-            # Just move without drawing
-            radians = math.radians(self.angle)
-            self.x += distance * math.cos(radians)
-            self.y += distance * math.sin(radians)
-    
+            canvas = self.canvas
+            canvas.add(LINE, x, y, new_x, new_y, distance, self.angle % 360, 0.0, 1, self.style)
+
+            # Keep the bounding box current so rendering needs no extra pass
+            if x < canvas.min_x:
+                canvas.min_x = x
+            if x > canvas.max_x:
+                canvas.max_x = x
+            if y < canvas.min_y:
+                canvas.min_y = y
+            if y > canvas.max_y:
+                canvas.max_y = y
+            if new_x < canvas.min_x:
+                canvas.min_x = new_x
+            if new_x > canvas.max_x:
+                canvas.max_x = new_x
+            if new_y < canvas.min_y:
+                canvas.min_y = new_y
+            if new_y > canvas.max_y:
+                canvas.max_y = new_y
+
+            if _event_listener is not None:
+                _event_listener({"op": "line", "from": [x, y], "to": [new_x, new_y]})
+        elif _event_listener is not None:
+            _event_listener({"op": "move", "to": [new_x, new_y]})
+        if _timeline is not None:
+            _timeline.move(self, new_x, new_y, distance, self.pen_down)
+
+        # Update position
+        self.x = new_x
+        self.y = new_y
+
     def right(self, angle: float):
         """Turn turtle right by angle degrees."""
-        self.angle -= angle
-        self.angle = self.angle % 360
-    
+        self.angle = (self.angle - angle) % 360
+        if _timeline is not None:
+            _timeline.heading(self, angle)
+
     def left(self, angle: float):
         """Turn turtle left by angle degrees."""
-        self.angle += angle
-        self.angle = self.angle % 360
-    
+        self.angle = (self.angle + angle) % 360
+        if _timeline is not None:
+            _timeline.heading(self, angle)
+
     def penup(self):
         """Lift the pen up."""
         self.pen_down = False
-    
+        if _timeline is not None:
+            _timeline.state(self, OP_PEN, 0)
+
     def pendown(self):
         """Put the pen down."""
         self.pen_down = True
-    
-    def get_svg_paths(self) -> List[str]:
-        """Get all SVG paths."""
-        return self.paths.copy()
-    
+        if _timeline is not None:
+            _timeline.state(self, OP_PEN, 1)
+
+    def goto(self, x, y=None):
+        """Move to an absolute position, drawing a line if the pen is down.
+
+        Accepts ``goto(x, y)`` or ``goto((x, y))``; the heading is not changed.
+        """
+        if y is None:
+            x, y = x
+        new_x, new_y = float(x), float(y)
+        old_x, old_y = self.x, self.y
+        if self.pen_down:
+            dx, dy = new_x - old_x, new_y - old_y
+            deg = math.degrees(math.atan2(dy, dx)) % 360 if (dx or dy) else self.angle % 360
+            canvas = self.canvas
+            canvas.add(LINE, old_x, old_y, new_x, new_y, math.hypot(dx, dy), deg, 0.0, 1, self.style)
+            canvas.include(old_x, old_y)
+            canvas.include(new_x, new_y)
+            if _event_listener is not None:
+                _event_listener({"op": "line", "from": [old_x, old_y], "to": [new_x, new_y]})
+        elif _event_listener is not None:
+            _event_listener({"op": "move", "to": [new_x, new_y]})
+        if _timeline is not None:
+            _timeline.move(self, new_x, new_y, math.hypot(new_x - old_x, new_y - old_y), self.pen_down)
+        self.x = new_x
+        self.y = new_y
+
+    def setheading(self, angle: float):
+        """Point the turtle at an absolute heading in degrees (0 = east)."""
+        old = self.angle
+        self.angle = angle % 360
+        if _timeline is not None:
+            _timeline.heading(self, (self.angle - old + 180) % 360 - 180)
+
+    def home(self):
+        """Move back to the origin and face east."""
+        self.goto(0.0, 0.0)
+        self.setheading(0.0)
+
+    def circle(self, radius: float, extent: Optional[float] = None, steps: Optional[int] = None):
+        """Draw an arc with its centre ``radius`` units to the left of the turtle.
+
+        A positive radius turns counterclockwise, a negative one clockwise. ``extent``
+        defaults to a full circle and ``steps`` to the chord count of the standard turtle;
+        the arc is stored as one primitive and only expanded into chords for the judge.
+        An explicit ``steps`` asks for a polygon (``circle(50, steps=6)`` is a hexagon), so
+        its chords are stored as lines and the picture matches the judged segments.
+        """
+        radius = float(radius)
+        extent = 360.0 if extent is None else float(extent)
+        polygon = steps is not None
+        steps = _default_steps(radius, extent) if steps is None else max(1, int(steps))
+        turn = extent if radius >= 0 else -extent
+
+        heading = self.angle
+        start_x, start_y = self.x, self.y
+        rad = math.radians(heading)
+        center_x = start_x - radius * math.sin(rad)
+        center_y = start_y + radius * math.cos(rad)
+        end = math.radians(heading + turn)
+        end_x = center_x + radius * math.sin(end)
+        end_y = center_y - radius * math.cos(end)
+
+        if self.pen_down and polygon:
+            self._chords(center_x, center_y, radius, heading, turn, extent, steps, end_x, end_y)
+        elif self.pen_down:
+            canvas = self.canvas
+            canvas.add(ARC, start_x, start_y, end_x, end_y, radius, heading % 360, extent, steps, self.style)
+            _include_arc(canvas, center_x, center_y, radius, heading, turn, start_x, start_y, end_x, end_y)
+            if _event_listener is not None:
+                _event_listener(
+                    {
+                        "op": "arc",
+                        "from": [start_x, start_y],
+                        "to": [end_x, end_y],
+                        "center": [center_x, center_y],
+                        "turn": turn,
+                    }
+                )
+        elif _event_listener is not None:
+            _event_listener({"op": "move", "to": [end_x, end_y]})
+
+        self.x = end_x
+        self.y = end_y
+        self.angle = (heading + turn) % 360
+        if _timeline is not None:
+            chord = abs(2.0 * radius * math.sin(math.radians(turn / steps / 2)))
+            for index in range(1, steps + 1):
+                angle = math.radians(heading + turn * index / steps)
+                _timeline.move(
+                    self,
+                    center_x + radius * math.sin(angle),
+                    center_y - radius * math.cos(angle),
+                    chord,
+                    self.pen_down,
+                )
+            # The turn happened along the chords; only the final heading is recorded
+            _timeline.heading(self, 0.0)
+
+    def _chords(self, center_x, center_y, radius, heading, turn, extent, steps, end_x, end_y):
+        """Store the ``steps`` chords of an arc as lines, exactly as the judge expands an arc."""
+        canvas = self.canvas
+        step = turn / steps
+        chord = 2.0 * abs(radius) * math.sin(math.radians(extent / steps / 2))
+        x, y = self.x, self.y
+        canvas.include(x, y)
+        for index in range(1, steps + 1):
+            if index == steps:
+                # The last chord ends exactly where circle() leaves the turtle
+                new_x, new_y = end_x, end_y
+            else:
+                angle = math.radians(heading + step * index)
+                new_x = center_x + radius * math.sin(angle)
+                new_y = center_y - radius * math.cos(angle)
+            deg = (heading + step * (index - 0.5)) % 360
+            canvas.add(LINE, x, y, new_x, new_y, chord, deg, 0.0, 1, self.style)
+            canvas.include(new_x, new_y)
+            if _event_listener is not None:
+                _event_listener({"op": "line", "from": [x, y], "to": [new_x, new_y]})
+            x, y = new_x, new_y
+
+    def pencolor(self, *color):
+        """Set the pen colour (name, ``#hex`` or an ``(r, g, b)`` tuple of 0-1 floats); return it without args."""
+        if not color:
+            return self.color
+        value = color[0] if len(color) == 1 else color
+        if isinstance(value, (tuple, list)):
+            red, green, blue = (max(0, min(255, round(float(part) * 255))) for part in value)
+            value = f"rgb({red},{green},{blue})"
+        value = str(value).strip()
+        if not _COLOR_PATTERN.match(value):
+            raise ValueError(f"bad color string: {value!r}")
+        self.color = value
+        self.style = self.canvas.style(self.color, self.width)
+        if _timeline is not None:
+            _timeline.state(self, OP_STYLE, self.style)
+
+    def pensize(self, width: Optional[float] = None):
+        """Set the line width; return it without args."""
+        if width is None:
+            return self.width
+        width = float(width)
+        if not width > 0:
+            raise ValueError("pensize must be positive")
+        self.width = width
+        self.style = self.canvas.style(self.color, self.width)
+        if _timeline is not None:
+            _timeline.state(self, OP_STYLE, self.style)
+
+    def speed(self, speed=None):
+        """Set the drawing speed (0 = fastest, 1-10 slow to fast); return it without args."""
+        if speed is None:
+            return self.speed_value
+        names = {"fastest": 0, "fast": 10, "normal": 6, "slow": 3, "slowest": 1}
+        if isinstance(speed, str):
+            speed = names.get(speed, 0)
+        speed = int(round(speed))
+        self.speed_value = speed if 0.5 < speed < 10.5 else 0
+        if _timeline is not None:
+            _timeline.state(self, OP_SPEED, self.speed_value)
+
+    def segment_count(self) -> int:
+        return self.canvas.segment_count()
+
     def get_segments(self) -> List[Dict[str, float]]:
         """Get all segments for judge."""
-        return self.segments.copy()
+        return self.canvas.get_segments()
+
+
+def _include_arc(canvas, center_x, center_y, radius, heading, turn, start_x, start_y, end_x, end_y):
+    """Grow the bounding box by an arc: its endpoints plus every axis extreme it sweeps past."""
+    canvas.include(start_x, start_y)
+    canvas.include(end_x, end_y)
+    r = abs(radius)
+    if not r:
+        return
+    # Angle of the start point as seen from the centre
+    start = (heading - 90) % 360 if radius >= 0 else (heading + 90) % 360
+    sweep = min(abs(turn), 360.0)
+    for axis, (dx, dy) in ((0, (r, 0)), (90, (0, r)), (180, (-r, 0)), (270, (0, -r))):
+        offset = (axis - start) % 360 if turn >= 0 else (start - axis) % 360
+        if offset <= sweep:
+            canvas.include(center_x + dx, center_y + dy)
 
 
-# Global turtle instance
-_turtle = TurtleState()
+# Shared canvas and the default turtle behind the module-level functions
+_canvas = Canvas()
+_turtle = TurtleState(_canvas)
 
 # Public API functions
 def forward(distance: float):
@@ -97,106 +561,283 @@ def pendown():
     """Put the pen down."""
     _turtle.pendown()
 
-def get_svg_output() -> str:
-    """Get SVG representation of all drawn paths."""
-    paths = _turtle.get_svg_paths()
-    if not paths:
-        return ""
-    
-    # Calculate bounding box
-    all_points = []
-    for path in paths:
-        # Parse path data to extract points
-        parts = path.split()
-        i = 0
-        while i < len(parts):
-            if parts[i] in ['M', 'L']:
-                if i + 2 < len(parts):
-                    try:
-                        x, y = float(parts[i + 1]), float(parts[i + 2])
-                        all_points.append((x, y))
-                    except ValueError:
-                        pass
-                i += 3
+def goto(x, y=None):
+    """Move to an absolute position, drawing a line if the pen is down."""
+    _turtle.goto(x, y)
+
+def setheading(angle: float):
+    """Point the turtle at an absolute heading in degrees (0 = east)."""
+    _turtle.setheading(angle)
+
+def home():
+    """Move back to the origin and face east."""
+    _turtle.home()
+
+def circle(radius: float, extent: Optional[float] = None, steps: Optional[int] = None):
+    """Draw a circle or arc with its centre ``radius`` units to the left."""
+    _turtle.circle(radius, extent, steps)
+
+def pencolor(*color):
+    """Set or return the pen colour."""
+    return _turtle.pencolor(*color)
+
+def pensize(width: Optional[float] = None):
+    """Set or return the line width."""
+    return _turtle.pensize(width)
+
+def speed(speed=None):
+    """Set or return the drawing speed."""
+    return _turtle.speed(speed)
+
+def _collinear(ax: float, ay: float, bx: float, by: float, cx: float, cy: float) -> bool:
+    """True when b->c continues a->b in the same direction."""
+    dx1, dy1 = bx - ax, by - ay
+    dx2, dy2 = cx - bx, cy - by
+    cross = dx1 * dy2 - dy1 * dx2
+    dot = dx1 * dx2 + dy1 * dy2
+    return dot > 0 and abs(cross) <= 1e-9 * (abs(dx1) + abs(dy1)) * (abs(dx2) + abs(dy2))
+
+
+def _arc_piece(x0, y0, radius, heading, turn) -> Tuple[float, int, List[float]]:
+    """SVG arc command data for an arc: radius, sweep flag and sub-arc endpoints.
+
+    Arcs are split into pieces of at most 120 degrees so full circles (whose start and end
+    coincide) and near-half arcs render unambiguously.
+    """
+    rad = math.radians(heading)
+    center_x = x0 - radius * math.sin(rad)
+    center_y = y0 + radius * math.cos(rad)
+    pieces = max(1, math.ceil(min(abs(turn), 360.0) / 120.0))
+    points: List[float] = []
+    for index in range(1, pieces + 1):
+        angle = math.radians(heading + turn * index / pieces)
+        points.append(center_x + radius * math.sin(angle))
+        points.append(center_y - radius * math.cos(angle))
+    return abs(radius), 1 if turn > 0 else 0, points
+
+
+def _paths(canvas: Canvas) -> List[Tuple[int, float, float, List[Any]]]:
+    """Merge contiguous primitives of the same style into ``(style, x, y, pieces)`` paths.
+
+    A piece is either a flat ``[x0, y0, x1, y1, ...]`` polyline or an arc tuple from
+    ``_arc_piece``. Consecutive collinear line segments are folded into one, so
+    ``forward(50)`` twice renders exactly like ``forward(100)``.
+    """
+    paths: List[Tuple[int, float, float, List[Any]]] = []
+    pieces: List[Any] = []
+    style = -1
+    end_x = end_y = math.nan
+    for kind, x0, y0, x1, y1, length, deg, extent, style_index in zip(
+        canvas._kind,
+        canvas._x0,
+        canvas._y0,
+        canvas._x1,
+        canvas._y1,
+        canvas._lens,
+        canvas._degs,
+        canvas._extents,
+        canvas._style,
+    ):
+        if style_index != style or x0 != end_x or y0 != end_y:
+            style = style_index
+            pieces = []
+            paths.append((style, x0, y0, pieces))
+        end_x, end_y = x1, y1
+        if kind == ARC:
+            if length:
+                pieces.append(_arc_piece(x0, y0, length, deg, extent if length >= 0 else -extent))
+            continue
+        if x1 == x0 and y1 == y0:
+            continue  # zero-length move
+        current = pieces[-1] if pieces and isinstance(pieces[-1], list) else None
+        if current is None:
+            pieces.append([x0, y0, x1, y1])
+        elif (current[-4] == x0 and current[-3] == y0) or _collinear(
+            current[-4], current[-3], x0, y0, x1, y1
+        ):
+            current[-2] = x1
+            current[-1] = y1
+        else:
+            current.append(x1)
+            current.append(y1)
+    return [path for path in paths if path[3]]
+
+
+# Douglas-Peucker runs over windows of this many points so long spirals stay linear in cost;
+# window boundaries are always kept, which only makes the result slightly more exact.
+SIMPLIFY_WINDOW = 256
+
+
+def _simplify(points: List[float], tolerance: float) -> List[float]:
+    """Douglas-Peucker simplification of a flat polyline; endpoints are always kept."""
+    count = len(points) // 2
+    if tolerance <= 0 or count < 3:
+        return points
+    keep = bytearray(count)
+    keep[-1] = 1
+    stack = []
+    for first in range(0, count - 1, SIMPLIFY_WINDOW):
+        keep[first] = 1
+        stack.append((first, min(first + SIMPLIFY_WINDOW, count - 1)))
+    while stack:
+        first, last = stack.pop()
+        ax, ay = points[2 * first], points[2 * first + 1]
+        bx, by = points[2 * last], points[2 * last + 1]
+        dx, dy = bx - ax, by - ay
+        norm = math.hypot(dx, dy)
+        worst, worst_index = -1.0, -1
+        for index in range(first + 1, last):
+            px, py = points[2 * index], points[2 * index + 1]
+            if norm:
+                distance = abs(dx * (ay - py) - dy * (ax - px)) / norm
             else:
-                i += 1
-    
-    if not all_points:
-        return ""
-    
-    min_x = min(p[0] for p in all_points)
-    max_x = max(p[0] for p in all_points)
-    min_y = min(p[1] for p in all_points)
-    max_y = max(p[1] for p in all_points)
-    
+                distance = math.hypot(px - ax, py - ay)
+            if distance > worst:
+                worst, worst_index = distance, index
+        if worst > tolerance:
+            keep[worst_index] = 1
+            stack.append((first, worst_index))
+            stack.append((worst_index, last))
+    simplified: List[float] = []
+    for index in range(count):
+        if keep[index]:
+            simplified.append(points[2 * index])
+            simplified.append(points[2 * index + 1])
+    return simplified
+
+
+def _path_element(x: float, y: float, pieces: List[Any], style: Tuple[str, float]) -> str:
+    commands = [f"M {x:.2f} {y:.2f}"]
+    for piece in pieces:
+        if isinstance(piece, list):
+            commands.append("L " + " ".join(f"{value:.2f}" for value in piece[2:]))
+        else:
+            radius, sweep, points = piece
+            for index in range(0, len(points), 2):
+                commands.append(
+                    f"A {radius:.2f} {radius:.2f} 0 0 {sweep} {points[index]:.2f} {points[index + 1]:.2f}"
+                )
+    color, width = style
+    return f'<path d="{" ".join(commands)}" stroke="{color}" stroke-width="{width:g}" fill="none"/>'
+
+
+def _point_count(pieces: List[Any]) -> int:
+    count = 1
+    for piece in pieces:
+        count += len(piece) // 2 - 1 if isinstance(piece, list) else len(piece[2]) // 2
+    return count
+
+
+def render_svg(canvas: Canvas, tolerance: float = 0.0, max_bytes: int = 0) -> Tuple[str, Dict[str, Any]]:
+    """Render ``canvas`` as SVG with one ``<path>`` per continuous stroke of one style.
+
+    ``tolerance`` (drawing units) enables Douglas-Peucker simplification of straight runs;
+    arcs are always emitted as SVG arc commands. When the SVG is larger than ``max_bytes``
+    the tolerance is raised step by step until it fits (or a fixed number of attempts is
+    used up; ``overLimit`` is then reported). Judge segments are never affected. Returns
+    the SVG and before/after statistics.
+    """
+    segment_count = canvas.segment_count()
+    if not canvas.primitive_count():
+        return "", {}
+
+    # Bounding box is maintained incrementally by the canvas
+    min_x, max_x = canvas.min_x, canvas.max_x
+    min_y, max_y = canvas.min_y, canvas.max_y
+
     # Add padding
     padding = 10
     width = max_x - min_x + 2 * padding
     height = max_y - min_y + 2 * padding
-    
-    # Create SVG
-    svg_paths = []
-    for path in paths:
-        svg_paths.append(f'<path d="{path}" stroke="black" stroke-width="2" fill="none"/>')
-    
-    svg = f'''<svg width="{width:.0f}" height="{height:.0f}" viewBox="{min_x - padding:.2f} {min_y - padding:.2f} {width:.2f} {height:.2f}" xmlns="http://www.w3.org/2000/svg">
-{chr(10).join(svg_paths)}
-</svg>'''
-    
-    return svg
+    header = (
+        f'<svg width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="{min_x - padding:.2f} {min_y - padding:.2f} {width:.2f} {height:.2f}" '
+        'xmlns="http://www.w3.org/2000/svg">'
+    )
+
+    paths = _paths(canvas)
+    merged_points = sum(_point_count(pieces) for _, _, _, pieces in paths)
+    attempts = 0
+    while True:
+        rendered = [
+            (style, x, y, [_simplify(piece, tolerance) if isinstance(piece, list) else piece for piece in pieces])
+            for style, x, y, pieces in paths
+        ]
+        svg = "\n".join(
+            [
+                header,
+                *(_path_element(x, y, pieces, canvas.styles[style]) for style, x, y, pieces in rendered),
+                "</svg>",
+            ]
+        )
+        if not max_bytes or len(svg) <= max_bytes or attempts >= 6:
+            break
+        # Start from a fraction of a pixel at drawing scale and grow quickly from there
+        tolerance = max(tolerance * 4, max(width, height) * 1e-3)
+        attempts += 1
+
+    stats = {
+        "rawElements": segment_count,
+        "rawPoints": segment_count * 2,
+        "elements": len(rendered),
+        "mergedPoints": merged_points,
+        "points": sum(_point_count(pieces) for _, _, _, pieces in rendered),
+        "bytes": len(svg),
+        "tolerance": tolerance,
+    }
+    if max_bytes:
+        stats["overLimit"] = len(svg) > max_bytes
+    return svg, stats
+
+
+def get_svg_output(tolerance: float = 0.0, max_bytes: int = 0) -> str:
+    """Get SVG representation of all drawn paths."""
+    return render_svg(_canvas, tolerance, max_bytes)[0]
 
 def reset():
-    """Reset turtle to initial state."""
+    """Clear the drawing and reset the default turtle to its initial state."""
     global _turtle
-    _turtle = TurtleState()
-
-# Module cleanup - output SVG and segments when module is done
-def _output_svg():
-    """Output SVG and segments to stdout when execution is complete."""
-    import sys
-    svg = get_svg_output()
-    segments = _turtle.get_segments()
-    
-    if svg:
-        sys.stdout.write("SVG_OUTPUT_START\n")
-        sys.stdout.write(svg + "\n")
-        sys.stdout.write("SVG_OUTPUT_END\n")
-    
-    if segments:
-        sys.stdout.write("SEGMENTS_OUTPUT_START\n")
-        sys.stdout.write(json.dumps({"segments": segments}) + "\n")
-        sys.stdout.write("SEGMENTS_OUTPUT_END\n")
-    
-    sys.stdout.flush()
+    _canvas.clear()
+    _turtle = TurtleState(_canvas)
+
+
+def _sandbox_configure(options: Dict[str, Any]):
+    """Called by the sandbox runner after loading; ``timeline`` turns on timeline recording."""
+    global _timeline
+    _timeline = Timeline() if options.get("timeline") else None
+
+def _sandbox_result(options: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Drawing results collected by the sandbox runner once user code has finished.
+
+    ``options`` may carry ``svg`` (``false`` skips rendering), ``svgTolerance`` and
+    ``svgMaxBytes`` from the runner request.
+    """
+    options = options or {}
+    result: Dict[str, Any] = {}
+    if options.get("svg", True):
+        svg, stats = render_svg(
+            _canvas,
+            float(options.get("svgTolerance") or 0.0),
+            int(options.get("svgMaxBytes") or 0),
+        )
+        if svg:
+            result["svg"] = svg
+            result["svgStats"] = stats
+    if _timeline is not None and _timeline.data:
+        result["timeline"] = _timeline.encode(_canvas.styles)
+    if _canvas.segment_count():
+        result["segments"] = _canvas.get_segments()
+    return result
 
 # Turtle class for object-oriented interface
-class Turtle:
-    """Turtle class that provides object-oriented interface to turtle graphics."""
-    
-    def __init__(self):
-        # Use the global turtle state for simplicity
-        pass
-    
-    def forward(self, distance: float):
-        """Move turtle forward by distance."""
-        forward(distance)
-    
-    def right(self, angle: float):
-        """Turn turtle right by angle degrees."""
-        right(angle)
-    
-    def left(self, angle: float):
-        """Turn turtle left by angle degrees."""
-        left(angle)
-    
-    def penup(self):
-        """Lift the pen up."""
-        penup()
-    
-    def pendown(self):
-        """Put the pen down."""
-        pendown()
+class Turtle(TurtleState):
+    """Turtle class that provides object-oriented interface to turtle graphics.
+
+    Every instance has its own position, heading and pen, and draws on the shared canvas
+    so the SVG and judge segments keep the order in which things were drawn.
+    """
 
-# Register cleanup function
-import atexit
-atexit.register(_output_svg)
\ No newline at end of file
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(_canvas)
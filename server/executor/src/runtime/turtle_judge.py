@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Compare turtle drawings by their judge segments.
+
+Segment lists (``{"len", "deg"}`` as produced by ``turtle.py``) are canonicalized before
+comparison: negative lengths are flipped, zero-length moves dropped, headings normalized
+to ``[0, 360)`` and runs of segments with the same heading merged, so ``forward(50)``
+twice equals ``forward(100)``. With ``rotation_invariant`` headings are taken relative to
+the first segment. Segments carry no positions, so the comparison is translation
+invariant by construction.
+
+Both lists are held in ``array('d')`` buffers and compared in one pass per metric, which
+keeps drawings with tens of thousands of segments in the millisecond range without NumPy.
+"""
+
+import json
+import sys
+from array import array
+from typing import Any, Dict, Iterable, Tuple
+
+# Headings closer than this (degrees) are treated as the same direction when merging runs
+MERGE_ANGLE_TOLERANCE = 1e-6
+DEFAULT_LENGTH_TOLERANCE = 0.1  # relative to the expected length
+DEFAULT_ANGLE_TOLERANCE = 1.0  # degrees
+
+
+def _angle_delta(a: float, b: float) -> float:
+    """Smallest absolute difference between two headings in degrees."""
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+def canonicalize(
+    segments: Iterable[Dict[str, Any]],
+    rotation_invariant: bool = False,
+    merge_tolerance: float = MERGE_ANGLE_TOLERANCE,
+) -> Tuple[array, array]:
+    """Return canonical ``(lengths, headings)`` arrays for a segment list."""
+    lengths = array("d")
+    headings = array("d")
+    for segment in segments:
+        length = float(segment.get("len", 0.0))
+        heading = float(segment.get("deg", 0.0))
+        if length < 0:
+            length = -length
+            heading += 180.0
+        if length <= 1e-12:
+            continue
+        heading %= 360.0
+        if lengths and _angle_delta(heading, headings[-1]) <= merge_tolerance:
+            lengths[-1] += length
+        else:
+            lengths.append(length)
+            headings.append(heading)
+
+    if rotation_invariant and headings:
+        base = headings[0]
+        headings = array("d", ((heading - base) % 360.0 for heading in headings))
+    # Snap float noise such as 359.9999999 back to 0
+    for index, heading in enumerate(headings):
+        if 360.0 - heading <= merge_tolerance:
+            headings[index] = 0.0
+    return lengths, headings
+
+
+def compare(
+    actual: Iterable[Dict[str, Any]],
+    expected: Iterable[Dict[str, Any]],
+    length_tolerance: float = DEFAULT_LENGTH_TOLERANCE,
+    angle_tolerance: float = DEFAULT_ANGLE_TOLERANCE,
+    rotation_invariant: bool = True,
+) -> Dict[str, Any]:
+    """Compare two segment lists and return a verdict.
+
+    ``length_tolerance`` is relative to each expected length and ``angle_tolerance`` is
+    in degrees. The verdict reports canonical segment counts, the worst errors and the
+    index of the first mismatching canonical segment (``None`` when all match).
+    """
+    actual_lengths, actual_headings = canonicalize(actual, rotation_invariant)
+    expected_lengths, expected_headings = canonicalize(expected, rotation_invariant)
+    verdict: Dict[str, Any] = {
+        "pass": False,
+        "actualSegments": len(actual_lengths),
+        "expectedSegments": len(expected_lengths),
+        "mismatchIndex": None,
+        "maxLengthError": None,
+        "maxAngleError": None,
+    }
+    if len(actual_lengths) != len(expected_lengths):
+        verdict["mismatchIndex"] = min(len(actual_lengths), len(expected_lengths))
+        return verdict
+    if not expected_lengths:
+        verdict["pass"] = True
+        return verdict
+
+    length_errors = array(
+        "d", map(lambda a, e: abs(a - e) / e, actual_lengths, expected_lengths)
+    )
+    angle_errors = array("d", map(_angle_delta, actual_headings, expected_headings))
+    verdict["maxLengthError"] = max(length_errors)
+    verdict["maxAngleError"] = max(angle_errors)
+    verdict["mismatchIndex"] = next(
+        (
+            index
+            for index, (length_error, angle_error) in enumerate(zip(length_errors, angle_errors))
+            if length_error > length_tolerance or angle_error > angle_tolerance
+        ),
+        None,
+    )
+    verdict["pass"] = verdict["mismatchIndex"] is None
+    return verdict
+
+
+def compare_request(actual: Iterable[Dict[str, Any]], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """``compare`` driven by request keys: ``expectedSegments`` plus optional tolerances."""
+    return compare(
+        actual,
+        payload.get("expectedSegments") or [],
+        float(payload.get("lengthTolerance", DEFAULT_LENGTH_TOLERANCE)),
+        float(payload.get("angleTolerance", DEFAULT_ANGLE_TOLERANCE)),
+        bool(payload.get("rotationInvariant", True)),
+    )
+
+
+def main() -> None:
+    raw = sys.stdin.read()
+    payload = json.loads(raw or "{}")
+    print(json.dumps(compare_request(payload.get("segments") or [], payload)))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,42 +2,222 @@
 """
 参考答案验证脚本
 用于验证所有游戏关卡的参考答案输出是否与期望结果一致
+
+默认通过执行器的沙箱运行器（server/executor/src/runtime/python_runner.py）执行参考答案：
+受限的 import 与内置函数、自定义 turtle 以及与执行器相同的时间/内存限制。每个参考答案
+只编译一次，每个用例在独立的 fork 子进程中运行。不支持 fork 的平台（例如 Windows）或
+指定 --no-sandbox 时，退回到为每个用例启动独立 Python 解释器的方式。
+
+验证结果缓存在 .cache/reference_validation.json 中，键为参考答案、用例、grader 配置与运行器
+版本的哈希；内容未变的关卡直接复用上次的输出，不再执行。--only / --changed-since 只验证
+部分关卡，--no-cache 忽略缓存。
+
+Maze/LED/Music 等事件关卡在沙箱中由 level_grader 评判：参考答案调用模拟的 API（或按规则
+打印事件），子进程只记录动作日志，判题条件（grader.checks）由 run_cases 在父进程中重放日志后求值。
+
+每个用例记录墙钟时间、CPU时间和峰值内存，超过生产限制一定比例（--limit-fraction）的
+关卡给出警告；--json-report / --junit 输出机器可读的报告。
 """
 
+import argparse
+import fnmatch
+import hashlib
 import json
 import os
 import subprocess
 import sys
 import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Optional, Tuple, Any
+
+RUNTIME_DIR = Path(__file__).resolve().parent / 'server' / 'executor' / 'src' / 'runtime'
+sys.path.insert(0, str(RUNTIME_DIR))
+try:
+    import python_runner
+except ImportError:  # resource 模块不可用（例如 Windows）
+    python_runner = None
+
+# 与执行器服务（server/executor/src/config.ts）的默认值保持一致
+SANDBOX_ALLOWED_MODULES = json.loads(
+    os.environ.get('EXECUTOR_ALLOWED_MODULES', '["math", "random", "statistics", "turtle"]')
+)
+
+REPO_ROOT = Path(__file__).resolve().parent
+DEFAULT_CACHE_FILE = REPO_ROOT / '.cache' / 'reference_validation.json'
+CACHE_FORMAT = 3
+
+# 执行器的生产限制（与 python_runner 相同的环境变量和默认值）
+PRODUCTION_LIMITS = {
+    'wall_seconds': float(os.environ.get('EXECUTOR_TIMEOUT', '3.0')),
+    'cpu_seconds': float(os.environ.get('EXECUTOR_CPU_LIMIT', '2.0')),
+    'max_rss_bytes': int(float(os.environ.get('EXECUTOR_MEM_LIMIT', str(256 * 1024 * 1024)))),
+}
+DEFAULT_LIMIT_FRACTION = 0.5
+# 指标 -> (名称, JSON报告中的字段名)
+METRIC_FIELDS = {
+    'wall_seconds': ('墙钟时间', 'wallSeconds'),
+    'cpu_seconds': ('CPU时间', 'cpuSeconds'),
+    'max_rss_bytes': ('峰值内存', 'peakMemoryBytes'),
+}
+
+# 事件判题（grader.mode 为 event）的游戏类型及其报错名称
+EVENT_GAME_TYPES = {'music': 'Music', 'maze': 'Maze', 'led': 'LED'}
+# 沙箱判题未通过时错误信息的前缀
+GRADE_FAILED = "判题未通过: "
+
+
+@dataclass
+class LevelPlan:
+    """单个关卡的验证计划：需要执行的用例和规划阶段发现的错误"""
+    level_file: Path
+    game_type: str = ''
+    level_id: str = ''
+    title: str = ''
+    # (代码, 输入, 期望输出)；期望输出为 None 时由 grader 判题（不经过沙箱时只检查能否正常执行）
+    cases: List[Tuple[str, str, Optional[str]]] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    # 用例序号 -> turtle 输出（svg / segments），仅沙箱模式
+    drawings: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+    # 用例序号 -> 资源占用（wall_seconds / cpu_seconds / max_rss_bytes；CPU与内存仅沙箱模式）
+    metrics: Dict[int, Dict[str, float]] = field(default_factory=dict)
+    grader: Dict[str, Any] = field(default_factory=dict)
+    assets: Dict[str, Any] = field(default_factory=dict)
+    # 执行后的结果：错误（含规划阶段）和资源警告
+    failures: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+
+
+def runner_version() -> str:
+    """运行器版本：运行时目录下所有源码与Python版本的哈希，任一变化都会让缓存失效"""
+    digest = hashlib.sha256(sys.version.encode('utf-8'))
+    for source in sorted(RUNTIME_DIR.glob('*.py')):
+        digest.update(source.name.encode('utf-8'))
+        digest.update(source.read_bytes())
+    return digest.hexdigest()
+
+
+def format_metric(key: str, value: float) -> str:
+    if key == 'max_rss_bytes':
+        return f"{value / (1024 * 1024):.1f}MiB"
+    return f"{value:.3f}s"
+
+
+class ResultCache:
+    """按内容哈希保存关卡验证结果的磁盘缓存（JSON文件）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('format') == CACHE_FORMAT:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        self.entries[key] = entry
+
+    def prune(self, keep: List[str]):
+        """只保留本次用到的条目（完整验证后调用，避免缓存无限增长）"""
+        keep_set = set(keep)
+        self.entries = {key: value for key, value in self.entries.items() if key in keep_set}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': CACHE_FORMAT, 'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
 
 class ReferenceAnswerValidator:
-    def __init__(self, levels_dir: str):
+    def __init__(self, levels_dir: str, jobs: int = 1, sandbox: bool = True,
+                 svg_dir: Optional[str] = None, cache_file: Optional[str] = None,
+                 only: Optional[List[str]] = None, changed_since: Optional[str] = None,
+                 limit_fraction: float = DEFAULT_LIMIT_FRACTION, fail_on_limits: bool = False):
         self.levels_dir = Path(levels_dir)
+        self.jobs = max(1, jobs)
+        self.sandbox = sandbox and python_runner is not None and hasattr(os, 'fork')
+        self.svg_dir = Path(svg_dir) if svg_dir else None
+        self.cache = ResultCache(Path(cache_file)) if cache_file else None
+        self.only = only or []
+        self.changed_since = changed_since
+        self.limit_fraction = limit_fraction
+        self.fail_on_limits = fail_on_limits
+        self.skipped_count = 0
         self.errors = []
+        self.warnings = []
+        self.plans: List[LevelPlan] = []
         self.validated_count = 0
         
     def find_all_level_files(self) -> List[Path]:
-        """查找所有关卡JSON文件"""
+        """查找所有关卡JSON文件（按路径排序，保证报告顺序稳定）"""
         level_files = []
         for game_type in ['io', 'led', 'maze', 'music', 'pixel']:
             game_dir = self.levels_dir / 'python' / game_type / 'levels'
             if game_dir.exists():
-                level_files.extend(game_dir.rglob('*.json'))
+                level_files.extend(sorted(game_dir.rglob('*.json')))
         return level_files
     
-    def load_level_config(self, level_file: Path) -> Dict[str, Any]:
+    def changed_level_files(self, rev: str) -> Optional[set]:
+        """``rev`` 之后改动（含未提交、未跟踪）的关卡文件；运行器或本脚本有改动时返回 None（全部验证）"""
+        def git(*args: str) -> List[str]:
+            process = subprocess.run(['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+            return [line for line in process.stdout.splitlines() if line]
+        
+        tooling = [str(RUNTIME_DIR), str(Path(__file__).resolve())]
+        if git('diff', '--name-only', rev, '--', *tooling):
+            return None
+        levels = str(self.levels_dir.resolve())
+        changed = git('diff', '--name-only', rev, '--', levels)
+        changed += git('ls-files', '--others', '--exclude-standard', '--', levels)
+        return {(REPO_ROOT / name).resolve() for name in changed}
+    
+    def select_level_files(self, level_files: List[Path]) -> List[Path]:
+        """按 --only / --changed-since 过滤关卡文件"""
+        selected = level_files
+        if self.only:
+            selected = [
+                level_file for level_file in selected
+                if any(fnmatch.fnmatch(level_file.relative_to(self.levels_dir).as_posix(), pattern)
+                       or fnmatch.fnmatch(level_file.name, pattern) for pattern in self.only)
+            ]
+        if self.changed_since:
+            changed = self.changed_level_files(self.changed_since)
+            if changed is not None:
+                selected = [level_file for level_file in selected if level_file.resolve() in changed]
+        self.skipped_count = len(level_files) - len(selected)
+        return selected
+    
+    def load_level_config(self, level_file: Path, errors: List[str]) -> Dict[str, Any]:
         """加载关卡配置"""
         try:
             with open(level_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
-            self.errors.append(f"无法加载关卡文件 {level_file}: {e}")
+            errors.append(f"无法加载关卡文件 {level_file}: {e}")
             return {}
     
     def execute_python_code(self, code: str, input_data: str = "") -> Tuple[str, str]:
         """执行Python代码并返回输出和错误"""
+        temp_file = None
         try:
             with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
                 f.write("# -*- coding: utf-8 -*-\n" + code)
@@ -50,149 +230,438 @@ class ReferenceAnswerValidator:
                 text=True,
                 timeout=10
             )
-            
-            os.unlink(temp_file)
             return process.stdout, process.stderr
             
         except subprocess.TimeoutExpired:
             return "", "代码执行超时"
         except Exception as e:
             return "", f"执行错误: {e}"
+        finally:
+            if temp_file:
+                os.unlink(temp_file)
     
-    def validate_io_level(self, level_config: Dict[str, Any], level_file: Path) -> bool:
-        """验证IO类型关卡"""
-        solution = level_config.get('solution', '')
-        if not solution:
-            self.errors.append(f"{level_file}: 缺少solution字段")
-            return False
-        
-        grader = level_config.get('grader', {})
-        if grader.get('mode') != 'io':
-            return True  # 非IO模式，跳过
-        
-        io_cases = grader.get('io', {}).get('cases', [])
-        if not io_cases:
-            self.errors.append(f"{level_file}: 缺少测试用例")
-            return False
-        
-        all_passed = True
-        for i, case in enumerate(io_cases):
-            input_data = case.get('in', '')
-            expected_output = case.get('out', '')
-            
-            actual_output, error = self.execute_python_code(solution, input_data)
-            
-            if error:
-                self.errors.append(f"{level_file}: 用例{i+1}执行错误: {error}")
-                all_passed = False
+    def compile_solution(self, code: str) -> Tuple[Any, str]:
+        """用沙箱运行器编译参考答案（含静态检查），返回 (编译结果, 错误)"""
+        try:
+            return python_runner.prepare_code(code, set(SANDBOX_ALLOWED_MODULES), check=True), ""
+        except python_runner.StaticCheckError as e:
+            return None, "静态检查未通过: " + "; ".join(e.issues)
+        except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+            return None, f"{type(e).__name__}: {e}"
+    
+    def sandbox_error(self, response: Dict[str, Any]) -> str:
+        """把沙箱运行器的响应转换为错误信息（无错误时为空字符串）"""
+        if response.get('timeout'):
+            return f"代码执行超时: {response.get('stderr', '')}".rstrip(': ')
+        if response.get('budgetExceeded'):
+            return f"超出步数限制: {response.get('stderr', '')}"
+        if response.get('issues'):
+            return "静态检查未通过: " + "; ".join(response['issues'])
+        if response.get('stderr') or 'grade' not in response or response['grade']['pass']:
+            return response.get('stderr', '')
+        return GRADE_FAILED + self.describe_grade(response['grade'])
+    
+    def describe_grade(self, grade: Dict[str, Any]) -> str:
+        """把 level_grader 的判题结果转换为说明文字"""
+        reasons = []
+        for check in grade['checks']:
+            if check['pass'] or not check['must']:
                 continue
-            
-            if actual_output != expected_output:
-                self.errors.append(
-                    f"{level_file}: 用例{i+1}输出不匹配\n"
-                    f"期望: {repr(expected_output)}\n"
-                    f"实际: {repr(actual_output)}"
-                )
-                all_passed = False
+            kind = check['type']
+            if kind in ('goal', 'endState'):
+                goal = tuple(grade['goal']) if grade.get('goal') else '未知'
+                reasons.append(f"未到达终点（位置 {tuple(grade['position'])}，终点 {goal}）")
+            elif kind == 'maxSteps':
+                reasons.append(f"步数超限 ({check['steps']}/{check['value']})")
+            elif kind == 'eventSeq':
+                mismatch = check['mismatch']
+                reasons.append(f"第{mismatch['index']+1}个事件不匹配，"
+                               f"期望 {mismatch['expected']!r}，实际 {mismatch['actual']!r}")
+            elif kind == 'eventSet':
+                reasons.append(f"缺少事件 {check['missing']}（共{check['missingCount']}个），"
+                               f"多余事件 {check['unexpected']}（共{check['unexpectedCount']}个）")
+            elif kind == 'eventLimit':
+                reasons.append(f"事件数超过 {check['value']}")
+            else:
+                reasons.append(check.get('error', f"{kind} 未通过"))
+        return "; ".join(reasons)
+    
+    def run_in_sandbox(self, plans: List[LevelPlan]) -> List[List[Tuple[str, str]]]:
+        """在执行器沙箱中运行所有关卡的用例：每个参考答案只编译一次，所有用例一起
+        分发到最多 ``jobs`` 个并发的 fork 子进程"""
+        results: List[List[Tuple[str, str]]] = [[("", "")] * len(plan.cases) for plan in plans]
+        jobs = []
+        owners = []
+        for plan_index, plan in enumerate(plans):
+            compiled: Dict[str, Tuple[Any, str]] = {}
+            for case_index, (code, input_data, expected_output) in enumerate(plan.cases):
+                if code not in compiled:
+                    compiled[code] = self.compile_solution(code)
+                prepared, error = compiled[code]
+                if error:
+                    results[plan_index][case_index] = ("", error)
+                    continue
+                request = {"source": code, "allowedModules": SANDBOX_ALLOWED_MODULES, "check": True}
+                case = {"stdin": input_data}
+                if expected_output is None:
+                    case.update(grader=plan.grader, assets=plan.assets)
+                jobs.append((prepared, case, request))
+                owners.append((plan_index, case_index))
         
-        return all_passed
+        for (plan_index, case_index), response in zip(owners, python_runner.run_cases(jobs, self.jobs)):
+            results[plan_index][case_index] = (response.get('stdout', ''), self.sandbox_error(response))
+            plans[plan_index].metrics[case_index] = self.sandbox_metrics(response)
+            drawing = {key: response[key] for key in ('svg', 'segments') if key in response}
+            if drawing:
+                plans[plan_index].drawings[case_index] = drawing
+        return results
     
-    def validate_pixel_level(self, level_config: Dict[str, Any], level_file: Path) -> bool:
-        """验证Pixel类型关卡"""
-        return self.validate_io_level(level_config, level_file)  # Pixel使用IO模式
+    def sandbox_metrics(self, response: Dict[str, Any]) -> Dict[str, float]:
+        """沙箱响应中的资源占用：用户代码执行与渲染的墙钟时间、子进程CPU时间与峰值内存"""
+        phases = response.get('phases', {})
+        usage = response.get('usage', {})
+        metrics = {
+            'wall_seconds': sum(phases.get(name, {}).get('wall_seconds', 0.0) for name in ('execute', 'render')),
+        }
+        if 'cpu_seconds' in usage:
+            metrics['cpu_seconds'] = usage['cpu_seconds']
+        if 'max_rss' in usage:
+            # ru_maxrss 在 Linux 上以KiB为单位，在 macOS 上以字节为单位
+            metrics['max_rss_bytes'] = usage['max_rss'] * (1 if sys.platform == 'darwin' else 1024)
+        return metrics
     
-    def validate_music_level(self, level_config: Dict[str, Any], level_file: Path) -> bool:
-        """验证Music类型关卡"""
-        solution = level_config.get('solution', '')
-        if not solution:
-            self.errors.append(f"{level_file}: 缺少solution字段")
-            return False
+    def run_in_subprocesses(self, plans: List[LevelPlan]) -> List[List[Tuple[str, str]]]:
+        """每个用例启动独立的Python解释器（不经过沙箱），最多同时运行 ``jobs`` 个
+
+        只记录墙钟时间（包含解释器启动时间）。
+        """
+        def timed(plan: LevelPlan, case_index: int, code: str, input_data: str) -> Tuple[str, str]:
+            started = time.perf_counter()
+            result = self.execute_python_code(code, input_data)
+            plan.metrics[case_index] = {'wall_seconds': time.perf_counter() - started}
+            return result
         
-        grader = level_config.get('grader', {})
-        if grader.get('mode') != 'music':
-            return True  # 非Music模式，跳过
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [
+                [pool.submit(timed, plan, case_index, code, input_data)
+                 for case_index, (code, input_data, _) in enumerate(plan.cases)]
+                for plan in plans
+            ]
+            return [[future.result() for future in level_futures] for level_futures in futures]
+    
+    def run_plans(self, plans: List[LevelPlan]) -> List[List[Tuple[str, str]]]:
+        """执行所有计划中的用例，返回按关卡、用例顺序排列的 (输出, 错误)"""
+        if self.sandbox:
+            return self.run_in_sandbox(plans)
+        return self.run_in_subprocesses(plans)
+    
+    def cache_key(self, plan: LevelPlan, version: str) -> str:
+        """关卡缓存键：参考答案与用例、grader配置、执行方式和运行器版本的哈希"""
+        payload = {
+            'gameType': plan.game_type,
+            'cases': plan.cases,
+            'grader': plan.grader,
+            'assets': plan.assets,
+            'sandbox': self.sandbox,
+            'allowedModules': SANDBOX_ALLOWED_MODULES if self.sandbox else None,
+            'runner': version,
+        }
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+    
+    def save_drawings(self, plan: LevelPlan):
+        """把turtle关卡的SVG写入 ``svg_dir``"""
+        if not self.svg_dir:
+            return
+        for case_index, drawing in plan.drawings.items():
+            if drawing.get('svg'):
+                self.svg_dir.mkdir(parents=True, exist_ok=True)
+                target = self.svg_dir / f"{plan.level_file.stem}-{case_index + 1}.svg"
+                target.write_text(drawing['svg'], encoding='utf-8')
+    
+    def plan_level(self, level_file: Path) -> LevelPlan:
+        """读取关卡配置，列出需要执行的用例（不执行代码）"""
+        plan = LevelPlan(level_file)
+        level_config = self.load_level_config(level_file, plan.errors)
+        if not level_config:
+            return plan
         
-        # Music关卡通常有特定的验证逻辑，这里先检查代码能否正常执行
-        _, error = self.execute_python_code(solution)
-        if error:
-            self.errors.append(f"{level_file}: Music关卡代码执行错误: {error}")
-            return False
+        plan.game_type = level_config.get('gameType', '')
+        plan.level_id = level_config.get('id', '')
+        plan.title = level_config.get('title', '')
+        if plan.game_type not in ('io', 'pixel') and plan.game_type not in EVENT_GAME_TYPES:
+            plan.errors.append(f"{level_file}: 未知的游戏类型: {plan.game_type}")
+            return plan
         
-        return True
-    
-    def validate_maze_level(self, level_config: Dict[str, Any], level_file: Path) -> bool:
-        """验证Maze类型关卡"""
         solution = level_config.get('solution', '')
         if not solution:
-            self.errors.append(f"{level_file}: 缺少solution字段")
-            return False
+            plan.errors.append(f"{level_file}: 缺少solution字段")
+            return plan
         
         grader = level_config.get('grader', {})
-        if grader.get('mode') != 'maze':
-            return True  # 非Maze模式，跳过
-        
-        # Maze关卡通常有特定的验证逻辑，这里先检查代码能否正常执行
-        _, error = self.execute_python_code(solution)
-        if error:
-            self.errors.append(f"{level_file}: Maze关卡代码执行错误: {error}")
-            return False
+        plan.grader = grader
+        plan.assets = level_config.get('assets') or {}
+        # IO/Pixel只支持IO模式，Music/Maze/LED支持事件或IO模式；其他组合跳过
+        if grader.get('mode') == 'event' and plan.game_type in EVENT_GAME_TYPES:
+            plan.cases.append((solution, '', None))
+            return plan
+        if grader.get('mode') != 'io':
+            return plan
         
-        return True
+        io_cases = grader.get('io', {}).get('cases', [])
+        if not io_cases:
+            plan.errors.append(f"{level_file}: 缺少测试用例")
+            return plan
+        for case in io_cases:
+            plan.cases.append((solution, case.get('in', ''), case.get('out', '')))
+        return plan
     
-    def validate_led_level(self, level_config: Dict[str, Any], level_file: Path) -> bool:
-        """验证LED类型关卡"""
-        solution = level_config.get('solution', '')
-        if not solution:
-            self.errors.append(f"{level_file}: 缺少solution字段")
-            return False
-        
-        grader = level_config.get('grader', {})
-        if grader.get('mode') != 'led':
-            return True  # 非LED模式，跳过
+    def check_case(self, plan: LevelPlan, index: int, expected_output: Optional[str],
+                   actual_output: str, error: str) -> Optional[str]:
+        """比较单个用例的执行结果，返回错误信息（通过时返回 None）"""
+        if expected_output is None:
+            if error.startswith(GRADE_FAILED):
+                return f"{plan.level_file}: {EVENT_GAME_TYPES[plan.game_type]}关卡{error}"
+            if error:
+                return f"{plan.level_file}: {EVENT_GAME_TYPES[plan.game_type]}关卡代码执行错误: {error}"
+            return None
         
-        # LED关卡通常有特定的验证逻辑，这里先检查代码能否正常执行
-        _, error = self.execute_python_code(solution)
         if error:
-            self.errors.append(f"{level_file}: LED关卡代码执行错误: {error}")
-            return False
-        
-        return True
+            return f"{plan.level_file}: 用例{index+1}执行错误: {error}"
+        if actual_output != expected_output:
+            return (
+                f"{plan.level_file}: 用例{index+1}输出不匹配\n"
+                f"期望: {repr(expected_output)}\n"
+                f"实际: {repr(actual_output)}"
+            )
+        return None
     
     def validate_level(self, level_file: Path) -> bool:
         """验证单个关卡"""
-        level_config = self.load_level_config(level_file)
-        if not level_config:
-            return False
-        
-        game_type = level_config.get('gameType', '')
-        
-        if game_type == 'io':
-            return self.validate_io_level(level_config, level_file)
-        elif game_type == 'pixel':
-            return self.validate_pixel_level(level_config, level_file)
-        elif game_type == 'music':
-            return self.validate_music_level(level_config, level_file)
-        elif game_type == 'maze':
-            return self.validate_maze_level(level_config, level_file)
-        elif game_type == 'led':
-            return self.validate_led_level(level_config, level_file)
-        else:
-            self.errors.append(f"{level_file}: 未知的游戏类型: {game_type}")
-            return False
+        plan = self.plan_level(level_file)
+        return self.record_level(plan, self.run_plans([plan])[0])
+    
+    def check_limits(self, plan: LevelPlan) -> List[str]:
+        """资源占用超过生产限制 ``limit_fraction`` 的用例"""
+        warnings = []
+        for index in sorted(plan.metrics):
+            for key, value in plan.metrics[index].items():
+                limit = PRODUCTION_LIMITS[key]
+                if value > limit * self.limit_fraction:
+                    warnings.append(
+                        f"{plan.level_file}: 用例{index+1}{METRIC_FIELDS[key][0]} {format_metric(key, value)}，"
+                        f"超过生产限制 {format_metric(key, limit)} 的 {self.limit_fraction:.0%}"
+                    )
+        return warnings
+    
+    def record_level(self, plan: LevelPlan, results: List[Tuple[str, str]]) -> bool:
+        """汇总单个关卡的用例结果，记录错误和资源警告"""
+        errors = list(plan.errors)
+        for index, ((_, _, expected_output), (actual_output, error)) in enumerate(zip(plan.cases, results)):
+            case_error = self.check_case(plan, index, expected_output, actual_output, error)
+            if case_error:
+                errors.append(case_error)
+        plan.failures = errors
+        plan.warnings = self.check_limits(plan)
+        self.errors.extend(errors)
+        self.warnings.extend(plan.warnings)
+        return not errors and not (self.fail_on_limits and plan.warnings)
+    
+    def print_plan(self):
+        """只列出验证计划，不执行任何代码"""
+        all_files = self.find_all_level_files()
+        level_files = self.select_level_files(all_files)
+        print(f"找到 {len(all_files)} 个关卡文件，本次验证 {len(level_files)} 个")
+        total_runs = 0
+        for level_file in level_files:
+            plan = self.plan_level(level_file)
+            total_runs += len(plan.cases)
+            status = f"{len(plan.cases)} 次运行" if plan.cases else "跳过"
+            print(f"{level_file.relative_to(self.levels_dir)}  [{plan.game_type or '?'}]  {status}")
+            for error in plan.errors:
+                print(f"  ❌ {error}")
+        mode = "沙箱运行器" if self.sandbox else "独立解释器"
+        print(f"\n共 {total_runs} 次运行，并发数 {self.jobs}，执行方式: {mode}")
     
     def validate_all(self) -> bool:
-        """验证所有关卡"""
-        level_files = self.find_all_level_files()
-        print(f"找到 {len(level_files)} 个关卡文件")
+        """验证所有关卡
+
+        所有用例一起分发，最多同时运行 ``jobs`` 个；结果按关卡顺序汇总输出，
+        与并发数无关。
+        """
+        all_files = self.find_all_level_files()
+        level_files = self.select_level_files(all_files)
+        print(f"找到 {len(all_files)} 个关卡文件，本次验证 {len(level_files)} 个")
+        if not self.sandbox:
+            print("⚠️ 未使用沙箱运行器，参考答案在独立的Python解释器中执行，事件关卡只检查能否运行")
+        plans = [self.plan_level(level_file) for level_file in level_files]
+        self.plans = plans
         
-        for level_file in level_files:
-            print(f"验证: {level_file.name}")
-            if self.validate_level(level_file):
+        version = runner_version()
+        keys = [self.cache_key(plan, version) for plan in plans]
+        cached = [self.cache.get(key) if self.cache else None for key in keys]
+        stale = [plan for plan, entry in zip(plans, cached) if entry is None]
+        fresh = iter(self.run_plans(stale))
+        
+        for plan, key, entry in zip(plans, keys, cached):
+            print(f"验证: {plan.level_file.name}{'（缓存）' if entry else ''}")
+            if entry:
+                results = [tuple(result) for result in entry['results']]
+                plan.drawings = {int(index): drawing for index, drawing in entry['drawings'].items()}
+                plan.metrics = {int(index): metrics for index, metrics in entry['metrics'].items()}
+            else:
+                results = next(fresh)
+            self.save_drawings(plan)
+            passed = self.record_level(plan, results)
+            if passed:
                 self.validated_count += 1
             else:
                 print(f"  ❌ 验证失败")
+            if plan.warnings:
+                print(f"  ⚠️ 接近资源限制")
+            if self.cache and not entry:
+                self.cache.put(key, {
+                    'passed': not plan.failures,
+                    'results': results,
+                    'drawings': plan.drawings,
+                    'metrics': plan.metrics,
+                })
         
-        return len(self.errors) == 0
+        if self.cache:
+            if not self.only and not self.changed_since:
+                self.cache.prune(keys)
+            self.cache.save()
+        return len(self.errors) == 0 and not (self.fail_on_limits and self.warnings)
+    
+    def level_performance(self, plan: LevelPlan) -> Dict[str, Any]:
+        """关卡的资源占用：各指标在所有用例中的最大值、占生产限制的比例和每个用例的数据"""
+        performance: Dict[str, Any] = {}
+        for key, (_, name) in METRIC_FIELDS.items():
+            values = [metrics[key] for metrics in plan.metrics.values() if key in metrics]
+            performance[name] = max(values) if values else None
+        usage = [
+            metrics[key] / PRODUCTION_LIMITS[key]
+            for metrics in plan.metrics.values() for key in metrics
+        ]
+        performance['limitUsage'] = round(max(usage), 4) if usage else None
+        performance['cases'] = [
+            {'case': index + 1, **{METRIC_FIELDS[key][1]: value for key, value in plan.metrics[index].items()}}
+            for index in sorted(plan.metrics)
+        ]
+        return performance
+    
+    def build_report(self) -> Dict[str, Any]:
+        """与 curriculum_report.json（tools/curriculum-lint.mjs）结构一致的验证报告，按游戏类型分组"""
+        results: Dict[str, Dict[str, Any]] = {}
+        for plan in self.plans:
+            game_type = plan.game_type or 'unknown'
+            result = results.setdefault(game_type, {
+                'language': 'python',
+                'gameType': game_type,
+                'file': (self.levels_dir / 'python' / game_type / 'levels').as_posix(),
+                'levels': [],
+                'summary': {'total': 0, 'errors': 0, 'warnings': 0, 'fixes': 0},
+            })
+            result['levels'].append({
+                'level': plan.level_id or plan.level_file.stem,
+                'title': plan.title,
+                'file': plan.level_file.as_posix(),
+                'errors': plan.failures,
+                'warnings': plan.warnings,
+                'fixes': [],
+                'cases': len(plan.cases),
+                'performance': self.level_performance(plan),
+            })
+            result['summary']['total'] += 1
+            result['summary']['errors'] += bool(plan.failures)
+            result['summary']['warnings'] += bool(plan.warnings)
+        
+        summary = {
+            'totalGames': len(results),
+            'totalLevels': 0,
+            'totalErrors': 0,
+            'totalWarnings': 0,
+            'totalFixes': 0,
+            'gamesWithErrors': 0,
+            'gamesWithWarnings': 0,
+        }
+        for result in results.values():
+            summary['totalLevels'] += result['summary']['total']
+            summary['totalErrors'] += result['summary']['errors']
+            summary['totalWarnings'] += result['summary']['warnings']
+            summary['gamesWithErrors'] += result['summary']['errors'] > 0
+            summary['gamesWithWarnings'] += result['summary']['warnings'] > 0
+        
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'options': {
+                'levelsDir': self.levels_dir.as_posix(),
+                'sandbox': self.sandbox,
+                'jobs': self.jobs,
+                'only': self.only,
+                'changedSince': self.changed_since,
+                'limitFraction': self.limit_fraction,
+                'failOnLimits': self.fail_on_limits,
+                'limits': {METRIC_FIELDS[key][1]: limit for key, limit in PRODUCTION_LIMITS.items()},
+            },
+            'summary': summary,
+            'results': list(results.values()),
+        }
+    
+    def write_json_report(self, path: str):
+        report_path = Path(path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(self.build_report(), ensure_ascii=False, indent=2), encoding='utf-8')
+    
+    def write_junit(self, path: str):
+        """JUnit XML：每种游戏类型一个 testsuite，每个关卡一个 testcase（耗时为所有用例墙钟时间之和）"""
+        suites = ET.Element('testsuites', name='reference-solutions')
+        totals = {'tests': 0, 'failures': 0, 'skipped': 0, 'time': 0.0}
+        by_type: Dict[str, List[LevelPlan]] = {}
+        for plan in self.plans:
+            by_type.setdefault(plan.game_type or 'unknown', []).append(plan)
+        
+        for game_type, plans in by_type.items():
+            suite = ET.SubElement(suites, 'testsuite', name=f"python.{game_type}")
+            counts = {'tests': 0, 'failures': 0, 'skipped': 0, 'time': 0.0}
+            for plan in plans:
+                seconds = sum(metrics.get('wall_seconds', 0.0) for metrics in plan.metrics.values())
+                case = ET.SubElement(
+                    suite, 'testcase', classname=f"python.{game_type}",
+                    name=plan.level_id or plan.level_file.stem,
+                    file=plan.level_file.as_posix(), time=f"{seconds:.3f}",
+                )
+                failures = plan.failures + (plan.warnings if self.fail_on_limits else [])
+                if failures:
+                    failure = ET.SubElement(case, 'failure', message=failures[0].splitlines()[0],
+                                            type='ResourceLimit' if not plan.failures else 'ReferenceSolution')
+                    failure.text = "\n\n".join(failures)
+                    counts['failures'] += 1
+                elif not plan.cases:
+                    ET.SubElement(case, 'skipped', message="没有需要执行的用例")
+                    counts['skipped'] += 1
+                out = [plan.title] if plan.title else []
+                out += [
+                    f"用例{index+1}: " + ", ".join(
+                        f"{METRIC_FIELDS[key][0]} {format_metric(key, value)}" for key, value in metrics.items()
+                    )
+                    for index, metrics in sorted(plan.metrics.items())
+                ]
+                out += [] if self.fail_on_limits else plan.warnings
+                if out:
+                    ET.SubElement(case, 'system-out').text = "\n".join(out)
+                counts['tests'] += 1
+                counts['time'] += seconds
+            for key, value in counts.items():
+                suite.set(key, f"{value:.3f}" if key == 'time' else str(value))
+                totals[key] += value
+        for key, value in totals.items():
+            suites.set(key, f"{value:.3f}" if key == 'time' else str(value))
+        
+        report_path = Path(path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        ET.indent(suites)
+        ET.ElementTree(suites).write(report_path, encoding='utf-8', xml_declaration=True)
     
     def print_report(self):
         """打印验证报告"""
@@ -201,6 +670,32 @@ class ReferenceAnswerValidator:
         print("="*60)
         print(f"验证成功: {self.validated_count} 个关卡")
         print(f"验证失败: {len(self.errors)} 个关卡")
+        if self.skipped_count:
+            print(f"未选中: {self.skipped_count} 个关卡")
+        if self.cache:
+            print(f"缓存: 命中 {self.cache.hits} 个，重新执行 {self.cache.misses} 个")
+        near_limits = sum(1 for plan in self.plans if plan.warnings)
+        print(f"接近资源限制: {near_limits} 个关卡（超过生产限制的 {self.limit_fraction:.0%}）")
+        
+        slowest = sorted(
+            (plan for plan in self.plans if plan.metrics),
+            key=lambda plan: max(metrics.get('wall_seconds', 0.0) for metrics in plan.metrics.values()),
+            reverse=True,
+        )[:5]
+        if slowest:
+            print("\n最慢的关卡:")
+            for plan in slowest:
+                performance = self.level_performance(plan)
+                details = ", ".join(
+                    f"{label} {format_metric(key, performance[name])}"
+                    for key, (label, name) in METRIC_FIELDS.items() if performance[name] is not None
+                )
+                print(f"  {plan.level_file.relative_to(self.levels_dir)}: {details}")
+        
+        if self.warnings:
+            print("\n资源警告:")
+            for i, warning in enumerate(self.warnings, 1):
+                print(f"{i}. {warning}")
         
         if self.errors:
             print("\n错误详情:")
@@ -210,20 +705,57 @@ class ReferenceAnswerValidator:
             print("\n✅ 所有关卡的参考答案都验证通过！")
 
 def main():
-    if len(sys.argv) != 2:
-        print("用法: python validate_reference_solutions.py <levels_directory>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="验证所有游戏关卡的参考答案")
+    parser.add_argument("levels_directory", help="关卡目录，例如 apps/student-app/public/levels")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="同时执行的用例数（默认 1，即顺序执行）")
+    parser.add_argument("--dry-run", action="store_true", help="只列出验证计划，不执行代码")
+    parser.add_argument("--no-sandbox", action="store_true",
+                        help="不经过执行器沙箱，为每个用例启动独立的Python解释器")
+    parser.add_argument("--svg-dir", help="把turtle关卡输出的SVG保存到此目录")
+    parser.add_argument("--only", action="append", metavar="GLOB",
+                        help="只验证路径（相对关卡目录）或文件名匹配的关卡，可重复指定")
+    parser.add_argument("--changed-since", metavar="REV",
+                        help="只验证自该git版本以来改动的关卡（运行器有改动时验证全部）")
+    parser.add_argument("--no-cache", action="store_true", help="忽略并且不写入结果缓存")
+    parser.add_argument("--cache-file", default=str(DEFAULT_CACHE_FILE),
+                        help=f"结果缓存文件（默认 {DEFAULT_CACHE_FILE.relative_to(REPO_ROOT)}）")
+    parser.add_argument("--limit-fraction", type=float, default=DEFAULT_LIMIT_FRACTION, metavar="FRACTION",
+                        help=f"墙钟时间、CPU时间或峰值内存超过生产限制的该比例时给出警告（默认 {DEFAULT_LIMIT_FRACTION}）")
+    parser.add_argument("--fail-on-limits", action="store_true", help="把资源警告当作验证失败")
+    parser.add_argument("--json-report", metavar="PATH",
+                        help="输出JSON报告（与 curriculum_report.json 结构一致）")
+    parser.add_argument("--junit", metavar="PATH", help="输出JUnit XML报告")
+    args = parser.parse_args()
     
-    levels_dir = sys.argv[1]
+    levels_dir = args.levels_directory
     if not os.path.exists(levels_dir):
         print(f"错误: 目录不存在: {levels_dir}")
         sys.exit(1)
     
-    validator = ReferenceAnswerValidator(levels_dir)
-    success = validator.validate_all()
+    validator = ReferenceAnswerValidator(
+        levels_dir, jobs=args.jobs, sandbox=not args.no_sandbox, svg_dir=args.svg_dir,
+        cache_file=None if args.no_cache else args.cache_file,
+        only=args.only, changed_since=args.changed_since,
+        limit_fraction=args.limit_fraction, fail_on_limits=args.fail_on_limits,
+    )
+    try:
+        if args.dry_run:
+            validator.print_plan()
+            sys.exit(0)
+        success = validator.validate_all()
+    except subprocess.CalledProcessError as e:
+        print(f"错误: git 命令失败: {e.stderr.strip() or e}")
+        sys.exit(1)
     validator.print_report()
+    if args.json_report:
+        validator.write_json_report(args.json_report)
+        print(f"JSON报告: {args.json_report}")
+    if args.junit:
+        validator.write_junit(args.junit)
+        print(f"JUnit报告: {args.junit}")
     
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()